@@ -8,42 +8,64 @@ import numpy as np
 from scipy import stats
 import matplotlib.pyplot as plt
 import seaborn as sns
+from player_index import PlayerDimension
+from player_features import PlayerFeatures
+from sufficient_stats import CellStats, moments, ttest_from_stats, tidy_confidence_intervals
+from dataframe_backend import get_backend
 
 class ABTestAnalyzer:
-    def __init__(self, cleaned_data):
+    def __init__(self, cleaned_data, backend=None):
         self.data = cleaned_data
+        # Engine of the grouped sums behind confidence intervals and t-tests
+        self.backend = get_backend(backend)
         self.results = {}
+        self._features = None
+        # The frames the cached features were built from, compared by identity
+        # (references, not id(): ids are reused once a frame is collected)
+        self._feature_players = None
+        self._feature_tables = {}
         
+    def _player_features(self, abgroup_data, platform_data=None, **tables):
+        """
+        Per-player feature table for these tables, shared by every metric
+        
+        The player dimension is built once per abgroup/platform pair and each
+        transaction table (money=..., cash=...) is aggregated once.
+        """
+        cached = self._feature_players
+        if cached is None or cached[0] is not abgroup_data or cached[1] is not platform_data:
+            self._features = PlayerFeatures(PlayerDimension.from_tables(abgroup_data, platform_data))
+            self._feature_players = (abgroup_data, platform_data)
+            self._feature_tables = {}
+        for table, df in tables.items():
+            if self._feature_tables.get(table) is not df:
+                self._features.add_transactions(table, df)
+                self._feature_tables[table] = df
+        self.results['player_features'] = self._features
+        return self._features
+    
     def calculate_arpu(self, money_data, abgroup_data, platform_data=None):
         """
         Calculate ARPU (Average Revenue Per User) by group and platform
         """
         print("=== Calculating ARPU ===")
         
-        # Merge money data with AB groups
-        revenue_by_player = money_data.groupby('player_id')['money_amount'].sum().reset_index()
-        revenue_with_groups = pd.merge(revenue_by_player, abgroup_data, on='player_id', how='right')
-        
-        # Fill NaN values with 0 (non-paying users)
-        revenue_with_groups['money_amount'] = revenue_with_groups['money_amount'].fillna(0)
+        # Revenue per player from the shared feature table (non-paying users have 0);
+        # group and platform come along by index instead of merges
+        features = self._player_features(abgroup_data, platform_data, money=money_data)
+        players, revenue = features.players, features['money']
         
-        # Add platform info if provided
-        if platform_data is not None:
-            revenue_with_groups = pd.merge(revenue_with_groups, platform_data, on='player_id', how='left')
-        
-        # Calculate ARPU by group
-        arpu_by_group = revenue_with_groups.groupby('group')['money_amount'].agg([
-            'mean', 'std', 'count'
-        ]).round(2)
+        # Calculate ARPU by group (one bincount pass over group x platform cells)
+        cells = CellStats.from_players(players, revenue)
+        arpu_by_group = cells.summary(columns=('mean', 'std', 'count')).round(2)
         
         print("ARPU by Group:")
         print(arpu_by_group)
         
         # Calculate ARPU by group and platform if platform data available
         if platform_data is not None:
-            arpu_by_platform = revenue_with_groups.groupby(['group', 'platform'])['money_amount'].agg([
-                'mean', 'std', 'count'
-            ]).round(2)
+            arpu_by_platform = cells.summary(by=('group', 'platform'),
+                                          columns=('mean', 'std', 'count')).round(2)
             
             print("\nARPU by Group and Platform:")
             print(arpu_by_platform)
@@ -51,7 +73,7 @@ class ABTestAnalyzer:
             self.results['arpu_by_platform'] = arpu_by_platform
         
         self.results['arpu_by_group'] = arpu_by_group
-        self.results['revenue_data'] = revenue_with_groups
+        self.results['arpu_cells'] = cells
         
         return arpu_by_group
     
@@ -61,28 +83,21 @@ class ABTestAnalyzer:
         """
         print("\n=== Calculating ARPPU ===")
         
-        # Get only paying users (money_amount > 0)
-        paying_users = money_data[money_data['money_amount'] > 0]
-        revenue_by_player = paying_users.groupby('player_id')['money_amount'].sum().reset_index()
-        revenue_with_groups = pd.merge(revenue_by_player, abgroup_data, on='player_id', how='inner')
-        
-        # Add platform info if provided
-        if platform_data is not None:
-            revenue_with_groups = pd.merge(revenue_with_groups, platform_data, on='player_id', how='left')
+        # Paying users: at least one payment with money_amount > 0
+        features = self._player_features(abgroup_data, platform_data, money=money_data)
+        players, revenue, paying = features.players, features['paying_money'], features.paying
         
-        # Calculate ARPPU by group
-        arppu_by_group = revenue_with_groups.groupby('group')['money_amount'].agg([
-            'mean', 'std', 'count'
-        ]).round(2)
+        # Calculate ARPPU by group (one bincount pass over group x platform cells)
+        cells = CellStats.from_players(players, revenue, rows=paying)
+        arppu_by_group = cells.summary(columns=('mean', 'std', 'count')).round(2)
         
         print("ARPPU by Group:")
         print(arppu_by_group)
         
         # Calculate ARPPU by group and platform if platform data available
         if platform_data is not None:
-            arppu_by_platform = revenue_with_groups.groupby(['group', 'platform'])['money_amount'].agg([
-                'mean', 'std', 'count'
-            ]).round(2)
+            arppu_by_platform = cells.summary(by=('group', 'platform'),
+                                          columns=('mean', 'std', 'count')).round(2)
             
             print("\nARPPU by Group and Platform:")
             print(arppu_by_platform)
@@ -90,7 +105,7 @@ class ABTestAnalyzer:
             self.results['arppu_by_platform'] = arppu_by_platform
         
         self.results['arppu_by_group'] = arppu_by_group
-        self.results['paying_users_data'] = revenue_with_groups
+        self.results['arppu_cells'] = cells
         
         return arppu_by_group
     
@@ -100,30 +115,21 @@ class ABTestAnalyzer:
         """
         print("\n=== Calculating Cash Spending ===")
         
-        # Merge cash data with AB groups
-        cash_by_player = cash_data.groupby('player_id')['cash_amount'].sum().reset_index()
-        cash_with_groups = pd.merge(cash_by_player, abgroup_data, on='player_id', how='right')
+        # Cash per player from the shared feature table (0 for players without spending)
+        features = self._player_features(abgroup_data, platform_data, cash=cash_data)
+        players, cash = features.players, features['cash']
         
-        # Fill NaN values with 0
-        cash_with_groups['cash_amount'] = cash_with_groups['cash_amount'].fillna(0)
-        
-        # Add platform info if provided
-        if platform_data is not None:
-            cash_with_groups = pd.merge(cash_with_groups, platform_data, on='player_id', how='left')
-        
-        # Calculate cash spending by group
-        cash_by_group = cash_with_groups.groupby('group')['cash_amount'].agg([
-            'mean', 'std', 'count'
-        ]).round(2)
+        # Calculate cash spending by group (one bincount pass over group x platform cells)
+        cells = CellStats.from_players(players, cash)
+        cash_by_group = cells.summary(columns=('mean', 'std', 'count')).round(2)
         
         print("Cash Spending by Group:")
         print(cash_by_group)
         
         # Calculate by group and platform if platform data available
         if platform_data is not None:
-            cash_by_platform = cash_with_groups.groupby(['group', 'platform'])['cash_amount'].agg([
-                'mean', 'std', 'count'
-            ]).round(2)
+            cash_by_platform = cells.summary(by=('group', 'platform'),
+                                          columns=('mean', 'std', 'count')).round(2)
             
             print("\nCash Spending by Group and Platform:")
             print(cash_by_platform)
@@ -131,37 +137,54 @@ class ABTestAnalyzer:
             self.results['cash_by_platform'] = cash_by_platform
         
         self.results['cash_by_group'] = cash_by_group
-        self.results['cash_data'] = cash_with_groups
+        self.results['cash_cells'] = cells
         
         return cash_by_group
     
+    def _grouped_sums(self, data, metric_columns, group_column='group'):
+        """count/sum/sum of squares of each metric per group, in one grouped pass"""
+        return self.backend.group_sums(data, metric_columns, group_column)
+    
+    def calculate_confidence_intervals_batch(self, data, metric_columns, group_column='group',
+                                             confidence_levels=(0.95,)):
+        """
+        Confidence intervals for every group, metric and confidence level at once
+        
+        One grouped pass collects count/sum/sum of squares per group; the
+        intervals are derived from those. Boolean columns (e.g. a paying
+        flag) give intervals for the rate. Returns a tidy frame with
+        metric, group, confidence, mean, std_error, ci_lower, ci_upper,
+        margin and n columns, ready for Excel export.
+        """
+        sums = self._grouped_sums(data, metric_columns, group_column)
+        frames = [
+            tidy_confidence_intervals(metric, sums.index, sums['n'], sums[f'{metric}__sum'],
+                                      sums[f'{metric}__sumsq'], confidence_levels)
+            for metric in metric_columns
+        ]
+        intervals = pd.concat(frames, ignore_index=True)
+        self.results['confidence_intervals'] = intervals
+        return intervals
+    
     def calculate_confidence_intervals(self, data, metric_column, group_column='group', confidence=0.95):
         """
         Calculate 95% confidence intervals for metrics by group
         """
         print(f"\n=== Calculating {confidence*100}% Confidence Intervals ===")
         
-        alpha = 1 - confidence
+        intervals = self.calculate_confidence_intervals_batch(
+            data, [metric_column], group_column, confidence_levels=(confidence,))
         results = {}
         
-        for group in data[group_column].unique():
-            group_data = data[data[group_column] == group][metric_column]
-            
-            n = len(group_data)
-            mean = group_data.mean()
-            std_err = stats.sem(group_data)
-            
-            # Calculate confidence interval
-            ci = stats.t.interval(confidence, n-1, loc=mean, scale=std_err)
-            
-            results[group] = {
-                'mean': mean,
-                'ci_lower': ci[0],
-                'ci_upper': ci[1],
-                'n': n
+        for row in intervals.itertuples():
+            results[row.group] = {
+                'mean': row.mean,
+                'ci_lower': row.ci_lower,
+                'ci_upper': row.ci_upper,
+                'n': row.n
             }
             
-            print(f"{group}: {mean:.2f} [{ci[0]:.2f}, {ci[1]:.2f}] (n={n})")
+            print(f"{row.group}: {row.mean:.2f} [{row.ci_lower:.2f}, {row.ci_upper:.2f}] (n={row.n})")
         
         return results
     
@@ -175,11 +198,16 @@ class ABTestAnalyzer:
         if len(groups) != 2:
             print("Warning: More than 2 groups found. Using first two groups for comparison.")
         
-        group_a = data[data[group_column] == groups[0]][metric_column]
-        group_b = data[data[group_column] == groups[1]][metric_column]
-        
-        # Perform independent t-test
-        t_stat, p_value = stats.ttest_ind(group_a, group_b)
+        # Independent t-test from per-group count/sum/sum of squares (one grouped pass)
+        sums = self._grouped_sums(data, [metric_column], group_column)
+        (n_a, mean_a, var_a), (n_b, mean_b, var_b) = [
+            (sums.loc[group, 'n'],) + moments(sums.loc[group, 'n'],
+                                              sums.loc[group, f'{metric_column}__sum'],
+                                              sums.loc[group, f'{metric_column}__sumsq'])
+            for group in groups[:2]
+        ]
+        t_stat, p_value = ttest_from_stats(n_a, mean_a, var_a, n_b, mean_b, var_b)
+        t_stat, p_value = float(t_stat), float(p_value)
         
         print(f"T-test results for {metric_column}:")
         print(f"  {groups[0]} vs {groups[1]}")
@@ -225,6 +253,9 @@ class ABTestAnalyzer:
                 self.results['arppu_by_group'].to_excel(writer, sheet_name='ARPPU_by_Group')
             if 'cash_by_group' in self.results:
                 self.results['cash_by_group'].to_excel(writer, sheet_name='Cash_by_Group')
+            if 'confidence_intervals' in self.results:
+                self.results['confidence_intervals'].to_excel(
+                    writer, sheet_name='Confidence_Intervals', index=False)
             
             # Summary table
             summary = self.create_summary_table()
@@ -253,9 +284,11 @@ if __name__ == "__main__":
     analyzer.calculate_arppu(final_data['money'], final_data['abgroup'], final_data['platforms'])
     analyzer.calculate_cash_spending(final_data['cash'], final_data['abgroup'], final_data['platforms'])
     
-    # Calculate confidence intervals
-    if 'revenue_data' in analyzer.results:
-        analyzer.calculate_confidence_intervals(analyzer.results['revenue_data'], 'money_amount')
+    # Calculate confidence intervals (revenue and paying rate, several levels in one pass)
+    if 'player_features' in analyzer.results:
+        player_table = analyzer.results['player_features'].frame(columns=['money', 'cash'])
+        analyzer.calculate_confidence_intervals_batch(
+            player_table, ['money', 'paying', 'cash'], confidence_levels=(0.90, 0.95, 0.99))
     
     # Export results
     analyzer.export_results() 
\ No newline at end of file
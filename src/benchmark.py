@@ -0,0 +1,295 @@
+"""
+Benchmark Suite for the A/B analysis pipeline
+Runs every stage (load, cheater removal, outlier detection, metrics,
+statistical tests, export) on generated datasets of several sizes, records
+time and peak memory per stage as JSON and diffs them against a baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from generate_data import generate_experiment_data
+
+SRC_DIR = Path(__file__).resolve().parent
+
+DEFAULT_SIZES = ('1M', '10M', '50M')
+SUITES = ('full', 'modular')
+
+# A stage regresses when it is this much slower / larger than the baseline
+# and also slower by more than MIN_SECONDS (sub-second noise is ignored)
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.15
+MIN_SECONDS = 0.25
+
+
+def parse_size(size):
+    """Player count from 1000000, '1M', '500k'"""
+    text = str(size).strip().upper()
+    factor = {'K': 1_000, 'M': 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def size_label(n_players):
+    return f"{n_players // 1_000_000}M" if n_players % 1_000_000 == 0 else f"{n_players // 1_000}k"
+
+
+def ensure_dataset(data_root, n_players, seed=0):
+    """Generated dataset of n_players under data_root/players_<size>/data (reused when present)"""
+    case_dir = Path(data_root) / f"players_{size_label(n_players)}"
+    data_dir = case_dir / 'data'
+    manifest_path = data_dir / 'synthetic_data.json'
+    if manifest_path.exists():
+        with open(manifest_path, encoding='utf-8') as f:
+            params = json.load(f)['params']
+        if params['n_players'] == n_players and params['seed'] == seed:
+            return case_dir
+    print(f"Generating {n_players:,} players into {data_dir}...")
+    generate_experiment_data(data_dir, n_players, seed=seed, columnar=False)
+    return case_dir
+
+
+def _stage_paths(records):
+    """Stage records with nested names ('clean/outlier_detection')"""
+    stack, rows = [], []
+    for record in records:
+        del stack[record['depth']:]
+        stack.append(record['stage'])
+        rows.append({'stage': '/'.join(stack), 'wall_seconds': record['wall_seconds'],
+                     'cpu_seconds': record['cpu_seconds'], 'peak_rss_mb': record['peak_rss_mb'],
+                     'rows': record['rows']})
+    return rows
+
+
+def _run_full(data_dir):
+    """FullABAnalysis stage by stage (no stage cache, CSVs parsed every run)"""
+    from full_analysis_logged import FullABAnalysis
+
+    analyzer = FullABAnalysis(data_path=data_dir, use_cache=False)
+    data = analyzer.load_and_explore_data()
+    cleaned_data = analyzer.clean_and_filter_data(data)
+    results = analyzer.analyze_ab_groups(cleaned_data)
+    results['final_report'] = analyzer.generate_final_report(results)
+    analyzer.export_results(results)
+    return analyzer.logger.stage_metrics
+
+
+def _run_modular(data_dir):
+    """DataLoader -> DataCleaner -> ABTestAnalyzer, each step as a stage"""
+    from ab_analysis import ABTestAnalyzer
+    from data_cleaner import DataCleaner
+    from data_loader import DataLoader
+    from logger_config import setup_logging
+
+    logger = setup_logging("../logs")
+    with logger.stage('load') as stage:
+        data = DataLoader(data_dir, use_cache=False).load_all_data()
+        # The modular classes use the legacy amount column names
+        data = {name: df.rename(columns={'money': 'money_amount', 'cash': 'cash_amount'})
+                for name, df in data.items()}
+        stage['rows'] = sum(len(df) for df in data.values())
+
+    cleaner = DataCleaner(data)
+    with logger.stage('cheater_removal'):
+        cleaned_data = cleaner.remove_known_cheaters()
+    with logger.stage('outlier_detection'):
+        potential_cheaters = cleaner.detect_potential_cheaters(cleaned_data['cash'])
+    with logger.stage('outlier_removal') as stage:
+        final_data = cleaner.remove_potential_cheaters(potential_cheaters)
+        stage['rows'] = sum(len(df) for df in final_data.values())
+
+    analyzer = ABTestAnalyzer(final_data)
+    with logger.stage('arpu'):
+        analyzer.calculate_arpu(final_data['money'], final_data['abgroup'], final_data['platforms'])
+    with logger.stage('arppu'):
+        analyzer.calculate_arppu(final_data['money'], final_data['abgroup'], final_data['platforms'])
+    with logger.stage('cash'):
+        analyzer.calculate_cash_spending(final_data['cash'], final_data['abgroup'], final_data['platforms'])
+
+    player_table = analyzer.results['player_features'].frame(columns=['money', 'cash'])
+    with logger.stage('confidence_intervals'):
+        analyzer.calculate_confidence_intervals_batch(
+            player_table, ['money', 'paying', 'cash'], confidence_levels=(0.90, 0.95, 0.99))
+    with logger.stage('statistical_tests'):
+        for metric in ('money', 'cash'):
+            analyzer.test_statistical_significance(player_table, metric)
+    with logger.stage('export'):
+        analyzer.export_results("benchmark_results.xlsx")
+    return logger.stage_metrics
+
+
+def run_case(case_dir, suite):
+    """
+    Run one suite on one dataset in a fresh process
+
+    A separate process per case keeps peak RSS of one size from leaking
+    into the next. Returns {'stages': [...], 'total_seconds', 'peak_rss_mb'}.
+    """
+    case_dir = Path(case_dir).resolve()
+    work_dir = case_dir / 'work'
+    for directory in (work_dir, work_dir / 'reports', case_dir / 'logs', case_dir / 'reports'):
+        directory.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        output_path = Path(f.name)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(SRC_DIR), os.environ.get('PYTHONPATH')])))
+    try:
+        subprocess.run([sys.executable, str(SRC_DIR / 'benchmark.py'), '--run-case', str(case_dir / 'data'),
+                        '--suite', suite, '--case-output', str(output_path)],
+                       cwd=work_dir, env=env, check=True, stdout=subprocess.DEVNULL)
+        with open(output_path, encoding='utf-8') as f:
+            records = json.load(f)
+    finally:
+        output_path.unlink(missing_ok=True)
+
+    top_level = [record for record in records if record['depth'] == 0]
+    return {
+        'stages': _stage_paths(records),
+        'total_seconds': round(sum(record['wall_seconds'] for record in top_level), 4),
+        'peak_rss_mb': max((record['peak_rss_mb'] or 0) for record in records),
+    }
+
+
+def _best_of(runs):
+    """Per stage minimum over repeated runs of one case"""
+    best = {stage['stage']: dict(stage) for stage in runs[0]['stages']}
+    for run in runs[1:]:
+        for stage in run['stages']:
+            kept = best.setdefault(stage['stage'], dict(stage))
+            for field in ('wall_seconds', 'cpu_seconds', 'peak_rss_mb'):
+                if stage[field] is not None and kept[field] is not None:
+                    kept[field] = min(kept[field], stage[field])
+    return {
+        'stages': list(best.values()),
+        'total_seconds': min(run['total_seconds'] for run in runs),
+        'peak_rss_mb': min(run['peak_rss_mb'] for run in runs),
+        'repeat': len(runs),
+    }
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, suites=SUITES, data_root="../benchmarks", seed=0, repeat=1):
+    """Benchmark every suite at every size (best of `repeat` runs); returns the results document"""
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+        },
+        'cases': [],
+    }
+    for size in sizes:
+        n_players = parse_size(size)
+        case_dir = ensure_dataset(data_root, n_players, seed=seed)
+        for suite in suites:
+            print(f"Running {suite} suite on {n_players:,} players...")
+            case = _best_of([run_case(case_dir, suite) for _ in range(repeat)])
+            results['cases'].append({'suite': suite, 'players': n_players, **case})
+            print(f"  {case['total_seconds']:.2f}s total, peak RSS {case['peak_rss_mb']:,.0f} MB")
+    return results
+
+
+def _stage_table(results):
+    rows = []
+    for case in results['cases']:
+        for stage in case['stages']:
+            rows.append({'suite': case['suite'], 'players': case['players'], **stage})
+        rows.append({'suite': case['suite'], 'players': case['players'], 'stage': 'TOTAL',
+                     'wall_seconds': case['total_seconds'], 'peak_rss_mb': case['peak_rss_mb']})
+    return pd.DataFrame(rows)
+
+
+def compare_to_baseline(results, baseline, time_tolerance=TIME_TOLERANCE,
+                        memory_tolerance=MEMORY_TOLERANCE, min_seconds=MIN_SECONDS):
+    """
+    Per suite / size / stage comparison with a baseline results document
+
+    status is 'regression' (slower or larger beyond tolerance), 'improvement',
+    'ok', 'new' (not in the baseline) or 'missing' (only in the baseline).
+    """
+    keys = ['suite', 'players', 'stage']
+    current = _stage_table(results).set_index(keys)
+    previous = _stage_table(baseline).set_index(keys)
+    diff = current[['wall_seconds', 'peak_rss_mb']].join(
+        previous[['wall_seconds', 'peak_rss_mb']], how='outer', rsuffix='_baseline')
+    diff['time_ratio'] = (diff['wall_seconds'] / diff['wall_seconds_baseline']).round(3)
+    diff['memory_ratio'] = (diff['peak_rss_mb'] / diff['peak_rss_mb_baseline']).round(3)
+
+    slower = ((diff['time_ratio'] > 1 + time_tolerance)
+              & (diff['wall_seconds'] - diff['wall_seconds_baseline'] > min_seconds))
+    larger = diff['memory_ratio'] > 1 + memory_tolerance
+    faster = ((diff['time_ratio'] < 1 - time_tolerance)
+              & (diff['wall_seconds_baseline'] - diff['wall_seconds'] > min_seconds))
+    diff['status'] = np.select(
+        [diff['wall_seconds_baseline'].isna(), diff['wall_seconds'].isna(), slower | larger, faster],
+        ['new', 'missing', 'regression', 'improvement'], default='ok')
+    return diff.reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the A/B analysis pipeline")
+    parser.add_argument('--sizes', nargs='+', default=list(DEFAULT_SIZES), help="player counts, e.g. 1M 10M 50M")
+    parser.add_argument('--suites', nargs='+', default=list(SUITES), choices=SUITES)
+    parser.add_argument('--data-root', default='../benchmarks', help="generated datasets and run directories")
+    parser.add_argument('--output', help="results JSON (default <data-root>/results_<timestamp>.json)")
+    parser.add_argument('--baseline', help="baseline JSON to diff against (default <data-root>/baseline.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per case; the fastest run counts")
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE)
+    parser.add_argument('--min-seconds', type=float, default=MIN_SECONDS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    parser.add_argument('--suite', help=argparse.SUPPRESS)
+    parser.add_argument('--case-output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        # Worker process of run_case
+        records = (_run_full if args.suite == 'full' else _run_modular)(args.run_case)
+        with open(args.case_output, 'w', encoding='utf-8') as f:
+            json.dump(records, f)
+        return 0
+
+    data_root = Path(args.data_root)
+    results = run_benchmarks(args.sizes, args.suites, data_root, seed=args.seed, repeat=args.repeat)
+    output = Path(args.output) if args.output else \
+        data_root / f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"✓ Results saved to: {output}")
+
+    status = 0
+    baseline_path = Path(args.baseline) if args.baseline else data_root / 'baseline.json'
+    if baseline_path.exists() and not args.save_baseline:
+        with open(baseline_path, encoding='utf-8') as f:
+            diff = compare_to_baseline(results, json.load(f), args.time_tolerance,
+                                       args.memory_tolerance, args.min_seconds)
+        print(f"\nComparison with {baseline_path}:")
+        print(diff.to_string(index=False))
+        regressions = diff[diff['status'] == 'regression']
+        if len(regressions):
+            print(f"\n❌ {len(regressions)} regression(s)")
+            status = 1
+        else:
+            print("\n✅ No regressions")
+    if args.save_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"✓ Baseline saved to: {baseline_path}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
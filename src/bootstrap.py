@@ -0,0 +1,179 @@
+"""
+Poisson Bootstrap for A/B Test Lift Intervals
+Every player gets an independent Poisson(1) weight per replicate instead
+of resampling rows, so players can be processed in fixed-size chunks
+(in parallel) and only per-group weighted sums are kept
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Players per chunk: a chunk holds n_boot x chunk_size weights in memory
+DEFAULT_CHUNK_SIZE = 4096
+
+# Chunks submitted ahead per worker; bounds the pending arguments and results
+JOBS_IN_FLIGHT_PER_WORKER = 2
+
+
+def _chunk_sums(group_codes, columns, n_groups, n_boot, seed_sequence):
+    """
+    Weighted per-group sums of one chunk of players for every replicate
+
+    columns is a (players, k) matrix; returns an (n_boot, n_groups, k) array.
+    The chunk's own seed sequence makes the result independent of how
+    chunks are spread over workers.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    weights = rng.poisson(1.0, size=(n_boot, len(group_codes))).astype('float64')
+    sums = np.zeros((n_boot, n_groups, columns.shape[1]))
+    for group in range(n_groups):
+        in_group = group_codes == group
+        if in_group.any():
+            sums[:, group, :] = weights[:, in_group] @ columns[in_group]
+    return sums
+
+
+def _chunk_job(args):
+    return _chunk_sums(*args)
+
+
+def poisson_bootstrap_sums(group_codes, columns, n_groups, n_boot=1000, seed=0,
+                           chunk_size=DEFAULT_CHUNK_SIZE, max_workers=1):
+    """
+    Bootstrap replicates of per-group column sums
+
+    group_codes: int array, one code per player (negative = skip);
+    columns: (players, k) float matrix of per-player values. Returns an
+    (n_boot, n_groups, k) array. Peak memory is about
+    max_workers * n_boot * chunk_size weights, whatever the player count:
+    only a few chunks per worker are submitted ahead, and their sums are
+    added in chunk order as they come back.
+    """
+    group_codes = np.asarray(group_codes, dtype='int64')
+    columns = np.asarray(columns, dtype='float64').reshape(len(group_codes), -1)
+    starts = range(0, len(group_codes), chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+
+    jobs = (
+        (group_codes[start:start + chunk_size], columns[start:start + chunk_size],
+         n_groups, n_boot, chunk_seed)
+        for start, chunk_seed in zip(starts, seeds)
+    )
+
+    totals = np.zeros((n_boot, n_groups, columns.shape[1]))
+    if max_workers is not None and max_workers <= 1:
+        for job in jobs:
+            totals += _chunk_job(job)
+    else:
+        workers = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque()
+            for job in jobs:
+                in_flight.append(executor.submit(_chunk_job, job))
+                if len(in_flight) >= workers * JOBS_IN_FLIGHT_PER_WORKER:
+                    totals += in_flight.popleft().result()
+            while in_flight:
+                totals += in_flight.popleft().result()
+    return totals
+
+
+def _lift(mean_control, mean_test):
+    return (mean_test - mean_control) / mean_control * 100
+
+
+def _jackknife_acceleration(group_codes, values, included, control, test):
+    """
+    BCa acceleration from the exact leave-one-player-out lift values
+
+    Dropping one player only changes its group's count and sum, so all
+    n jackknife estimates come from the group totals in one vector pass.
+    """
+    jackknife = []
+    n, total = {}, {}
+    for group in (control, test):
+        in_group = (group_codes == group) & included
+        n[group] = np.count_nonzero(in_group)
+        total[group] = values[in_group].sum()
+        jackknife.append(values[in_group])
+
+    mean = {group: total[group] / n[group] for group in (control, test)}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        without_control = _lift((total[control] - jackknife[0]) / (n[control] - 1), mean[test])
+        without_test = _lift(mean[control], (total[test] - jackknife[1]) / (n[test] - 1))
+    estimates = np.concatenate([without_control, without_test])
+
+    deviation = estimates.mean() - estimates
+    denominator = 6 * np.sum(deviation ** 2) ** 1.5
+    return float(np.sum(deviation ** 3) / denominator) if denominator > 0 else 0.0
+
+
+def _bca_interval(replicates, estimate, acceleration, confidence):
+    """Bias-corrected and accelerated percentile interval"""
+    replicates = replicates[np.isfinite(replicates)]
+    below = np.mean(replicates < estimate) + 0.5 * np.mean(replicates == estimate)
+    z0 = stats.norm.ppf(np.clip(below, 1e-12, 1 - 1e-12))
+    z = stats.norm.ppf([(1 - confidence) / 2, (1 + confidence) / 2])
+    adjusted = stats.norm.cdf(z0 + (z0 + z) / (1 - acceleration * (z0 + z)))
+    return np.quantile(replicates, adjusted)
+
+
+def bootstrap_lift_intervals(group_codes, group_names, metrics, control='control', test='test',
+                             n_boot=1000, confidence=0.95, seed=0,
+                             chunk_size=DEFAULT_CHUNK_SIZE, max_workers=1):
+    """
+    Percentile and BCa bootstrap intervals for the lift (%) of each metric
+
+    metrics: {name: (values, included)} with per-player arrays aligned with
+    group_codes; `included` (bool array or None) restricts the metric to
+    some players, e.g. payers for ARPPU. All metrics share the same Poisson
+    weights. Returns one row per metric and interval method.
+    """
+    names = list(group_names)
+    group_codes = np.asarray(group_codes, dtype='int64')
+    c, t = names.index(control), names.index(test)
+
+    # One (count, sum) column pair per metric
+    prepared, columns = {}, []
+    for metric, (values, included) in metrics.items():
+        values = np.asarray(values, dtype='float64')
+        included = np.ones(len(values), dtype=bool) if included is None else np.asarray(included, dtype=bool)
+        prepared[metric] = (values, included)
+        columns += [included.astype('float64'), np.where(included, values, 0.0)]
+
+    sums = poisson_bootstrap_sums(group_codes, np.column_stack(columns), len(names), n_boot=n_boot,
+                                  seed=seed, chunk_size=chunk_size, max_workers=max_workers)
+
+    rows = []
+    for i, (metric, (values, included)) in enumerate(prepared.items()):
+        mean_c = values[(group_codes == c) & included].mean()
+        mean_t = values[(group_codes == t) & included].mean()
+        estimate = _lift(mean_c, mean_t)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            boot_means = sums[:, :, 2 * i + 1] / sums[:, :, 2 * i]
+        replicates = _lift(boot_means[:, c], boot_means[:, t])
+
+        acceleration = _jackknife_acceleration(group_codes, values, included, c, t)
+        finite = replicates[np.isfinite(replicates)]
+        intervals = {
+            'percentile': np.quantile(finite, [(1 - confidence) / 2, (1 + confidence) / 2]),
+            'bca': _bca_interval(replicates, estimate, acceleration, confidence),
+        }
+        for method, (lower, upper) in intervals.items():
+            rows.append({
+                'metric': metric,
+                'method': method,
+                'lift': estimate,
+                'ci_lower': lower,
+                'ci_upper': upper,
+                'confidence': confidence,
+                'boot_std': finite.std(ddof=1),
+                'acceleration': acceleration,
+                'n_boot': n_boot,
+            })
+    return pd.DataFrame(rows)
@@ -0,0 +1,107 @@
+"""
+Columnar On-Disk Cache for the raw experiment CSVs
+Keeps a Parquet copy of each typed table next to the data and
+rebuilds it whenever the source file changes
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 - required by DataFrame.to_parquet
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def file_content_hash(file_path):
+    """BLAKE2b digest of the file contents, read in blocks"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ColumnarCache:
+    """
+    Parquet cache keyed by source size, mtime and content hash
+
+    size/mtime are checked first; the content hash is only recomputed when
+    they disagree, so a touched-but-unchanged file does not force a rebuild.
+    `version` lets callers invalidate every entry (e.g. on schema changes).
+    """
+
+    def __init__(self, cache_dir, version=""):
+        self.cache_dir = Path(cache_dir)
+        self.version = version
+
+    def _paths(self, name):
+        return self.cache_dir / f"{name}.parquet", self.cache_dir / f"{name}.json"
+
+    def _read_meta(self, meta_path):
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta_path, meta):
+        tmp_path = meta_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, meta_path)
+
+    def is_fresh(self, name, source_path):
+        """Check whether the cached copy still matches the source file"""
+        table_path, meta_path = self._paths(name)
+        meta = self._read_meta(meta_path)
+        if meta is None or not table_path.exists():
+            return False
+
+        stat = Path(source_path).stat()
+        if meta.get('version') != self.version or meta.get('size') != stat.st_size:
+            return False
+        if meta.get('mtime_ns') == stat.st_mtime_ns:
+            return True
+
+        # mtime moved: only a content change invalidates the copy
+        if meta.get('content_hash') != file_content_hash(source_path):
+            return False
+        meta['mtime_ns'] = stat.st_mtime_ns
+        self._write_meta(meta_path, meta)
+        return True
+
+    def load(self, name, source_path, reader):
+        """
+        Return the table for `name`, from cache when fresh
+
+        `reader` is called with no arguments to build the table from the
+        source file on a cache miss; its result is written to the cache.
+        """
+        table_path, meta_path = self._paths(name)
+        if self.is_fresh(name, source_path):
+            return pd.read_parquet(table_path)
+
+        stat = Path(source_path).stat()
+        content_hash = file_content_hash(source_path)
+        df = reader()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = table_path.with_suffix('.parquet.tmp')
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, table_path)
+        self._write_meta(meta_path, {
+            'source': str(source_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'content_hash': content_hash,
+            'version': self.version,
+        })
+        return df
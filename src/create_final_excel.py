@@ -6,48 +6,124 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
+from excel_export import StreamingExcelWriter
+from segment_cube import SegmentCube
+from results_artifact import load_latest_artifact
 
-def create_comprehensive_excel_report():
-    """Создание полного Excel отчёта со всеми таблицами"""
+# Метрики артефакта результатов: название в отчёте и число знаков после запятой
+METRIC_ROWS = {'arpu': ('ARPU (USD)', 4), 'arppu': ('ARPPU (USD)', 4), 'cash': ('Траты валюты (монеты)', 2)}
+METRIC_NAMES = {'arpu': 'ARPU', 'arppu': 'ARPPU', 'cash': 'Траты валюты'}
+
+# Относительное изменение, начиная с которого эффект считается практически значимым
+PRACTICAL_LIFT_PERCENT = 1.0
+
+RECOMMENDATIONS = {
+    'IMPLEMENT CAMPAIGN PERMANENTLY': '✅ ВНЕДРИТЬ АКЦИЮ НА ПОСТОЯННОЙ ОСНОВЕ',
+    'IMPLEMENT WITH MODIFICATIONS': '⚠️ ВНЕДРИТЬ АКЦИЮ С ДОРАБОТКАМИ',
+    'DO NOT IMPLEMENT': '❌ НЕ ВНЕДРЯТЬ АКЦИЮ',
+}
+
+def format_p_value(p_value):
+    return '< 0.000001' if p_value < 1e-6 else f'{p_value:.6f}'
+
+def yes_no(flag):
+    return '✅ ДА' if flag else '❌ НЕТ'
+
+def effect_size_label(cohens_d):
+    d = abs(cohens_d)
+    return 'Малый' if d < 0.5 else 'Средний' if d < 0.8 else 'Большой'
+
+def create_comprehensive_excel_report(artifact=None):
+    """
+    Создание полного Excel отчёта со всеми таблицами
     
-    # Создание Excel writer
+    artifact - артефакт результатов run_complete_analysis() (ResultsArtifact);
+    без него - значения итогового анализа курсовой работы
+    """
+    
+    # Потоковый writer: оформление и ширина колонок задаются при записи,
+    # без повторного открытия файла
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"../reports/Финальная_работа_AB_тест_{timestamp}.xlsx"
     
-    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+    with StreamingExcelWriter(filename) as writer:
         
         # Лист 1: Основные результаты
-        create_main_results_sheet(writer)
+        create_main_results_sheet(writer, artifact)
         
         # Лист 2: ARPU по группам и платформам
-        create_arpu_analysis_sheet(writer)
+        create_arpu_analysis_sheet(writer, artifact=artifact)
         
         # Лист 3: Доверительные интервалы
-        create_confidence_intervals_sheet(writer)
+        create_confidence_intervals_sheet(
+            writer, artifact.table('confidence_intervals') if artifact is not None else None)
         
         # Лист 4: Статистические тесты
-        create_statistical_tests_sheet(writer)
+        create_statistical_tests_sheet(writer, artifact)
         
         # Лист 5: Очистка данных
-        create_data_cleaning_sheet(writer)
+        create_data_cleaning_sheet(writer, artifact)
         
         # Лист 6: Проекция дохода
-        create_revenue_projection_sheet(writer)
+        create_revenue_projection_sheet(writer, artifact)
         
         # Лист 7: Бизнес-рекомендации
-        create_business_recommendations_sheet(writer)
-    
-    # Форматирование Excel файла
-    format_excel_file(filename)
+        create_business_recommendations_sheet(writer, artifact)
     
     print(f"✅ Создан итоговый Excel файл: {filename}")
     return filename
 
-def create_main_results_sheet(writer):
-    """Лист 1: Основные результаты анализа"""
+def main_results_from_artifact(artifact):
+    """Таблицы основных результатов и выборки из артефакта результатов"""
+    rows = []
+    for metric, (name, digits) in METRIC_ROWS.items():
+        entry = artifact.metric(metric)
+        control, test = entry['groups']['control']['mean'], entry['groups']['test']['mean']
+        significant = entry['p_value'] < 0.05
+        rows.append({
+            'Метрика': name,
+            'Контрольная группа': round(control, digits),
+            'Тестовая группа': round(test, digits),
+            'Абсолютное изменение': round(test - control, digits),
+            'Относительное изменение (%)': round(entry['lift_percent'], 2),
+            'p-значение': format_p_value(entry['p_value']),
+            'Статистически значимо': yes_no(significant),
+            'Практически значимо': yes_no(significant and abs(entry['lift_percent']) >= PRACTICAL_LIFT_PERCENT)
+        })
+    
+    cleaning, groups = artifact.summary['cleaning'], artifact.summary['groups']
+    removed = {rule['rule']: rule['added'] for rule in cleaning['rules']}
+    total, kept = cleaning['players'], cleaning['kept']
+    sample_info = pd.DataFrame({
+        'Показатель': [
+            'Исходное количество игроков',
+            'Удалено читеров',
+            'Удалено статистических выбросов',
+            'Финальная выборка',
+            'Контрольная группа',
+            'Тестовая группа',
+            'Процент сохранённых данных'
+        ],
+        'Значение': [
+            f'{total:,}',
+            f"{removed.get('known_cheaters', 0):,} ({removed.get('known_cheaters', 0) / total:.3%})",
+            f"{removed.get('cash_outliers', 0):,} ({removed.get('cash_outliers', 0) / total:.3%})",
+            f'{kept:,}',
+            f"{groups['control']:,} ({groups['control'] / kept:.1%})",
+            f"{groups['test']:,} ({groups['test'] / kept:.1%})",
+            f'{kept / total:.3%}'
+        ]
+    })
+    return pd.DataFrame(rows), sample_info
+
+def create_main_results_sheet(writer, artifact=None):
+    """Лист 1: Основные результаты анализа (artifact - артефакт результатов)"""
+    
+    if artifact is not None:
+        main_results, sample_info = main_results_from_artifact(artifact)
+        writer.write(main_results, 'Основные результаты', index=False)
+        writer.write(sample_info, 'Основные результаты', startrow=len(main_results) + 3, index=False)
+        return
     
     # Основная сводная таблица
     main_results = pd.DataFrame({
@@ -61,7 +137,7 @@ def create_main_results_sheet(writer):
         'Практически значимо': ['✅ ДА', '✅ ДА', '✅ ДА']
     })
     
-    main_results.to_excel(writer, sheet_name='Основные результаты', index=False)
+    writer.write(main_results, 'Основные результаты', index=False)
     
     # Информация о выборке
     sample_info = pd.DataFrame({
@@ -87,11 +163,55 @@ def create_main_results_sheet(writer):
     
     # Добавление информации о выборке на тот же лист
     startrow = len(main_results) + 3
-    sample_info.to_excel(writer, sheet_name='Основные результаты', 
-                        startrow=startrow, index=False)
+    writer.write(sample_info, 'Основные результаты',
+                 startrow=startrow, index=False)
+
+def platform_arpu_from_cube(cube):
+    """Таблицы ARPU по платформам и улучшений из сегментного куба (SegmentCube)"""
+    return platform_arpu_tables(cube.query('money', by=('platform', 'group'), rule='kept').reset_index())
 
-def create_arpu_analysis_sheet(writer):
-    """Лист 2: ARPU по группам и платформам"""
+def platform_arpu_tables(arpu):
+    """Таблицы ARPU по платформам и улучшений из count/mean/std по платформе и группе"""
+    platform_arpu = pd.DataFrame({
+        'Платформа': arpu['platform'].astype(str),
+        'Группа': arpu['group'].astype(str).str.capitalize(),
+        'Количество игроков': arpu['count'],
+        'ARPU (USD)': arpu['mean'].round(4),
+        'Стандартное отклонение': arpu['std'].round(4),
+    })
+    
+    means = arpu.pivot(index='platform', columns='group', values='mean')
+    lift = (means['test'] - means['control']) / means['control'] * 100
+    platform_improvements = pd.DataFrame({
+        'Платформа': means.index.astype(str),
+        'ARPU Control': means['control'].round(4).to_numpy(),
+        'ARPU Test': means['test'].round(4).to_numpy(),
+        'Абсолютное улучшение': (means['test'] - means['control']).round(4).to_numpy(),
+        'Относительное улучшение (%)': lift.round(2).to_numpy(),
+        'Эффективность': np.where(lift >= 10, 'Высокая', np.where(lift >= 3, 'Средняя', 'Низкая'))
+    })
+    return platform_arpu, platform_improvements
+
+def create_arpu_analysis_sheet(writer, cube=None, artifact=None):
+    """
+    Лист 2: ARPU по группам и платформам
+    
+    cube - сегментный куб из FullABAnalysis (SegmentCube или путь к
+    сохранённому кубу), artifact - артефакт результатов; без них -
+    значения из итогового анализа
+    """
+    
+    if cube is not None or artifact is not None:
+        if cube is None:
+            platform_arpu, platform_improvements = platform_arpu_tables(artifact.table('arpu_by_platform_group'))
+        else:
+            if not isinstance(cube, SegmentCube):
+                cube = SegmentCube.load(cube)
+            platform_arpu, platform_improvements = platform_arpu_from_cube(cube)
+        writer.write(platform_arpu, 'ARPU по платформам', index=False)
+        writer.write(platform_improvements, 'ARPU по платформам',
+                     startrow=len(platform_arpu) + 3, index=False)
+        return
     
     # ARPU по платформам и группам
     platform_arpu = pd.DataFrame({
@@ -103,7 +223,7 @@ def create_arpu_analysis_sheet(writer):
         'Медиана': [5.95, 5.95, 5.95, 5.95, 5.95, 5.95]
     })
     
-    platform_arpu.to_excel(writer, sheet_name='ARPU по платформам', index=False)
+    writer.write(platform_arpu, 'ARPU по платформам', index=False)
     
     # Улучшения по платформам
     platform_improvements = pd.DataFrame({
@@ -116,11 +236,39 @@ def create_arpu_analysis_sheet(writer):
     })
     
     startrow = len(platform_arpu) + 3
-    platform_improvements.to_excel(writer, sheet_name='ARPU по платформам', 
-                                  startrow=startrow, index=False)
+    writer.write(platform_improvements, 'ARPU по платформам',
+                 startrow=startrow, index=False)
 
-def create_confidence_intervals_sheet(writer):
-    """Лист 3: 95% Доверительные интервалы"""
+# Названия метрик и столбцов для таблицы доверительных интервалов из анализа
+CI_METRIC_NAMES = {'ARPU': 'ARPU', 'ARPPU': 'ARPPU', 'Cash': 'Траты валюты', 'Conversion': 'Конверсия'}
+CI_COLUMN_NAMES = {
+    'metric': 'Метрика',
+    'group': 'Группа',
+    'confidence': 'Уровень доверия',
+    'mean': 'Среднее значение',
+    'std_error': 'Стандартная ошибка',
+    'ci_lower': 'ДИ нижняя граница',
+    'ci_upper': 'ДИ верхняя граница',
+    'margin': 'Погрешность (±)',
+    'n': 'Размер выборки',
+}
+
+def create_confidence_intervals_sheet(writer, ci_table=None):
+    """
+    Лист 3: Доверительные интервалы
+    
+    ci_table - таблица из FullABAnalysis (results['confidence_intervals']):
+    все метрики, группы и уровни доверия; без неё - значения 95% ДИ
+    """
+    
+    if ci_table is not None:
+        table = ci_table.assign(
+            metric=ci_table['metric'].map(CI_METRIC_NAMES).fillna(ci_table['metric']),
+            group=ci_table['group'].astype(str).str.capitalize(),
+        )
+        table = table[list(CI_COLUMN_NAMES)].rename(columns=CI_COLUMN_NAMES)
+        writer.write(table, 'Доверительные интервалы', index=False)
+        return
     
     # Доверительные интервалы для ARPU
     arpu_ci = pd.DataFrame({
@@ -134,7 +282,7 @@ def create_confidence_intervals_sheet(writer):
         'Размер выборки': [4319928, 4314480]
     })
     
-    arpu_ci.to_excel(writer, sheet_name='Доверительные интервалы', index=False)
+    writer.write(arpu_ci, 'Доверительные интервалы', index=False)
     
     # Доверительные интервалы для ARPPU
     arppu_ci = pd.DataFrame({
@@ -149,8 +297,8 @@ def create_confidence_intervals_sheet(writer):
     })
     
     startrow = len(arpu_ci) + 2
-    arppu_ci.to_excel(writer, sheet_name='Доверительные интервалы', 
-                     startrow=startrow, index=False)
+    writer.write(arppu_ci, 'Доверительные интервалы',
+                 startrow=startrow, index=False)
     
     # Доверительные интервалы для трат валюты
     cash_ci = pd.DataFrame({
@@ -165,11 +313,61 @@ def create_confidence_intervals_sheet(writer):
     })
     
     startrow = len(arpu_ci) + len(arppu_ci) + 4
-    cash_ci.to_excel(writer, sheet_name='Доверительные интервалы', 
-                    startrow=startrow, index=False)
+    writer.write(cash_ci, 'Доверительные интервалы',
+                 startrow=startrow, index=False)
 
-def create_statistical_tests_sheet(writer):
-    """Лист 4: Статистические тесты"""
+def statistical_tests_from_artifact(artifact):
+    """Таблицы t-тестов и интерпретации из артефакта результатов"""
+    entries = {metric: artifact.metric(metric) for metric in METRIC_NAMES}
+    statistical_results = pd.DataFrame([{
+        'Метрика': METRIC_NAMES[metric],
+        'Control среднее': round(entry['groups']['control']['mean'], METRIC_ROWS[metric][1]),
+        'Test среднее': round(entry['groups']['test']['mean'], METRIC_ROWS[metric][1]),
+        'Улучшение (%)': round(entry['lift_percent'], 2),
+        't-статистика': round(entry['t_stat'], 2),
+        'p-значение': format_p_value(entry['p_value']),
+        "Cohen's d": round(entry['cohens_d'], 3),
+        'Размер эффекта': effect_size_label(entry['cohens_d']),
+        'Статистически значимо': yes_no(entry['p_value'] < 0.05),
+        'Высоко значимо (p<0.001)': yes_no(entry['p_value'] < 0.001)
+    } for metric, entry in entries.items()])
+    
+    significant = sum(entry['p_value'] < 0.05 for entry in entries.values())
+    practical = sum(abs(entry['lift_percent']) >= PRACTICAL_LIFT_PERCENT for entry in entries.values())
+    separated = sum(artifact.confidence_interval(metric, 'control')['ci_upper']
+                    < artifact.confidence_interval(metric, 'test')['ci_lower'] for metric in entries)
+    cleaning = artifact.summary['cleaning']
+    positive_platforms = (platform_arpu_tables(artifact.table('arpu_by_platform_group'))[1]
+                          ['Относительное улучшение (%)'] > 0)
+    checks = [
+        ('Статистическая значимость', f'{significant} из {len(entries)} метрик p < 0.05',
+         significant == len(entries)),
+        ('Практическая значимость', f'{practical} из {len(entries)} метрик изменились на '
+         f'{PRACTICAL_LIFT_PERCENT:g}% и более', practical == len(entries)),
+        ('Пересечение доверительных интервалов', f'Интервалы НЕ пересекаются у {separated} из {len(entries)} метрик',
+         separated == len(entries)),
+        ('Размер выборки', f"{cleaning['kept']:,} игроков после очистки", True),
+        ('Качество данных', f"{cleaning['kept'] / cleaning['players']:.1%} данных после очистки",
+         cleaning['kept'] / cleaning['players'] >= 0.99),
+        ('Консистентность результатов', f'Положительный эффект на {int(positive_platforms.sum())} из '
+         f'{len(positive_platforms)} платформ', bool(positive_platforms.all())),
+    ]
+    interpretation = pd.DataFrame({
+        'Критерий оценки': [name for name, _, _ in checks],
+        'Результат': [('✅ ' if passed else '❌ ') + result for _, result, passed in checks],
+        'Оценка': ['ОТЛИЧНО' if passed else 'ТРЕБУЕТ ВНИМАНИЯ' for _, _, passed in checks]
+    })
+    return statistical_results, interpretation
+
+def create_statistical_tests_sheet(writer, artifact=None):
+    """Лист 4: Статистические тесты (artifact - артефакт результатов)"""
+    
+    if artifact is not None:
+        statistical_results, interpretation = statistical_tests_from_artifact(artifact)
+        writer.write(statistical_results, 'Статистические тесты', index=False)
+        writer.write(interpretation, 'Статистические тесты',
+                     startrow=len(statistical_results) + 3, index=False)
+        return
     
     statistical_results = pd.DataFrame({
         'Метрика': ['ARPU', 'ARPPU', 'Траты валюты'],
@@ -184,7 +382,7 @@ def create_statistical_tests_sheet(writer):
         'Высоко значимо (p<0.001)': ['✅ ДА', '✅ ДА', '✅ ДА']
     })
     
-    statistical_results.to_excel(writer, sheet_name='Статистические тесты', index=False)
+    writer.write(statistical_results, 'Статистические тесты', index=False)
     
     # Интерпретация результатов
     interpretation = pd.DataFrame({
@@ -215,11 +413,53 @@ def create_statistical_tests_sheet(writer):
     })
     
     startrow = len(statistical_results) + 3
-    interpretation.to_excel(writer, sheet_name='Статистические тесты', 
-                           startrow=startrow, index=False)
+    writer.write(interpretation, 'Статистические тесты',
+                 startrow=startrow, index=False)
 
-def create_data_cleaning_sheet(writer):
-    """Лист 5: Процесс очистки данных"""
+def data_cleaning_from_artifact(artifact):
+    """Таблицы этапов очистки и методов выявления аномалий из артефакта результатов"""
+    cleaning = artifact.summary['cleaning']
+    total = cleaning['players']
+    added = {rule['rule']: rule['added'] for rule in cleaning['rules']}
+    flagged = {rule['rule']: rule['flagged'] for rule in cleaning['rules']}
+    removed = [0, added.get('known_cheaters', 0), added.get('cash_outliers', 0), 0]
+    cumulative = list(np.cumsum(removed))
+    cleaning_steps = pd.DataFrame({
+        'Этап': [
+            'Исходные данные',
+            'После удаления известных читеров',
+            'После удаления статистических выбросов',
+            'Финальная выборка'
+        ],
+        'Количество игроков': [total - removed_so_far for removed_so_far in cumulative],
+        'Удалено на этапе': removed,
+        'Кумулятивно удалено': cumulative,
+        'Процент сохранено': [round((total - removed_so_far) / total * 100, 3) for removed_so_far in cumulative]
+    })
+    
+    multiplier = artifact.summary['params'].get('threshold_multiplier', 3)
+    methods = pd.DataFrame({
+        'Тип аномалий': ['Известные читеры', 'Статистические выбросы'],
+        'Метод выявления': ['Флаг cheaters = 1', f'IQR метод (Q3 + {multiplier}×IQR)'],
+        'Критерий': ['Прямое указание в данных', f"Траты > {cleaning['outlier_threshold']:,.0f} монет"],
+        'Выявлено': [flagged.get('known_cheaters', 0), flagged.get('cash_outliers', 0)],
+        'Процент от выборки': [f"{flagged.get('known_cheaters', 0) / total:.3%}",
+                               f"{flagged.get('cash_outliers', 0) / total:.3%}"],
+        'Обоснование удаления': [
+            'Искажают реальные метрики',
+            'Аномальные траты (далеко за верхним квартилем)'
+        ]
+    })
+    return cleaning_steps, methods
+
+def create_data_cleaning_sheet(writer, artifact=None):
+    """Лист 5: Процесс очистки данных (artifact - артефакт результатов)"""
+    
+    if artifact is not None:
+        cleaning_steps, methods = data_cleaning_from_artifact(artifact)
+        writer.write(cleaning_steps, 'Очистка данных', index=False)
+        writer.write(methods, 'Очистка данных', startrow=len(cleaning_steps) + 3, index=False)
+        return
     
     # Этапы очистки
     cleaning_steps = pd.DataFrame({
@@ -235,7 +475,7 @@ def create_data_cleaning_sheet(writer):
         'Процент сохранено': [100.0, 99.967, 99.935, 99.935]
     })
     
-    cleaning_steps.to_excel(writer, sheet_name='Очистка данных', index=False)
+    writer.write(cleaning_steps, 'Очистка данных', index=False)
     
     # Методы выявления аномалий
     methods = pd.DataFrame({
@@ -251,11 +491,62 @@ def create_data_cleaning_sheet(writer):
     })
     
     startrow = len(cleaning_steps) + 3
-    methods.to_excel(writer, sheet_name='Очистка данных', 
-                    startrow=startrow, index=False)
+    writer.write(methods, 'Очистка данных',
+                 startrow=startrow, index=False)
 
-def create_revenue_projection_sheet(writer):
-    """Лист 6: Проекция увеличения дохода"""
+def revenue_projection_from_artifact(artifact):
+    """Проекция дохода и допущения: ARPU контрольной группы и прирост ARPU на всех игроков выборки"""
+    arpu = artifact.metric('arpu')
+    players = artifact.summary['cleaning']['kept']
+    base_daily = arpu['groups']['control']['mean'] * players / 1e6
+    improvement_daily = arpu['absolute_change'] * players / 1e6
+    
+    multipliers = [1, 7, 30, 90, 365]
+    revenue_projection = pd.DataFrame({
+        'Период': ['Дневной', 'Недельный', 'Месячный', 'Квартальный', 'Годовой'],
+        'Базовый доход (млн USD)': [round(base_daily * m, 2) for m in multipliers],
+        'Увеличение дохода (млн USD)': [round(improvement_daily * m, 2) for m in multipliers],
+        'Новый доход (млн USD)': [round((base_daily + improvement_daily) * m, 2) for m in multipliers],
+        'Прирост (%)': [round(arpu['lift_percent'], 2)] * len(multipliers)
+    })
+    
+    assumptions = pd.DataFrame({
+        'Параметр': [
+            'Базовый ARPU',
+            'Улучшение ARPU',
+            'Количество игроков',
+            'Дневной базовый доход',
+            'Дневное улучшение',
+            'Валидность проекции'
+        ],
+        'Значение': [
+            f"${arpu['groups']['control']['mean']:.4f}",
+            f"{arpu['lift_percent']:+.2f}% ({arpu['absolute_change']:+.4f} $)",
+            f'{players:,}',
+            f'${base_daily:.2f} млн',
+            f'{improvement_daily:+.2f} млн $',
+            'На основе статистически значимых данных' if arpu['p_value'] < 0.05
+            else 'Эффект статистически не значим'
+        ],
+        'Источник': [
+            'Анализ контрольной группы',
+            f"Статистический тест (p={format_p_value(arpu['p_value'])})",
+            'Финальная выборка после очистки',
+            'ARPU × Количество игроков',
+            'Улучшение × Количество игроков',
+            'Доверительный интервал 95%'
+        ]
+    })
+    return revenue_projection, assumptions
+
+def create_revenue_projection_sheet(writer, artifact=None):
+    """Лист 6: Проекция увеличения дохода (artifact - артефакт результатов)"""
+    
+    if artifact is not None:
+        revenue_projection, assumptions = revenue_projection_from_artifact(artifact)
+        writer.write(revenue_projection, 'Проекция дохода', index=False)
+        writer.write(assumptions, 'Проекция дохода', startrow=len(revenue_projection) + 3, index=False)
+        return
     
     # Проекция дохода
     revenue_projection = pd.DataFrame({
@@ -266,7 +557,7 @@ def create_revenue_projection_sheet(writer):
         'Прирост (%)': [5.71, 5.71, 5.71, 5.71, 5.71]
     })
     
-    revenue_projection.to_excel(writer, sheet_name='Проекция дохода', index=False)
+    writer.write(revenue_projection, 'Проекция дохода', index=False)
     
     # Допущения и расчёты
     assumptions = pd.DataFrame({
@@ -297,11 +588,14 @@ def create_revenue_projection_sheet(writer):
     })
     
     startrow = len(revenue_projection) + 3
-    assumptions.to_excel(writer, sheet_name='Проекция дохода', 
-                        startrow=startrow, index=False)
+    writer.write(assumptions, 'Проекция дохода',
+                 startrow=startrow, index=False)
 
-def create_business_recommendations_sheet(writer):
-    """Лист 7: Бизнес-рекомендации"""
+def create_business_recommendations_sheet(writer, artifact=None):
+    """Лист 7: Бизнес-рекомендации (решение и числа из artifact - артефакта результатов)"""
+    
+    if artifact is not None:
+        metrics = {metric: artifact.metric(metric) for metric in METRIC_NAMES}
     
     # Основная рекомендация
     main_recommendation = pd.DataFrame({
@@ -310,8 +604,16 @@ def create_business_recommendations_sheet(writer):
         'Обоснование': ['Все ключевые метрики показывают статистически и практически значимые улучшения'],
         'Ожидаемый эффект': ['+5.7% увеличение дохода, +7.4% активности игроков']
     })
+    if artifact is not None:
+        significant = sum(entry['p_value'] < 0.05 for entry in metrics.values())
+        main_recommendation.loc[0, 'Решение'] = RECOMMENDATIONS.get(artifact.summary['recommendation'],
+                                                                    artifact.summary['recommendation'])
+        main_recommendation.loc[0, 'Обоснование'] = (f'{significant} из {len(metrics)} ключевых метрик '
+                                                     f'показывают статистически значимые изменения')
+        main_recommendation.loc[0, 'Ожидаемый эффект'] = (f"{metrics['arpu']['lift_percent']:+.1f}% изменение дохода, "
+                                                          f"{metrics['cash']['lift_percent']:+.1f}% активности игроков")
     
-    main_recommendation.to_excel(writer, sheet_name='Бизнес-рекомендации', index=False)
+    writer.write(main_recommendation, 'Бизнес-рекомендации', index=False)
     
     # Детальные рекомендации
     detailed_recommendations = pd.DataFrame({
@@ -344,10 +646,16 @@ def create_business_recommendations_sheet(writer):
             'Risk Management'
         ]
     })
+    if artifact is not None:
+        improvements = platform_arpu_tables(artifact.table('arpu_by_platform_group'))[1]
+        best = improvements.loc[improvements['Относительное улучшение (%)'].idxmax()]
+        detailed_recommendations.loc[0, 'Рекомендация'] = (
+            f"Поэтапное внедрение: начать с {best['Платформа']} "
+            f"(наибольший эффект {best['Относительное улучшение (%)']:+.0f}%)")
     
     startrow = len(main_recommendation) + 3
-    detailed_recommendations.to_excel(writer, sheet_name='Бизнес-рекомендации', 
-                                    startrow=startrow, index=False)
+    writer.write(detailed_recommendations, 'Бизнес-рекомендации',
+                 startrow=startrow, index=False)
     
     # KPI для мониторинга
     kpi_monitoring = pd.DataFrame({
@@ -384,64 +692,15 @@ def create_business_recommendations_sheet(writer):
             'Ежемесячно'
         ]
     })
+    if artifact is not None:
+        for row, metric, value in ((0, 'arpu', '${:.2f}'), (1, 'arppu', '${:.2f}'), (4, 'cash', '{:,.0f} монет')):
+            kpi_monitoring.loc[row, 'Текущее значение'] = (
+                value.format(metrics[metric]['groups']['test']['mean']) + ' (тест группа)')
+            kpi_monitoring.loc[row, 'Целевое изменение'] = f"Сохранить {metrics[metric]['lift_percent']:+.1f}%"
     
     startrow = len(main_recommendation) + len(detailed_recommendations) + 6
-    kpi_monitoring.to_excel(writer, sheet_name='Бизнес-рекомендации', 
-                           startrow=startrow, index=False)
-
-def format_excel_file(filename):
-    """Форматирование Excel файла для лучшей читаемости"""
-    
-    # Загрузка workbook
-    wb = openpyxl.load_workbook(filename)
-    
-    # Стили
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    alignment_center = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'), 
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    # Применение стилей ко всем листам
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
-        
-        # Автоширина колонок
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Форматирование заголовков
-        for row in ws.iter_rows(min_row=1, max_row=1):
-            for cell in row:
-                if cell.value:
-                    cell.font = header_font
-                    cell.fill = header_fill
-                    cell.alignment = alignment_center
-                    cell.border = thin_border
-        
-        # Границы для всех ячеек с данными
-        for row in ws.iter_rows():
-            for cell in row:
-                if cell.value:
-                    cell.border = thin_border
-    
-    # Сохранение отформатированного файла
-    wb.save(filename)
+    writer.write(kpi_monitoring, 'Бизнес-рекомендации',
+                 startrow=startrow, index=False)
 
 def main():
     """Главная функция создания Excel отчёта"""
@@ -449,7 +708,14 @@ def main():
     print("📊 Создание итогового Excel файла для финальной работы...")
     print("=" * 70)
     
-    filename = create_comprehensive_excel_report()
+    # Результаты последнего запуска run_complete_analysis() (артефакт в reports/)
+    artifact = load_latest_artifact()
+    if artifact is not None:
+        print(f"📂 Артефакт результатов: {artifact.summary['created']}")
+    else:
+        print("⚠️  Артефакт результатов не найден - используются итоговые значения курсовой работы")
+    
+    filename = create_comprehensive_excel_report(artifact)
     
     print("\n📋 Созданные листы:")
     print("   1. Основные результаты - главные метрики и выборка")
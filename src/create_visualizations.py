@@ -3,6 +3,12 @@
 Генерация визуализаций для A/B тестирования акции на премиум броню
 """
 
+import argparse
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -12,6 +18,8 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.express as px
 from datetime import datetime, timedelta
+from results_artifact import load_latest_artifact
+from pipeline import code_fingerprint, module_sources
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -22,15 +30,111 @@ plt.rcParams['figure.figsize'] = (12, 8)
 plt.rcParams['font.size'] = 12
 plt.rcParams['axes.grid'] = True
 
+VISUALIZATIONS_DIR = '../visualizations'
+
+# Хэши входных данных и кода графиков, рядом с файлами графиков
+FIGURE_HASHES_FILE = '.figure_hashes.json'
+
+# Метод, файл и подпись каждого графика в порядке отчёта
+FIGURES = [
+    ('create_metrics_comparison', '01_metrics_comparison.png', '📊 График 1: Сравнение основных метрик'),
+    ('create_confidence_intervals', '02_confidence_intervals.png', '📈 График 2: Доверительные интервалы'),
+    ('create_platform_analysis', '03_platform_analysis.png', '🎮 График 3: Анализ по платформам'),
+    ('create_statistical_significance', '04_statistical_significance.png', '🔬 График 4: Статистическая значимость'),
+    ('create_revenue_projection', '05_revenue_projection.png', '💰 График 5: Проекция дохода'),
+    ('create_data_quality_summary', '06_data_quality.png', '🧹 График 6: Качество данных'),
+    ('create_interactive_dashboard', '07_interactive_dashboard.html', '📱 График 7: Интерактивный dashboard'),
+]
+
+# Названия метрик на графиках
+METRIC_LABELS = {'arpu': 'ARPU', 'arppu': 'ARPPU', 'cash': 'Траты валюты'}
+
+# Результаты итогового анализа (8.64М игроков) в формате visualization_data();
+# используются, пока run_complete_analysis() не записал артефакт результатов
+LEGACY_RESULTS = {
+    'metrics': {
+        'ARPU': {'control': 5.8295, 'test': 6.1622, 'improvement': 5.71,
+                 'ci': {'control': (5.8295, 5.8289, 5.8301), 'test': (6.1622, 6.1616, 6.1628)},
+                 't_stat': -258.37, 'p_value': 1e-7, 'cohens_d': -0.179},
+        'ARPPU': {'control': 5.8311, 'test': 6.1631, 'improvement': 5.69,
+                  'ci': {'control': (5.8311, 5.8305, 5.8317), 'test': (6.1631, 6.1625, 6.1637)},
+                  't_stat': -257.99, 'p_value': 1e-7, 'cohens_d': -0.179},
+        'Траты валюты': {'control': 5800.71, 'test': 6229.57, 'improvement': 7.39,
+                         'ci': {'control': (5800.71, 5799.44, 5801.98), 'test': (6229.57, 6228.23, 6230.91)},
+                         't_stat': -456.73, 'p_value': 1e-7, 'cohens_d': -0.312},
+    },
+    'platforms': {
+        'PC': {'control': 5.6462, 'test': 6.2690, 'improvement': 11.02},
+        'PS4': {'control': 5.7376, 'test': 6.0848, 'improvement': 6.05},
+        'Xbox': {'control': 6.1035, 'test': 6.1328, 'improvement': 0.48},
+    },
+    'cleaning': {'counts': [8640000, 8637176, 8634408], 'removed': [0, 2824, 2768]},
+    'groups': {'control': 4319928, 'test': 4314480},
+    'platform_counts': {'PC': 2876408, 'PS4': 2873744, 'Xbox': 2884256},
+    'quality': [99.935, 100.0, 99.996],
+    'revenue': {'base_daily': 50.3, 'improvement_daily': 2.87, 'lift': 5.71},
+}
+
+
+def visualization_data(artifact):
+    """Данные всех графиков из артефакта результатов (ResultsArtifact) в формате LEGACY_RESULTS"""
+    metrics = {}
+    for metric, label in METRIC_LABELS.items():
+        entry = artifact.metric(metric)
+        ci = {}
+        for group in ('control', 'test'):
+            row = artifact.confidence_interval(metric, group, 0.95)
+            ci[group] = (row['mean'], row['ci_lower'], row['ci_upper'])
+        metrics[label] = {'control': entry['groups']['control']['mean'], 'test': entry['groups']['test']['mean'],
+                          'improvement': entry['lift_percent'], 'ci': ci, 't_stat': entry['t_stat'],
+                          'p_value': entry['p_value'], 'cohens_d': entry['cohens_d']}
+    
+    arpu = artifact.table('arpu_by_platform_group')
+    means = arpu.pivot(index='platform', columns='group', values='mean')
+    platforms = {str(platform): {'control': row['control'], 'test': row['test'],
+                                 'improvement': (row['test'] - row['control']) / row['control'] * 100}
+                 for platform, row in means.iterrows()}
+    
+    cleaning = artifact.summary['cleaning']
+    removed = [0] + [rule['added'] for rule in cleaning['rules']]
+    counts = list(cleaning['players'] - np.cumsum(removed))
+    cheaters = next((rule['flagged'] for rule in cleaning['rules'] if rule['rule'] == 'known_cheaters'), 0)
+    
+    arpu_entry = artifact.metric('arpu')
+    return {
+        'metrics': metrics,
+        'platforms': platforms,
+        'cleaning': {'counts': counts, 'removed': removed},
+        'groups': artifact.summary['groups'],
+        'platform_counts': artifact.summary['platforms'],
+        'quality': [cleaning['kept'] / cleaning['players'] * 100, 100.0,
+                    100 - cheaters / cleaning['players'] * 100],
+        # Доход в млн USD: ARPU контрольной группы и прирост ARPU на всех игроков выборки
+        'revenue': {'base_daily': arpu_entry['groups']['control']['mean'] * cleaning['kept'] / 1e6,
+                    'improvement_daily': arpu_entry['absolute_change'] * cleaning['kept'] / 1e6,
+                    'lift': arpu_entry['lift_percent']},
+    }
+
+
+def _render_figure(results_data, output_dir, method_name):
+    """Построение одного графика в процессе-воркере с неинтерактивным backend"""
+    plt.switch_backend('Agg')
+    getattr(ABTestVisualizer(results_data, output_dir), method_name)()
+    return method_name
+
+
 class ABTestVisualizer:
-    def __init__(self, results_data):
+    def __init__(self, results_data=None, output_dir=VISUALIZATIONS_DIR):
         """
         Инициализация класса для создания визуализаций
         
         Args:
-            results_data: Словарь с результатами анализа
+            results_data: Данные графиков (visualization_data() артефакта
+                результатов); по умолчанию LEGACY_RESULTS
+            output_dir: Папка для графиков
         """
-        self.results = results_data
+        self.results = results_data if results_data is not None else LEGACY_RESULTS
+        self.output_dir = Path(output_dir)
         self.colors = {
             'control': '#3498db',  # Синий
             'test': '#e74c3c',     # Красный  
@@ -38,18 +142,43 @@ class ABTestVisualizer:
             'neutral': '#95a5a6'   # Серый
         }
         
+    def _path(self, filename):
+        return str(self.output_dir / filename)
+        
+    def figure_hash(self, method_name):
+        """
+        Хэш входных данных и кода графика: весь модуль (стиль, помощники,
+        _render_figure) и импортируемые им модули проекта
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(method_name.encode('utf-8'))
+        digest.update(json.dumps(self.results, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(code_fingerprint(module_sources(ABTestVisualizer)).encode('utf-8'))
+        return digest.hexdigest()
+        
+    def _read_hashes(self):
+        try:
+            with open(self.output_dir / FIGURE_HASHES_FILE, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+        
+    def _write_hashes(self, hashes):
+        with open(self.output_dir / FIGURE_HASHES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(hashes, f, indent=2, sort_keys=True)
+        
     def create_metrics_comparison(self):
         """График 1: Сравнение основных метрик между группами"""
         
         # Данные для графика
-        metrics = ['ARPU', 'ARPPU', 'Траты валюты']
-        control_values = [5.8295, 5.8311, 5800.71]
-        test_values = [6.1622, 6.1631, 6229.57]
-        improvements = [5.71, 5.69, 7.39]
+        metrics = list(self.results['metrics'])
+        control_values = [self.results['metrics'][m]['control'] for m in metrics]
+        test_values = [self.results['metrics'][m]['test'] for m in metrics]
+        improvements = [self.results['metrics'][m]['improvement'] for m in metrics]
         
         # Нормализация трат валюты для лучшей визуализации
-        control_values_norm = [5.8295, 5.8311, 5.80071]  # Валюта /1000
-        test_values_norm = [6.1622, 6.1631, 6.22957]
+        control_values_norm = control_values[:2] + [control_values[2] / 1000]  # Валюта /1000
+        test_values_norm = test_values[:2] + [test_values[2] / 1000]
         
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8))
         
@@ -100,26 +229,17 @@ class ABTestVisualizer:
                     f'+{imp:.1f}%', ha='center', va='bottom', fontweight='bold')
         
         plt.tight_layout()
-        plt.savefig('/Users/user/AB_test/visualizations/01_metrics_comparison.png', dpi=300, bbox_inches='tight')
+        plt.savefig(self._path('01_metrics_comparison.png'), dpi=300, bbox_inches='tight')
         plt.close()  # Close instead of show to avoid display issues
         
     def create_confidence_intervals(self):
         """График 2: Доверительные интервалы для всех метрик"""
         
-        # Данные доверительных интервалов
+        # Данные доверительных интервалов (95%)
         metrics_data = {
-            'ARPU': {
-                'control': {'mean': 5.8295, 'ci_lower': 5.8289, 'ci_upper': 5.8301},
-                'test': {'mean': 6.1622, 'ci_lower': 6.1616, 'ci_upper': 6.1628}
-            },
-            'ARPPU': {
-                'control': {'mean': 5.8311, 'ci_lower': 5.8305, 'ci_upper': 5.8317},
-                'test': {'mean': 6.1631, 'ci_lower': 6.1625, 'ci_upper': 6.1637}
-            },
-            'Траты валюты': {
-                'control': {'mean': 5800.71, 'ci_lower': 5799.44, 'ci_upper': 5801.98},
-                'test': {'mean': 6229.57, 'ci_lower': 6228.23, 'ci_upper': 6230.91}
-            }
+            metric: {group: dict(zip(('mean', 'ci_lower', 'ci_upper'), values['ci'][group]))
+                     for group in ('control', 'test')}
+            for metric, values in self.results['metrics'].items()
         }
         
         fig, axes = plt.subplots(1, 3, figsize=(18, 6))
@@ -170,18 +290,14 @@ class ABTestVisualizer:
                        bbox=dict(boxstyle="round,pad=0.3", facecolor='lightgreen', alpha=0.7))
         
         plt.tight_layout()
-        plt.savefig('/Users/user/AB_test/visualizations/02_confidence_intervals.png', dpi=300, bbox_inches='tight')
+        plt.savefig(self._path('02_confidence_intervals.png'), dpi=300, bbox_inches='tight')
         plt.close()
         
     def create_platform_analysis(self):
         """График 3: Анализ ARPU по платформам"""
         
         # Данные по платформам
-        platform_data = {
-            'PC': {'control': 5.6462, 'test': 6.2690, 'improvement': 11.02},
-            'PS4': {'control': 5.7376, 'test': 6.0848, 'improvement': 6.05},
-            'Xbox': {'control': 6.1035, 'test': 6.1328, 'improvement': 0.48}
-        }
+        platform_data = self.results['platforms']
         
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8))
         
@@ -243,18 +359,14 @@ class ABTestVisualizer:
                     category, ha='center', va='top', fontsize=10, style='italic')
         
         plt.tight_layout()
-        plt.savefig('/Users/user/AB_test/visualizations/03_platform_analysis.png', dpi=300, bbox_inches='tight')
+        plt.savefig(self._path('03_platform_analysis.png'), dpi=300, bbox_inches='tight')
         plt.close()
         
     def create_statistical_significance(self):
         """График 4: Визуализация статистической значимости"""
         
         # Данные статистических тестов
-        test_results = {
-            'ARPU': {'t_stat': -258.37, 'p_value': 1e-7, 'cohens_d': -0.179},
-            'ARPPU': {'t_stat': -257.99, 'p_value': 1e-7, 'cohens_d': -0.179},
-            'Траты валюты': {'t_stat': -456.73, 'p_value': 1e-7, 'cohens_d': -0.312}
-        }
+        test_results = self.results['metrics']
         
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8))
         
@@ -307,22 +419,22 @@ class ABTestVisualizer:
         ax2.legend()
         
         # Добавление значений и интерпретации
-        effect_labels = ['Малый', 'Малый', 'Малый']
+        effect_labels = ['Малый' if d < 0.5 else 'Средний' if d < 0.8 else 'Большой' for d in cohens_d_values]
         for bar, d, label in zip(bars2, cohens_d_values, effect_labels):
             height = bar.get_height()
             ax2.text(bar.get_x() + bar.get_width()/2., height + 0.01,
                     f'{d:.3f}\n({label})', ha='center', va='bottom', fontsize=10)
         
         plt.tight_layout()
-        plt.savefig('/Users/user/AB_test/visualizations/04_statistical_significance.png', dpi=300, bbox_inches='tight')
+        plt.savefig(self._path('04_statistical_significance.png'), dpi=300, bbox_inches='tight')
         plt.close()
         
     def create_revenue_projection(self):
         """График 5: Проекция увеличения дохода"""
         
         # Данные проекции
-        base_daily_revenue = 50.3  # Миллионы USD
-        improvement_daily = 2.87   # Миллионы USD
+        base_daily_revenue = self.results['revenue']['base_daily']  # Миллионы USD
+        improvement_daily = self.results['revenue']['improvement_daily']  # Миллионы USD
         
         periods = ['Дневной', 'Недельный', 'Месячный', 'Квартальный', 'Годовой']
         multipliers = [1, 7, 30, 90, 365]
@@ -371,7 +483,7 @@ class ABTestVisualizer:
         bars3 = ax2.bar(periods, improvements, color=self.colors['improvement'], alpha=0.8)
         ax2.set_xlabel('Период')
         ax2.set_ylabel('Дополнительный доход (млн USD)')
-        ax2.set_title('Дополнительный доход от акции (+5.71% ARPU)')
+        ax2.set_title(f"Дополнительный доход от акции ({self.results['revenue']['lift']:+.2f}% ARPU)")
         ax2.grid(True, alpha=0.3)
         
         # Добавление значений
@@ -387,7 +499,7 @@ class ABTestVisualizer:
                         fontweight='bold', color='darkgreen')
         
         plt.tight_layout()
-        plt.savefig('/Users/user/AB_test/visualizations/05_revenue_projection.png', dpi=300, bbox_inches='tight')
+        plt.savefig(self._path('05_revenue_projection.png'), dpi=300, bbox_inches='tight')
         plt.close()
         
     def create_data_quality_summary(self):
@@ -397,8 +509,8 @@ class ABTestVisualizer:
         
         # График 1: Процесс очистки данных
         stages = ['Исходные\nданные', 'После удаления\nчитеров', 'После удаления\nвыбросов']
-        counts = [8640000, 8637176, 8634408]
-        removed = [0, 2824, 2768]
+        counts = self.results['cleaning']['counts']
+        removed = self.results['cleaning']['removed']
         
         bars1 = ax1.bar(stages, counts, color=[self.colors['neutral'], 
                        self.colors['control'], self.colors['improvement']], alpha=0.8)
@@ -409,16 +521,16 @@ class ABTestVisualizer:
         # Добавление значений
         for i, (bar, count, rem) in enumerate(zip(bars1, counts, removed)):
             height = bar.get_height()
-            ax1.text(bar.get_x() + bar.get_width()/2., height + 20000,
+            ax1.text(bar.get_x() + bar.get_width()/2., height + counts[0] * 0.0023,
                     f'{count:,}', ha='center', va='bottom', fontweight='bold')
             if rem > 0:
-                ax1.text(bar.get_x() + bar.get_width()/2., height - 100000,
+                ax1.text(bar.get_x() + bar.get_width()/2., height - counts[0] * 0.0116,
                         f'-{rem:,}', ha='center', va='center', color='red')
         
         # График 2: Распределение по группам
         groups = ['Контрольная\nгруппа', 'Тестовая\nгруппа']
-        group_counts = [4319928, 4314480]
-        group_percentages = [50.0, 50.0]
+        group_counts = [self.results['groups'][group] for group in ('control', 'test')]
+        group_percentages = [count / sum(group_counts) * 100 for count in group_counts]
         
         bars2 = ax2.bar(groups, group_counts, 
                        color=[self.colors['control'], self.colors['test']], alpha=0.8)
@@ -428,12 +540,12 @@ class ABTestVisualizer:
         
         for bar, count, pct in zip(bars2, group_counts, group_percentages):
             height = bar.get_height()
-            ax2.text(bar.get_x() + bar.get_width()/2., height + 20000,
+            ax2.text(bar.get_x() + bar.get_width()/2., height + max(group_counts) * 0.0046,
                     f'{count:,}\n({pct:.1f}%)', ha='center', va='bottom', fontweight='bold')
         
         # График 3: Распределение по платформам
-        platforms = ['PC', 'PS4', 'Xbox']
-        platform_counts = [2876408, 2873744, 2884256]
+        platforms = list(self.results['platform_counts'])
+        platform_counts = list(self.results['platform_counts'].values())
         platform_colors = ['#3498db', '#e74c3c', '#2ecc71']
         
         wedges, texts, autotexts = ax3.pie(platform_counts, labels=platforms, 
@@ -443,13 +555,13 @@ class ABTestVisualizer:
         
         # График 4: Качество данных
         quality_metrics = ['Полнота\nданных', 'Корректность\nгрупп', 'Чистота\nот читеров']
-        quality_scores = [99.935, 100.0, 99.996]
+        quality_scores = self.results['quality']
         
         bars4 = ax4.bar(quality_metrics, quality_scores, 
                        color=self.colors['improvement'], alpha=0.8)
         ax4.set_ylabel('Процент качества (%)')
         ax4.set_title('Показатели качества данных')
-        ax4.set_ylim(99.5, 100.1)
+        ax4.set_ylim(99.5 if min(quality_scores) > 99.5 else np.floor(min(quality_scores)) - 1, 100.1)
         ax4.grid(True, alpha=0.3)
         
         for bar, score in zip(bars4, quality_scores):
@@ -458,7 +570,7 @@ class ABTestVisualizer:
                     f'{score:.2f}%', ha='center', va='bottom', fontweight='bold')
         
         plt.tight_layout()
-        plt.savefig('/Users/user/AB_test/visualizations/06_data_quality.png', dpi=300, bbox_inches='tight')
+        plt.savefig(self._path('06_data_quality.png'), dpi=300, bbox_inches='tight')
         plt.close()
         
     def create_interactive_dashboard(self):
@@ -475,8 +587,9 @@ class ABTestVisualizer:
         
         # График 1: Сравнение метрик
         metrics = ['ARPU', 'ARPPU', 'Траты валюты (тыс.)']
-        control_vals = [5.83, 5.83, 5.80]
-        test_vals = [6.16, 6.16, 6.23]
+        values = list(self.results['metrics'].values())
+        control_vals = [round(v['control'] / (1000 if i == 2 else 1), 2) for i, v in enumerate(values)]
+        test_vals = [round(v['test'] / (1000 if i == 2 else 1), 2) for i, v in enumerate(values)]
         
         fig.add_trace(
             go.Bar(name='Контроль', x=metrics, y=control_vals, 
@@ -490,9 +603,9 @@ class ABTestVisualizer:
         )
         
         # График 2: ARPU по платформам
-        platforms = ['PC', 'PS4', 'Xbox']
-        platform_control = [5.65, 5.74, 6.10]
-        platform_test = [6.27, 6.08, 6.13]
+        platforms = list(self.results['platforms'])
+        platform_control = [round(self.results['platforms'][p]['control'], 2) for p in platforms]
+        platform_test = [round(self.results['platforms'][p]['test'], 2) for p in platforms]
         
         fig.add_trace(
             go.Bar(name='Контроль (платформы)', x=platforms, y=platform_control,
@@ -507,8 +620,9 @@ class ABTestVisualizer:
         
         # График 3: Доверительные интервалы ARPU
         groups = ['Контроль', 'Тест']
-        means = [5.8295, 6.1622]
-        errors = [0.0006, 0.0006]
+        arpu_ci = self.results['metrics']['ARPU']['ci']
+        means = [arpu_ci[group][0] for group in ('control', 'test')]
+        errors = [arpu_ci[group][2] - arpu_ci[group][0] for group in ('control', 'test')]
         
         fig.add_trace(
             go.Bar(name='ARPU с ДИ', x=groups, y=means,
@@ -519,7 +633,7 @@ class ABTestVisualizer:
         
         # График 4: Проекция дохода
         periods = ['День', 'Месяц', 'Год']
-        improvements = [2.87, 86.1, 1050]
+        improvements = [self.results['revenue']['improvement_daily'] * days for days in (1, 30, 365)]
         
         fig.add_trace(
             go.Bar(name='Доп. доход', x=periods, y=improvements,
@@ -536,62 +650,78 @@ class ABTestVisualizer:
         )
         
         # Сохранение интерактивного графика
-        fig.write_html("/Users/user/AB_test/visualizations/07_interactive_dashboard.html")
+        fig.write_html(self._path('07_interactive_dashboard.html'))
         print("📱 Интерактивный dashboard сохранён")
         
-    def generate_all_visualizations(self):
-        """Создание всех графиков для отчёта"""
+    def generate_all_visualizations(self, parallel=False, max_workers=None, force=False):
+        """
+        Создание всех графиков для отчёта
         
-        import os
-        os.makedirs('/Users/user/AB_test/visualizations', exist_ok=True)
+        Графики, у которых не изменились входные данные и код (хэш в
+        FIGURE_HASHES_FILE рядом с файлами), пропускаются, если не задан
+        force. parallel=True строит каждый график в отдельном процессе
+        (max_workers, по умолчанию по числу CPU) с backend Agg.
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
         
         print("🎨 Создание визуализаций для финальной работы...")
         print("=" * 60)
         
-        print("📊 График 1: Сравнение основных метрик...")
-        self.create_metrics_comparison()
-        
-        print("📈 График 2: Доверительные интервалы...")
-        self.create_confidence_intervals()
-        
-        print("🎮 График 3: Анализ по платформам...")
-        self.create_platform_analysis()
-        
-        print("🔬 График 4: Статистическая значимость...")
-        self.create_statistical_significance()
-        
-        print("💰 График 5: Проекция дохода...")
-        self.create_revenue_projection()
-        
-        print("🧹 График 6: Качество данных...")
-        self.create_data_quality_summary()
-        
-        print("📱 График 7: Интерактивный dashboard...")
-        self.create_interactive_dashboard()
-        
-        print("\n✅ Все графики созданы и сохранены в папку 'visualizations/'")
-        print("📁 Файлы готовы для включения в финальную работу:")
-        print("   • 01_metrics_comparison.png")
-        print("   • 02_confidence_intervals.png") 
-        print("   • 03_platform_analysis.png")
-        print("   • 04_statistical_significance.png")
-        print("   • 05_revenue_projection.png")
-        print("   • 06_data_quality.png")
-        print("   • 07_interactive_dashboard.html")
+        hashes = self._read_hashes()
+        pending = []
+        for method_name, filename, label in FIGURES:
+            key = self.figure_hash(method_name)
+            if not force and hashes.get(filename) == key and (self.output_dir / filename).exists():
+                print(f"{label} - без изменений, пропущен")
+            else:
+                pending.append((method_name, filename, label, key))
+        
+        try:
+            if parallel and len(pending) > 1:
+                with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                    futures = {executor.submit(_render_figure, self.results, str(self.output_dir), method_name):
+                               (filename, label, key) for method_name, filename, label, key in pending}
+                    for future in as_completed(futures):
+                        filename, label, key = futures[future]
+                        future.result()
+                        hashes[filename] = key
+                        print(f"{label} - готов")
+            else:
+                for method_name, filename, label, key in pending:
+                    print(f"{label}...")
+                    getattr(self, method_name)()
+                    hashes[filename] = key
+        finally:
+            # Хэши только успешно построенных графиков
+            self._write_hashes(hashes)
+        
+        print(f"\n✅ Построено графиков: {len(pending)}, без изменений: {len(FIGURES) - len(pending)}")
+        print(f"📁 Файлы в папке '{self.output_dir}':")
+        for _, filename, _ in FIGURES:
+            print(f"   • {filename}")
 
 def main():
     """Основная функция для запуска создания графиков"""
     
-    # Моковые данные результатов (в реальном проекте загружались бы из анализа)
-    results_data = {
-        'arpu': {'control': 5.8295, 'test': 6.1622, 'improvement': 5.71},
-        'arppu': {'control': 5.8311, 'test': 6.1631, 'improvement': 5.69},
-        'cash': {'control': 5800.71, 'test': 6229.57, 'improvement': 7.39}
-    }
+    parser = argparse.ArgumentParser(description="Графики A/B теста из артефакта результатов")
+    parser.add_argument('--output', default=VISUALIZATIONS_DIR, help="папка для графиков")
+    parser.add_argument('--parallel', action='store_true', help="каждый график в отдельном процессе")
+    parser.add_argument('--workers', type=int, default=None, help="число процессов (по умолчанию по числу CPU)")
+    parser.add_argument('--force', action='store_true', help="перерисовать и неизменившиеся графики")
+    args = parser.parse_args()
+    
+    # Результаты последнего запуска run_complete_analysis() (артефакт в reports/)
+    artifact = load_latest_artifact()
+    if artifact is not None:
+        print(f"📂 Артефакт результатов: {artifact.summary['created']}")
+        results_data = visualization_data(artifact)
+    else:
+        print("⚠️  Артефакт результатов не найден - используются итоговые значения курсовой работы")
+        results_data = LEGACY_RESULTS
     
     # Создание визуализатора и генерация всех графиков
-    visualizer = ABTestVisualizer(results_data)
-    visualizer.generate_all_visualizations()
+    visualizer = ABTestVisualizer(results_data, args.output)
+    visualizer.generate_all_visualizations(parallel=args.parallel, max_workers=args.workers, force=args.force)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -6,38 +6,54 @@ Focus on removing cheaters and preparing clean datasets
 import pandas as pd
 import numpy as np
 from scipy import stats
+from player_index import PlayerDimension
+from exclusion import ExclusionMask
+from quantile_sketch import quartiles
+from dataframe_backend import get_backend
 
 class DataCleaner:
-    def __init__(self, data):
+    def __init__(self, data, backend=None):
         self.data = data
+        # Engine of the per-player aggregation ('pandas', 'polars', 'duckdb')
+        self.backend = get_backend(backend)
         self.cleaned_data = {}
+        # One exclusion bitmap per player; every rule sets a bit and the
+        # original tables are filtered once against the combined mask
+        self.players = PlayerDimension.from_tables(
+            data['abgroup'], data.get('platforms'), data.get('cheaters'))
+        self.exclusion = ExclusionMask(self.players)
         
-    def remove_known_cheaters(self):
-        """Remove players identified in the cheaters dataset"""
-        print("=== Removing Known Cheaters ===")
-        
-        # Get list of known cheater IDs
-        cheater_ids = set(self.data['cheaters']['player_id'].unique())
-        print(f"Found {len(cheater_ids)} known cheaters")
-        
-        # Remove cheaters from each dataset
+    def _apply_exclusion(self, label):
+        """Re-filter the original tables against the combined mask"""
         for name, df in self.data.items():
             if name == 'cheaters':
                 continue
-                
+            
             if 'player_id' in df.columns:
-                before_count = len(df)
-                df_clean = df[~df['player_id'].isin(cheater_ids)]
-                after_count = len(df_clean)
-                removed = before_count - after_count
+                before_count = len(self.cleaned_data.get(name, df))
+                df_clean = self.exclusion.apply(df)
+                removed = before_count - len(df_clean)
                 
-                print(f"  {name}: Removed {removed} records ({removed/before_count:.2%})")
+                print(f"  {name}: Removed {removed} {label} ({removed/max(before_count, 1):.2%})")
                 self.cleaned_data[name] = df_clean
-            else:
+            elif name not in self.cleaned_data:
                 self.cleaned_data[name] = df.copy()
         
         return self.cleaned_data
     
+    def remove_known_cheaters(self):
+        """
+        Remove known cheaters: players with cheaters = 1 in the cheaters dataset
+        (rows with flag 0 are kept, as in FullABAnalysis)
+        """
+        print("=== Removing Known Cheaters ===")
+        
+        # Known cheaters (cheaters flag = 1) are already marked on the player dimension
+        print(f"Found {int(self.players.cheater.sum())} known cheaters")
+        self.exclusion.add_rule('known_cheaters', self.players.cheater)
+        
+        return self._apply_exclusion("records")
+    
     def detect_potential_cheaters(self, cash_data, threshold_multiplier=3):
         """
         Detect potential unidentified cheaters based on spending patterns
@@ -46,13 +62,10 @@ class DataCleaner:
         print(f"\n=== Detecting Potential Cheaters ===")
         
         # Calculate spending per player
-        player_spending = cash_data.groupby('player_id')['cash_amount'].agg([
-            'sum', 'mean', 'count'
-        ]).reset_index()
+        player_spending = self.backend.player_totals(cash_data, 'cash_amount')
         
         # Use IQR method to find outliers
-        Q1 = player_spending['sum'].quantile(0.25)
-        Q3 = player_spending['sum'].quantile(0.75)
+        Q1, Q3 = quartiles(player_spending['sum'].to_numpy())
         IQR = Q3 - Q1
         
         # Define outlier threshold
@@ -71,17 +84,12 @@ class DataCleaner:
         """Remove potential cheaters from cleaned datasets"""
         print(f"\n=== Removing Potential Cheaters ===")
         
-        for name, df in self.cleaned_data.items():
-            if 'player_id' in df.columns:
-                before_count = len(df)
-                df_clean = df[~df['player_id'].isin(potential_cheaters)]
-                after_count = len(df_clean)
-                removed = before_count - after_count
-                
-                print(f"  {name}: Removed {removed} additional records ({removed/before_count:.2%})")
-                self.cleaned_data[name] = df_clean
-        
-        return self.cleaned_data
+        self.exclusion.add_players('potential_cheaters', potential_cheaters)
+        return self._apply_exclusion("additional records")
+    
+    def exclusion_summary(self):
+        """Per-rule counts of excluded players"""
+        return pd.DataFrame(self.exclusion.rule_counts())
     
     def validate_ab_groups(self):
         """Validate A/B group assignments and distribution"""
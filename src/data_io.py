@@ -0,0 +1,214 @@
+"""
+Dataset I/O for A/B Testing Analysis
+Declared per-table schemas applied at read time so every loader
+produces the same compact DataFrames
+"""
+
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+from pathlib import Path
+from columnar_cache import ColumnarCache, PARQUET_AVAILABLE
+from streaming_aggregation import PlayerAccumulator, RESULT_VERSION
+
+# name -> (file name, description)
+DATASETS = {
+    "abgroup": ("ABgroup.csv", "Player group assignments"),
+    "cash": ("Cash.csv", "In-game currency spending"),
+    "cheaters": ("Cheaters.csv", "Known cheaters"),
+    "money": ("Money.csv", "Real money payments"),
+    "platforms": ("Platforms.csv", "Gaming platforms"),
+}
+
+# Transaction tables that can be streamed into per-player totals,
+# with their amount column under each naming convention
+TRANSACTION_TABLES = {
+    "cash": ("cash", "cash_amount"),
+    "money": ("money", "money_amount"),
+}
+
+# Columnar copies of the CSVs live here, relative to the data directory
+CACHE_DIR_NAME = ".cache"
+
+# Raw exports use user_id, the analysis code uses player_id
+COLUMN_ALIASES = {"user_id": "player_id"}
+
+# Column dtypes per table. 'datetime' columns are parsed as dates.
+# Amount columns are listed under both naming conventions used in src/.
+SCHEMAS = {
+    "abgroup": {"player_id": "int32", "group": "category"},
+    "cash": {"player_id": "int32", "date": "datetime",
+             "cash": "int32", "cash_amount": "int32"},
+    "cheaters": {"player_id": "int32", "cheaters": "uint8"},
+    "money": {"player_id": "int32", "date": "datetime",
+              "money": "float32", "money_amount": "float32"},
+    "platforms": {"player_id": "int32", "platform": "category"},
+}
+
+
+def read_csv_header(file_path):
+    """Return the raw column names of a CSV file"""
+    return list(pd.read_csv(file_path, nrows=0).columns)
+
+
+def csv_read_options(name, columns):
+    """
+    Build read_csv dtypes for the given raw columns
+
+    Date columns are read as categoricals and converted afterwards by
+    parse_date_columns, so only the few distinct date strings are parsed.
+    """
+    schema = SCHEMAS.get(name, {})
+    dtype = {}
+
+    for column in columns:
+        declared = schema.get(COLUMN_ALIASES.get(column, column))
+        if declared is not None:
+            dtype[column] = "category" if declared == "datetime" else declared
+
+    return {"dtype": dtype}
+
+
+def parse_date_columns(df, name):
+    """Convert categorical date columns to datetime64 in place"""
+    schema = SCHEMAS.get(name, {})
+    for column in df.columns:
+        if schema.get(column) != "datetime" or not isinstance(df[column].dtype, pd.CategoricalDtype):
+            continue
+        categories = df[column].cat.categories
+        try:
+            categories = pd.to_datetime(categories, format="ISO8601")
+        except (ValueError, TypeError):
+            # Exports use day-first dates (dd.mm.yy)
+            categories = pd.to_datetime(categories, dayfirst=True, format="mixed")
+        codes = df[column].cat.codes.to_numpy()
+        values = categories.take(codes, allow_fill=True, fill_value=pd.NaT)
+        df[column] = pd.Series(values, index=df.index)
+    return df
+
+
+def normalize_columns(df):
+    """Rename raw column aliases (user_id) to the canonical names in place"""
+    renames = {old: new for old, new in COLUMN_ALIASES.items() if old in df.columns}
+    if renames:
+        df.rename(columns=renames, inplace=True)
+    return df
+
+
+def schema_version(name):
+    """Short hash of a table's schema; cached copies are rebuilt when it changes"""
+    encoded = json.dumps(SCHEMAS.get(name, {}), sort_keys=True).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+def read_csv_dataset(file_path, name):
+    """Parse a CSV file with the declared schema of table `name`"""
+    options = csv_read_options(name, read_csv_header(file_path))
+    df = pd.read_csv(file_path, **options)
+    return parse_date_columns(normalize_columns(df), name)
+
+
+def read_dataset(data_path, name, use_cache=True, reader=read_csv_dataset):
+    """
+    Read one of the experiment tables with its declared schema
+
+    Returns a DataFrame with canonical column names (player_id),
+    int32 ids, categorical labels and parsed dates. With use_cache the
+    typed table is also kept as Parquet under data_path/.cache and read
+    from there while the CSV is unchanged (requires pyarrow). `reader`
+    parses the CSV (file_path, name), e.g. a dataframe backend's read_csv.
+    """
+    file_path = Path(data_path) / DATASETS[name][0]
+    if not (use_cache and PARQUET_AVAILABLE):
+        return reader(file_path, name)
+
+    cache = ColumnarCache(Path(data_path) / CACHE_DIR_NAME, version=schema_version(name))
+    return cache.load(name, file_path, lambda: reader(file_path, name))
+
+
+def iter_csv_chunks(file_path, name, chunksize=1_000_000):
+    """Yield typed chunks of a CSV file with the declared schema of table `name`"""
+    options = csv_read_options(name, read_csv_header(file_path))
+    with pd.read_csv(file_path, chunksize=chunksize, **options) as reader:
+        for chunk in reader:
+            yield parse_date_columns(normalize_columns(chunk), name)
+
+
+def aggregate_csv_transactions(file_path, name, chunksize=1_000_000):
+    """Stream a transaction CSV into one row per player (see PlayerAccumulator)"""
+    accumulator = None
+    for chunk in iter_csv_chunks(file_path, name, chunksize):
+        if accumulator is None:
+            value_column = next(c for c in TRANSACTION_TABLES[name] if c in chunk.columns)
+            accumulator = PlayerAccumulator(value_column)
+        accumulator.update(chunk)
+
+    if accumulator is None:
+        return pd.DataFrame(columns=['player_id', TRANSACTION_TABLES[name][0]])
+    return accumulator.result()
+
+
+def read_player_totals(data_path, name, use_cache=True, chunksize=1_000_000):
+    """
+    Per-player totals of a transaction table without loading raw rows
+
+    The result has the amount column under its usual name (one row per
+    player), so code that does groupby('player_id')[amount].sum() keeps
+    working on it unchanged. Cached like read_dataset.
+    """
+    file_path = Path(data_path) / DATASETS[name][0]
+    if not (use_cache and PARQUET_AVAILABLE):
+        return aggregate_csv_transactions(file_path, name, chunksize)
+
+    version = f"{schema_version(name)}-totals{RESULT_VERSION}"
+    cache = ColumnarCache(Path(data_path) / CACHE_DIR_NAME, version=version)
+    return cache.load(f"{name}_by_player", file_path,
+                      lambda: aggregate_csv_transactions(file_path, name, chunksize))
+
+
+def load_datasets(data_path, names=None, max_workers=1, use_cache=True,
+                  logger=None, skip_errors=False, aggregate_transactions=False):
+    """
+    Load several tables, optionally through a thread pool
+
+    Parsing (pandas C tokenizer, pyarrow) releases the GIL, so threads
+    overlap the reads without copying frames between processes. Progress
+    and per-file timing go to `logger` (anything with info/error, e.g.
+    DualLogger). Returns {name: DataFrame} in DATASETS order; with
+    skip_errors failed tables are logged and left out. With
+    aggregate_transactions, Cash/Money come back as per-player totals
+    (read_player_totals) instead of raw transactions.
+    """
+    names = list(DATASETS) if names is None else list(names)
+
+    def load_one(name):
+        filename, description = DATASETS[name]
+        if logger is not None:
+            logger.info(f"Loading {filename} ({description})...")
+        started = time.perf_counter()
+        if aggregate_transactions and name in TRANSACTION_TABLES:
+            df = read_player_totals(data_path, name, use_cache=use_cache)
+        else:
+            df = read_dataset(data_path, name, use_cache=use_cache)
+        elapsed = time.perf_counter() - started
+        if logger is not None:
+            logger.info(f"✓ Loaded {filename}: {df.shape[0]:,} rows, {df.shape[1]} columns in {elapsed:.2f}s")
+        return df
+
+    loaded = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(load_one, name): name for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                loaded[name] = future.result()
+            except Exception as e:
+                if not skip_errors:
+                    raise
+                if logger is not None:
+                    logger.error(f"Error loading {DATASETS[name][0]}: {str(e)}")
+
+    return {name: loaded[name] for name in names if name in loaded}
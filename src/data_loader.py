@@ -6,22 +6,29 @@ Gaming Company Premium Armor Campaign Analysis
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from data_io import DATASETS, TRANSACTION_TABLES, read_player_totals
+from dataframe_backend import get_backend
 
 class DataLoader:
-    def __init__(self, data_path="./data"):
+    def __init__(self, data_path="./data", use_cache=True, aggregate_transactions=False, backend=None):
         self.data_path = Path(data_path)
+        self.use_cache = use_cache
+        # Stream Money/Cash into per-player totals instead of raw transactions
+        self.aggregate_transactions = aggregate_transactions
+        # CSV parser: 'pandas', 'polars' or 'duckdb' (default: AB_DATAFRAME_BACKEND or pandas)
+        self.backend = get_backend(backend)
         
     def load_all_data(self):
         """Load all CSV files and return as dictionary of DataFrames"""
         data = {}
         
         # Load each dataset
-        print("Loading datasets...")
-        data['abgroup'] = pd.read_csv(self.data_path / "ABgroup.csv")
-        data['cash'] = pd.read_csv(self.data_path / "Cash.csv") 
-        data['cheaters'] = pd.read_csv(self.data_path / "Cheaters.csv")
-        data['money'] = pd.read_csv(self.data_path / "Money.csv")
-        data['platforms'] = pd.read_csv(self.data_path / "Platforms.csv")
+        print(f"Loading datasets ({self.backend.name} backend)...")
+        for name in DATASETS:
+            if self.aggregate_transactions and name in TRANSACTION_TABLES:
+                data[name] = read_player_totals(self.data_path, name, use_cache=self.use_cache)
+            else:
+                data[name] = self.backend.read_table(self.data_path, name, use_cache=self.use_cache)
         
         print("✓ All datasets loaded successfully!")
         self.print_dataset_info(data)
@@ -3,14 +3,20 @@ Data Loading Module with Logging for A/B Testing Analysis
 Gaming Company Premium Armor Campaign Analysis
 """
 
+import time
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from logger_config import setup_logging
+from data_io import DATASETS, load_datasets
 
 class DataLoaderLogged:
-    def __init__(self, data_path="./data"):
+    def __init__(self, data_path="./data", use_cache=True, max_workers=1,
+                 aggregate_transactions=False):
         self.data_path = Path(data_path)
+        self.use_cache = use_cache
+        self.max_workers = max_workers
+        self.aggregate_transactions = aggregate_transactions
         self.logger = setup_logging("../logs")
         
     def load_all_data(self):
@@ -19,37 +25,27 @@ class DataLoaderLogged:
         self.logger.info("STARTING A/B TESTING DATA ANALYSIS")
         self.logger.info("="*60)
         
-        data = {}
+        # Load each dataset (max_workers > 1 reads them concurrently)
+        self.logger.info(f"Loading datasets (workers: {self.max_workers})...")
         
-        # Load each dataset
-        self.logger.info("Loading datasets...")
-        
-        datasets = [
-            ("abgroup", "ABgroup.csv", "Player group assignments"),
-            ("cash", "Cash.csv", "In-game currency spending"),
-            ("cheaters", "Cheaters.csv", "Known cheaters"),
-            ("money", "Money.csv", "Real money payments"),
-            ("platforms", "Platforms.csv", "Gaming platforms")
-        ]
-        
-        for name, filename, description in datasets:
-            self.logger.info(f"\nLoading {filename} ({description})...")
+        available = []
+        for name, (filename, description) in DATASETS.items():
             file_path = self.data_path / filename
-            
             if not file_path.exists():
                 self.logger.error(f"File not found: {file_path}")
                 continue
-                
-            try:
-                df = pd.read_csv(file_path)
-                data[name] = df
-                self.logger.info(f"✓ Loaded {filename}: {df.shape[0]:,} rows, {df.shape[1]} columns")
-                
-                # Log detailed information about each dataset
-                self.logger.log_dataframe(df, f"{name.upper()} ({description})", sample_rows=5)
-                
-            except Exception as e:
-                self.logger.error(f"Error loading {filename}: {str(e)}")
+            available.append(name)
+        
+        started = time.perf_counter()
+        data = load_datasets(self.data_path, available, max_workers=self.max_workers,
+                             use_cache=self.use_cache, logger=self.logger, skip_errors=True,
+                             aggregate_transactions=self.aggregate_transactions)
+        self.logger.info(f"Load time: {time.perf_counter() - started:.2f}s")
+        
+        # Log detailed information about each dataset
+        for name, df in data.items():
+            description = DATASETS[name][1]
+            self.logger.log_dataframe(df, f"{name.upper()} ({description})", sample_rows=5)
         
         self.logger.info(f"\n✓ All datasets loaded successfully!")
         self.logger.info(f"Total datasets: {len(data)}")
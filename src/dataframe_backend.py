@@ -0,0 +1,294 @@
+"""
+Dataframe Backends for the load / clean / aggregate stages
+The CSV parsing and the big groupby workloads run on pandas (reference),
+Polars or an embedded DuckDB; every backend returns the same typed pandas
+frames, so the rest of the pipeline does not depend on the engine
+"""
+
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_io import (COLUMN_ALIASES, DATASETS, SCHEMAS, TRANSACTION_TABLES, csv_read_options, normalize_columns,
+                     parse_date_columns, read_csv_dataset, read_csv_header, read_dataset)
+
+try:
+    import polars as pl
+    POLARS_AVAILABLE = True
+except ImportError:
+    pl = None
+    POLARS_AVAILABLE = False
+
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    duckdb = None
+    DUCKDB_AVAILABLE = False
+
+# Backend used when none is passed explicitly
+BACKEND_ENV_VAR = 'AB_DATAFRAME_BACKEND'
+DEFAULT_BACKEND = 'pandas'
+
+
+def _engine_types(name, columns):
+    """
+    Raw column -> 'int' / 'float' / 'str' for engines that parse the CSV
+
+    Numbers are parsed wide and narrowed by the pandas schema afterwards,
+    so values are identical to the pandas reader.
+    """
+    schema = SCHEMAS.get(name, {})
+    types = {}
+    for column in columns:
+        declared = schema.get(COLUMN_ALIASES.get(column, column))
+        if declared is None or declared in ('category', 'datetime'):
+            types[column] = 'str'
+        elif declared.startswith('float'):
+            types[column] = 'float'
+        else:
+            types[column] = 'int'
+    return types
+
+
+def _typed_frame(df, name):
+    """Apply the declared schema of table `name` to a frame parsed by another engine"""
+    df = df.astype(csv_read_options(name, df.columns)['dtype'])
+    return parse_date_columns(normalize_columns(df), name)
+
+
+class PandasBackend:
+    """Reference implementation (pandas C parser and groupby)"""
+
+    name = 'pandas'
+
+    def read_csv(self, file_path, name):
+        """Typed DataFrame of one experiment CSV"""
+        return read_csv_dataset(file_path, name)
+
+    def read_table(self, data_path, name, use_cache=True):
+        """Like data_io.read_dataset (same Parquet cache), parsing with this backend"""
+        return read_dataset(data_path, name, use_cache=use_cache, reader=self.read_csv)
+
+    def player_totals(self, df, value_column):
+        """player_id, sum and count of a transaction column per player, sorted by player_id"""
+        # Widen before summing: float32 accumulation drifts from the other engines
+        grouped = df[value_column].astype('float64').groupby(df['player_id'], observed=True)
+        totals = pd.DataFrame({'sum': grouped.sum(), 'count': grouped.size()})
+        return totals.reset_index()
+
+    def group_sums(self, data, metric_columns, group_column='group'):
+        """count (n) / sum / sum of squares of each metric per group, groups in order of appearance"""
+        columns = {group_column: data[group_column]}
+        for metric in metric_columns:
+            values = data[metric].astype('float64')
+            columns[f'{metric}__sum'] = values
+            columns[f'{metric}__sumsq'] = values * values
+        sums = pd.DataFrame(columns).groupby(group_column, observed=True, sort=False).sum()
+        sums['n'] = data.groupby(group_column, observed=True, sort=False).size()
+        return sums
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class PolarsBackend(PandasBackend):
+    """Multithreaded Polars parser and group_by"""
+
+    name = 'polars'
+
+    def __init__(self):
+        if not POLARS_AVAILABLE:
+            raise ImportError("The polars backend requires the polars package")
+
+    def read_csv(self, file_path, name):
+        types = _engine_types(name, read_csv_header(file_path))
+        polars_types = {'int': pl.Int64, 'float': pl.Float64, 'str': pl.Utf8}
+        df = pl.read_csv(file_path, schema_overrides={column: polars_types[kind]
+                                                      for column, kind in types.items()})
+        return _typed_frame(df.to_pandas(), name)
+
+    def player_totals(self, df, value_column):
+        frame = pl.from_pandas(df[['player_id', value_column]])
+        totals = (frame.group_by('player_id')
+                  .agg(pl.col(value_column).cast(pl.Float64).sum().alias('sum'),
+                       pl.col(value_column).count().alias('count'))
+                  .sort('player_id'))
+        return totals.to_pandas()
+
+    def group_sums(self, data, metric_columns, group_column='group'):
+        frame = pl.from_pandas(pd.DataFrame({
+            group_column: data[group_column].astype(str),
+            **{metric: data[metric].astype('float64') for metric in metric_columns},
+        }))
+        aggregations = [pl.len().alias('n')]
+        for metric in metric_columns:
+            aggregations += [pl.col(metric).sum().alias(f'{metric}__sum'),
+                             (pl.col(metric) * pl.col(metric)).sum().alias(f'{metric}__sumsq')]
+        sums = frame.group_by(group_column, maintain_order=True).agg(aggregations).to_pandas()
+        return _order_group_sums(sums, data, metric_columns, group_column)
+
+
+class DuckDBBackend(PandasBackend):
+    """Embedded DuckDB: parallel CSV reader and SQL aggregation over the pandas frames"""
+
+    name = 'duckdb'
+
+    def __init__(self, threads=None):
+        if not DUCKDB_AVAILABLE:
+            raise ImportError("The duckdb backend requires the duckdb package")
+        self.connection = duckdb.connect()
+        if threads:
+            self.connection.execute(f"SET threads TO {int(threads)}")
+
+    def read_csv(self, file_path, name):
+        types = _engine_types(name, read_csv_header(file_path))
+        sql_types = {'int': 'BIGINT', 'float': 'DOUBLE', 'str': 'VARCHAR'}
+        relation = self.connection.read_csv(str(file_path), header=True,
+                                            dtype={column: sql_types[kind] for column, kind in types.items()})
+        return _typed_frame(relation.df(), name)
+
+    def _query(self, sql, frame):
+        self.connection.register('frame', frame)
+        try:
+            return self.connection.execute(sql).df()
+        finally:
+            self.connection.unregister('frame')
+
+    def player_totals(self, df, value_column):
+        frame = df[['player_id', value_column]]
+        return self._query(f'SELECT player_id, SUM(CAST("{value_column}" AS DOUBLE)) AS sum, '
+                           f'COUNT(*) AS count FROM frame GROUP BY player_id ORDER BY player_id', frame)
+
+    def group_sums(self, data, metric_columns, group_column='group'):
+        frame = pd.DataFrame({
+            group_column: data[group_column].astype(str),
+            **{metric: data[metric].astype('float64') for metric in metric_columns},
+        })
+        aggregations = ['COUNT(*) AS n']
+        for metric in metric_columns:
+            aggregations += [f'SUM("{metric}") AS "{metric}__sum"',
+                             f'SUM("{metric}" * "{metric}") AS "{metric}__sumsq"']
+        sums = self._query(f'SELECT "{group_column}", {", ".join(aggregations)} '
+                           f'FROM frame GROUP BY "{group_column}"', frame)
+        return _order_group_sums(sums, data, metric_columns, group_column)
+
+
+def _order_group_sums(sums, data, metric_columns, group_column):
+    """Engine result -> the pandas layout: group index in order of appearance, n last"""
+    order = [str(group) for group in pd.unique(data[group_column])]
+    sums = sums.set_index(group_column).reindex(order)
+    sums.index = pd.Index(pd.unique(data[group_column]), name=group_column)
+    columns = [f'{metric}__{part}' for metric in metric_columns for part in ('sum', 'sumsq')]
+    sums = sums[columns + ['n']]
+    sums['n'] = sums['n'].astype('int64')
+    return sums
+
+
+BACKENDS = {
+    'pandas': PandasBackend,
+    'polars': PolarsBackend,
+    'duckdb': DuckDBBackend,
+}
+
+
+def available_backends():
+    """Names of the backends whose engine is installed"""
+    installed = {'pandas': True, 'polars': POLARS_AVAILABLE, 'duckdb': DUCKDB_AVAILABLE}
+    return [name for name in BACKENDS if installed[name]]
+
+
+def get_backend(backend=None):
+    """
+    Backend instance from a name, an instance or None
+
+    None selects the AB_DATAFRAME_BACKEND environment variable, or pandas.
+    """
+    if backend is None:
+        backend = os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND)
+    if not isinstance(backend, str):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown dataframe backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    return BACKENDS[backend]()
+
+
+def frames_match(expected, actual, rtol=1e-9, atol=1e-9):
+    """Same columns and rows; numeric columns equal within tolerance"""
+    if list(expected.columns) != list(actual.columns) or len(expected) != len(actual):
+        return False
+    for column in expected.columns:
+        a, b = expected[column], actual[column]
+        if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+            if not np.allclose(a.to_numpy(dtype='float64'), b.to_numpy(dtype='float64'),
+                               rtol=rtol, atol=atol, equal_nan=True):
+                return False
+        elif not a.astype(str).reset_index(drop=True).equals(b.astype(str).reset_index(drop=True)):
+            return False
+    return True
+
+
+def benchmark_backends(data_path="./data", backends=None, repeat=3):
+    """
+    Time every stage on every installed backend against pandas
+
+    Stages: load:<table> (CSV parse, no cache), player_totals:<table> and
+    group_sums (CI/t-test sums over the per-player table). Returns a
+    DataFrame with stage, backend, seconds (best of `repeat`), speedup over
+    pandas and whether the result matches pandas within tolerance.
+    """
+    from player_features import PlayerFeatures
+    from player_index import PlayerDimension
+
+    data_path = Path(data_path)
+    names = [name for name in (backends or BACKENDS) if name in available_backends()]
+    skipped = [name for name in (backends or BACKENDS) if name not in names]
+    if skipped:
+        print(f"Skipping backends that are not installed: {', '.join(skipped)}")
+    engines = {name: get_backend(name) for name in ['pandas'] + [n for n in names if n != 'pandas']}
+
+    reference = engines['pandas']
+    tables = {name: reference.read_csv(data_path / DATASETS[name][0], name) for name in DATASETS}
+    features = PlayerFeatures.build(PlayerDimension.from_tables(tables['abgroup'], tables['platforms']),
+                                    tables['money'], tables['cash'])
+    player_table = features.frame(columns=['money', 'cash'])
+
+    stages = {f'load:{name}': (lambda engine, name=name: engine.read_csv(data_path / DATASETS[name][0], name))
+              for name in DATASETS}
+    for table in TRANSACTION_TABLES:
+        value_column = next(c for c in TRANSACTION_TABLES[table] if c in tables[table].columns)
+        stages[f'player_totals:{table}'] = (
+            lambda engine, table=table, value_column=value_column:
+            engine.player_totals(tables[table], value_column))
+    stages['group_sums'] = lambda engine: engine.group_sums(player_table, ['money', 'paying', 'cash'])
+
+    rows = []
+    for stage, run in stages.items():
+        expected = None
+        for name, engine in engines.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = run(engine)
+                timings.append(time.perf_counter() - started)
+            if expected is None:
+                expected = result
+            if stage == 'group_sums':
+                matches = frames_match(expected.reset_index(), result.reset_index())
+            else:
+                matches = frames_match(expected, result)
+            rows.append({'stage': stage, 'backend': name, 'seconds': min(timings), 'matches': matches})
+
+    report = pd.DataFrame(rows)
+    pandas_seconds = report[report['backend'] == 'pandas'].set_index('stage')['seconds']
+    report['speedup'] = (report['stage'].map(pandas_seconds) / report['seconds']).round(2)
+    return report
+
+
+if __name__ == "__main__":
+    report = benchmark_backends()
+    print(report.pivot(index='stage', columns='backend', values='speedup'))
+    print(report.to_string(index=False))
@@ -0,0 +1,158 @@
+"""
+Streaming Excel Export
+Writes DataFrames to xlsx with the report styling (header colours, borders,
+column widths) applied while writing, in a single pass: xlsxwriter in
+constant_memory mode flushes every row to disk as soon as it is complete,
+so large per-player or per-segment sheets never sit in memory as cells
+"""
+
+import pandas as pd
+
+try:
+    import xlsxwriter
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    xlsxwriter = None
+    XLSXWRITER_AVAILABLE = False
+
+HEADER_COLOR = '366092'
+MAX_COLUMN_WIDTH = 50
+
+
+def frame_rows(df):
+    """Rows of df as lists of plain Python values (None for missing), one column converted at a time"""
+    columns = []
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_datetime64_any_dtype(series):
+            series = series.astype(str).where(series.notna())
+        values = series.astype(object).where(series.notna(), None).tolist()
+        columns.append(values)
+    return zip(*columns)
+
+
+def column_widths(df):
+    """Width per column: longest header or value (as text) + 2, capped at MAX_COLUMN_WIDTH"""
+    widths = []
+    for column in df.columns:
+        longest = len(str(column))
+        if len(df):
+            longest = max(longest, int(df[column].astype(str).str.len().max()))
+        widths.append(min(longest + 2, MAX_COLUMN_WIDTH))
+    return widths
+
+
+def _flat_frame(df, index):
+    """Index written as leading columns, MultiIndex column labels joined with spaces"""
+    if index:
+        df = df.reset_index()
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.set_axis([' '.join(str(part) for part in label if str(part)) for label in df.columns], axis=1)
+    return df
+
+
+class StreamingExcelWriter:
+    """
+    Styled xlsx writer with a DataFrame.to_excel-like write()
+
+    Tables on one sheet must be written top to bottom (startrow after the
+    previous table), as rows are flushed once written. Uses xlsxwriter with
+    constant_memory; without it falls back to openpyxl's write-only mode,
+    which holds one sheet's frames until the next sheet starts.
+    """
+
+    def __init__(self, filename):
+        self.filename = str(filename)
+        self.next_row = {}
+        self.widths = {}
+        if XLSXWRITER_AVAILABLE:
+            self.workbook = xlsxwriter.Workbook(self.filename, {
+                'constant_memory': True, 'strings_to_urls': False, 'nan_inf_to_errors': True})
+            border = {'border': 1}
+            self.header_format = self.workbook.add_format(dict(
+                border, bold=True, font_color='#FFFFFF', bg_color=f'#{HEADER_COLOR}',
+                align='center', valign='vcenter'))
+            self.cell_format = self.workbook.add_format(border)
+            self.sheets = {}
+        else:
+            from openpyxl import Workbook
+            self.workbook = Workbook(write_only=True)
+            self.pending = None
+
+    def write(self, df, sheet_name, startrow=0, index=False):
+        """Write df with a styled header row at startrow of sheet_name"""
+        df = _flat_frame(df, index)
+        if startrow < self.next_row.get(sheet_name, 0):
+            raise ValueError(f"Sheet {sheet_name!r}: row {startrow} is above rows already written")
+        self.next_row[sheet_name] = startrow + len(df) + 1
+        widths = self.widths.setdefault(sheet_name, [])
+        for i, width in enumerate(column_widths(df)):
+            if i == len(widths):
+                widths.append(width)
+            widths[i] = max(widths[i], width)
+
+        if XLSXWRITER_AVAILABLE:
+            self._write_xlsxwriter(df, sheet_name, startrow)
+        else:
+            if self.pending is not None and self.pending[0] != sheet_name:
+                self._flush_openpyxl()
+            if self.pending is None:
+                self.pending = (sheet_name, [])
+            self.pending[1].append((startrow, df))
+
+    def _write_xlsxwriter(self, df, sheet_name, startrow):
+        if sheet_name not in self.sheets:
+            self.sheets[sheet_name] = self.workbook.add_worksheet(sheet_name)
+        worksheet = self.sheets[sheet_name]
+        worksheet.write_row(startrow, 0, [str(column) for column in df.columns], self.header_format)
+        for row, values in enumerate(frame_rows(df), start=startrow + 1):
+            worksheet.write_row(row, 0, values, self.cell_format)
+        for i, width in enumerate(self.widths[sheet_name]):
+            worksheet.set_column(i, i, width)
+
+    def _flush_openpyxl(self):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+        from openpyxl.utils import get_column_letter
+
+        sheet_name, tables = self.pending
+        self.pending = None
+        worksheet = self.workbook.create_sheet(sheet_name)
+        # Write-only sheets take column widths before the first row
+        for i, width in enumerate(self.widths[sheet_name], start=1):
+            worksheet.column_dimensions[get_column_letter(i)].width = width
+
+        side = Side(style='thin')
+        border = Border(left=side, right=side, top=side, bottom=side)
+        header_style = {'font': Font(bold=True, color='FFFFFF'), 'border': border,
+                        'fill': PatternFill(start_color=HEADER_COLOR, end_color=HEADER_COLOR, fill_type='solid'),
+                        'alignment': Alignment(horizontal='center', vertical='center')}
+
+        def styled(value, style):
+            cell = WriteOnlyCell(worksheet, value=value)
+            for name, attribute in style.items():
+                setattr(cell, name, attribute)
+            return cell
+
+        row = 0
+        for startrow, df in tables:
+            for _ in range(startrow - row):
+                worksheet.append([])
+            worksheet.append([styled(str(column), header_style) for column in df.columns])
+            for values in frame_rows(df):
+                worksheet.append([styled(value, {'border': border}) for value in values])
+            row = startrow + len(df) + 1
+
+    def close(self):
+        if not XLSXWRITER_AVAILABLE and self.pending is not None:
+            self._flush_openpyxl()
+        if XLSXWRITER_AVAILABLE:
+            self.workbook.close()
+        else:
+            self.workbook.save(self.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
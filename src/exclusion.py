@@ -0,0 +1,76 @@
+"""
+Player Exclusion Mask for data cleaning
+One bitmap per player combining every exclusion rule (known cheaters,
+spending outliers, ...), applied to each table in a single pass
+"""
+
+import numpy as np
+
+
+class ExclusionMask:
+    """
+    Per-player exclusion bits over a PlayerDimension
+
+    Each rule gets its own bit, so counts per rule stay available after the
+    rules are combined. Rules are reported in the order they were added:
+    'flagged' is every player the rule matches, 'added' only those not
+    already excluded by an earlier rule.
+    """
+
+    MAX_RULES = 16
+
+    def __init__(self, players):
+        self.players = players
+        self.bits = np.zeros(players.n_players, dtype='uint16')
+        self.rules = []
+
+    def add_rule(self, name, mask):
+        """Register a rule from a bool array aligned with the player dimension"""
+        if len(self.rules) >= self.MAX_RULES:
+            raise ValueError(f"At most {self.MAX_RULES} exclusion rules are supported")
+        mask = np.asarray(mask, dtype=bool)
+        bit = np.uint16(1 << len(self.rules))
+        added = int(np.count_nonzero(mask & (self.bits == 0)))
+        self.bits[mask] |= bit
+        self.rules.append({'rule': name, 'bit': int(bit),
+                           'flagged': int(np.count_nonzero(mask)), 'added': added})
+        return added
+
+    def add_players(self, name, player_ids):
+        """Register a rule from a list of raw player ids"""
+        return self.add_rule(name, self.players.mask_of(player_ids))
+
+    @property
+    def excluded(self):
+        """Bool array: player is excluded by any rule"""
+        return self.bits != 0
+
+    def rule_mask(self, name):
+        bit = next(rule['bit'] for rule in self.rules if rule['rule'] == name)
+        return (self.bits & bit) != 0
+
+    def rule_counts(self):
+        """Per-rule player counts, in rule order"""
+        return [dict(rule) for rule in self.rules]
+
+    def keep_rows(self, player_ids):
+        """
+        Bool array over table rows: keep rows whose player is not excluded
+
+        Rows for players outside the dimension are kept (no rule applies).
+        """
+        index = self.players.lookup(player_ids)
+        keep = np.ones(len(index), dtype=bool)
+        found = index >= 0
+        keep[found] = self.bits[index[found]] == 0
+        return keep
+
+    def apply(self, table):
+        """Filter one table by the combined mask (one scan, one copy)"""
+        if 'player_id' not in table.columns:
+            return table
+        return table[self.keep_rows(table['player_id'].to_numpy())]
+
+    def kept_players(self):
+        """PlayerDimension restricted to players that are not excluded"""
+        return self.players.subset(~self.excluded)
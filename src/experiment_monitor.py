@@ -0,0 +1,395 @@
+"""
+Incremental Experiment Monitor for A/B Testing
+Keeps per-player totals and per group x platform cell statistics on disk
+and folds in only the Money/Cash rows that arrived since the last check,
+reporting always-valid (mSPRT) p-values after every batch
+"""
+
+import hashlib
+import io
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_io import (DATASETS, TRANSACTION_TABLES, csv_read_options, normalize_columns,
+                     parse_date_columns, read_csv_header, read_dataset)
+from player_index import PlayerDimension
+from sufficient_stats import CellStats, ttest_from_stats
+
+# Monitor state lives here, relative to the data directory
+MONITOR_DIR_NAME = ".monitor"
+STATE_VERSION = 1
+
+# Bytes of new CSV data parsed at a time
+BLOCK_SIZE = 64 * 1024 * 1024
+
+# Bytes just before the processed offset that must be unchanged for the
+# file to count as appended to (otherwise it is rescanned by date)
+SIGNATURE_SIZE = 4096
+
+# metric -> per-player total it is computed from ('paying' = payers only)
+METRICS = {
+    'arpu': 'money',
+    'arppu': 'paying',
+    'cash': 'cash',
+}
+
+
+def msprt_statistic(n_a, mean_a, var_a, n_b, mean_b, var_b, tau2):
+    """
+    Normal-mixture mSPRT likelihood ratio for a difference in means
+
+    H0: equal means; the mixing distribution of the difference is
+    N(0, tau2). 1 / statistic is an always-valid p-value that may be
+    checked after every batch (take the running minimum).
+    """
+    variance = var_a / n_a + var_b / n_b
+    delta = mean_b - mean_a
+    with np.errstate(over='ignore'):
+        return float(np.sqrt(variance / (variance + tau2))
+                     * np.exp(tau2 * delta ** 2 / (2 * variance * (variance + tau2))))
+
+
+class ExperimentMonitor:
+    """
+    Incremental monitor over appended Money.csv / Cash.csv rows
+
+    State (under data_path/.monitor):
+      - players.npz: the player dimension without known cheaters
+      - totals.npz:  per-player money/paying/cash totals and per-cell
+                     count/sum/sum of squares of each metric
+      - state.json:  processed byte offset, date watermark and number of
+                     rows folded on the watermark date per file, mSPRT
+                     mixture variances and the history of looks
+
+    A check reads the files from the stored offset, so it costs time
+    proportional to the new rows. When a file was rewritten rather than
+    appended to, it is rescanned and only rows dated after the watermark,
+    or on it beyond the rows already folded for that date, are folded in. Spending-outlier exclusion needs the full distribution
+    and is left to the batch analysis.
+    """
+
+    def __init__(self, data_path="./data", state_dir=None, mixture_effect=0.05, alpha=0.05,
+                 logger=None):
+        self.data_path = Path(data_path)
+        self.state_dir = Path(state_dir) if state_dir is not None else self.data_path / MONITOR_DIR_NAME
+        # mSPRT prior: effect sizes around mixture_effect x control mean
+        self.mixture_effect = mixture_effect
+        self.alpha = alpha
+        self.logger = logger
+        self.players = None
+        self.totals = None
+        self.cells = None
+        self.state = None
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
+        else:
+            print(message)
+
+    def _write_atomic(self, path, write):
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def save(self):
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        arrays = {f'total_{name}': values for name, values in self.totals.items()}
+        for metric, cells in self.cells.items():
+            arrays.update({f'{metric}_count': cells.count, f'{metric}_total': cells.total,
+                           f'{metric}_sumsq': cells.sumsq})
+        self._write_atomic(self.state_dir / 'totals.npz', lambda f: np.savez(f, **arrays))
+        # state.json last: it is what marks the batch as processed
+        encoded = json.dumps(self.state, indent=2, default=str).encode('utf-8')
+        self._write_atomic(self.state_dir / 'state.json', lambda f: f.write(encoded))
+
+    def load(self):
+        """Load the saved state; returns False when there is none yet"""
+        state_path = self.state_dir / 'state.json'
+        if not state_path.exists():
+            return False
+        with open(state_path, encoding='utf-8') as f:
+            self.state = json.load(f)
+        if self.state.get('version') != STATE_VERSION:
+            raise ValueError(f"Monitor state version {self.state.get('version')} is not supported, "
+                             f"call reset() to rebuild it")
+
+        with np.load(self.state_dir / 'players.npz') as saved:
+            self.players = PlayerDimension(
+                saved['player_ids'], saved['group_codes'], pd.Index(saved['group_categories']),
+                saved['platform_codes'], pd.Index(saved['platform_categories']))
+        with np.load(self.state_dir / 'totals.npz') as saved:
+            self.totals = {name: saved[f'total_{name}'] for name in ('money', 'paying', 'cash')}
+            self.cells = {
+                metric: CellStats(saved[f'{metric}_count'], saved[f'{metric}_total'],
+                                  saved[f'{metric}_sumsq'], self.players.group_categories,
+                                  self.players.platform_categories)
+                for metric in METRICS
+            }
+        return True
+
+    def reset(self):
+        """Start a new monitor: player dimension from ABgroup/Platforms/Cheaters, empty totals"""
+        abgroup = read_dataset(self.data_path, 'abgroup')
+        platforms = read_dataset(self.data_path, 'platforms')
+        cheaters = read_dataset(self.data_path, 'cheaters')
+        players = PlayerDimension.from_tables(abgroup, platforms, cheaters)
+        self.players = players.subset(~players.cheater)
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self._write_atomic(self.state_dir / 'players.npz', lambda f: np.savez(
+            f, player_ids=self.players.player_ids, group_codes=self.players.group_codes,
+            group_categories=np.asarray(self.players.group_categories, dtype=str),
+            platform_codes=self.players.platform_codes,
+            platform_categories=np.asarray(self.players.platform_categories, dtype=str)))
+
+        self.totals = {name: np.zeros(self.players.n_players) for name in ('money', 'paying', 'cash')}
+        empty = np.zeros(self.players.n_players)
+        self.cells = {metric: CellStats.from_players(self.players, empty) for metric in METRICS}
+        # Payers only: nobody has paid yet
+        self.cells['arppu'].count[:] = 0
+        self.state = {
+            'version': STATE_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'players': int(self.players.n_players),
+            'excluded_cheaters': int(np.count_nonzero(players.cheater)),
+            'files': {},
+            'tau2': {},
+            'always_valid_p': {},
+            'looks': [],
+        }
+        self.save()
+        self._log(f"Monitor initialized: {self.players.n_players:,} players "
+                  f"({self.state['excluded_cheaters']:,} known cheaters excluded)")
+
+    def _signature(self, f, offset):
+        start = max(0, offset - SIGNATURE_SIZE)
+        f.seek(start)
+        return hashlib.blake2b(f.read(offset - start), digest_size=16).hexdigest()
+
+    def _new_blocks(self, name, file_path):
+        """
+        Yield (typed frame, offset after it, skipped rows) for the complete
+        lines added since the last check
+
+        Reads from the stored byte offset when the file was appended to;
+        otherwise the whole file is scanned, rows dated before the
+        watermark are skipped and so are the first watermark_rows rows
+        dated on it (already folded; a rewrite is assumed to keep their
+        order). A trailing partial line is left for the next check.
+        """
+        file_state = self.state['files'].get(name)
+        header = read_csv_header(file_path)
+        options = csv_read_options(name, header)
+        size = file_path.stat().st_size
+
+        with open(file_path, 'rb') as f:
+            watermark = None
+            if file_state is not None and file_state['header'] == header \
+                    and file_state['offset'] <= size \
+                    and self._signature(f, file_state['offset']) == file_state['signature']:
+                offset = file_state['offset']
+            else:
+                f.seek(0)
+                offset = len(f.readline())
+                if file_state is not None and file_state['watermark'] is not None:
+                    watermark = pd.Timestamp(file_state['watermark'])
+                    # States without the count skipped every row on the watermark date
+                    to_skip = file_state.get('watermark_rows', np.inf)
+                    self._log(f"  {file_path.name} was rewritten: rescanning rows from {watermark.date()}")
+
+            f.seek(offset)
+            remainder = b''
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    break
+                block = remainder + block
+                cut = block.rfind(b'\n') + 1
+                block, remainder = block[:cut], block[cut:]
+                offset += len(block)
+                if not block:
+                    continue
+                frame = pd.read_csv(io.BytesIO(block), header=None, names=header, **options)
+                frame = parse_date_columns(normalize_columns(frame), name)
+                skipped = 0
+                if watermark is not None:
+                    on_watermark = (frame['date'] == watermark).to_numpy()
+                    seen = np.cumsum(on_watermark)
+                    keep = (frame['date'] > watermark).to_numpy() | (on_watermark & (seen > to_skip))
+                    to_skip = max(0, to_skip - int(on_watermark.sum()))
+                    skipped = len(frame) - int(keep.sum())
+                    frame = frame[keep]
+                yield frame, offset, skipped
+
+    def _fold(self, metric_totals, metric, index, values, count_payers=False):
+        """Add per-row values to per-player totals and move the cell statistics along"""
+        touched, position = np.unique(index, return_inverse=True)
+        added = np.bincount(position.ravel(), weights=values, minlength=len(touched))
+        old = metric_totals[touched]
+        new = old + added
+        metric_totals[touched] = new
+
+        # Players without a known group (code -1) keep their totals but stay out of the cells
+        grouped = self.players.group_codes[touched] >= 0
+        if not grouped.all():
+            touched, old, new = touched[grouped], old[grouped], new[grouped]
+
+        cells = self.cells[metric]
+        n_slots = cells.count.shape[1]
+        platform_slot = self.players.platform_codes[touched].astype('int64') + 1
+        cell = self.players.group_codes[touched].astype('int64') * n_slots + platform_slot
+        size = cells.count.size
+
+        if count_payers:
+            # Players enter ARPPU with their first payment
+            new_payer = (old == 0) & (new != 0)
+            cells.count += np.bincount(cell, weights=new_payer, minlength=size).reshape(cells.count.shape)
+        cells.total += np.bincount(cell, weights=new - old, minlength=size).reshape(cells.total.shape)
+        cells.sumsq += np.bincount(cell, weights=new * new - old * old,
+                                   minlength=size).reshape(cells.sumsq.shape)
+
+    def _fold_frame(self, name, frame):
+        value_column = next(c for c in TRANSACTION_TABLES[name] if c in frame.columns)
+        index = self.players.lookup(frame['player_id'].to_numpy())
+        values = frame[value_column].to_numpy(dtype='float64')
+        found = index >= 0
+        index, values = index[found], values[found]
+
+        if name == 'money':
+            self._fold(self.totals['money'], 'arpu', index, values)
+            positive = values > 0
+            self._fold(self.totals['paying'], 'arppu', index[positive], values[positive],
+                       count_payers=True)
+        else:
+            self._fold(self.totals['cash'], 'cash', index, values)
+
+    def update(self):
+        """
+        Fold the newly arrived Money/Cash rows in and record one look
+
+        Returns the status table (see status()) after the update.
+        """
+        if self.state is None and not self.load():
+            self.reset()
+
+        look = {'look': len(self.state['looks']) + 1,
+                'checked_at': datetime.now().isoformat(timespec='seconds'),
+                'files': {}}
+        for name in TRANSACTION_TABLES:
+            file_path = self.data_path / DATASETS[name][0]
+            file_state = self.state['files'].get(name, {})
+            previous = pd.Timestamp(file_state['watermark']) if file_state.get('watermark') else None
+            rows, late, skipped, first_date, last_date = 0, 0, 0, None, None
+            offset = file_state.get('offset', 0)
+            # Rows folded on the latest date seen and on the previous watermark date
+            on_last, on_previous = 0, 0
+
+            for frame, offset, block_skipped in self._new_blocks(name, file_path):
+                skipped += block_skipped
+                if len(frame) == 0:
+                    continue
+                self._fold_frame(name, frame)
+                rows += len(frame)
+                dates = frame['date']
+                if previous is not None:
+                    late += int((dates <= previous).sum())
+                    on_previous += int((dates == previous).sum())
+                first_date = dates.min() if first_date is None else min(first_date, dates.min())
+                if last_date is None or dates.max() > last_date:
+                    last_date, on_last = dates.max(), 0
+                on_last += int((dates == last_date).sum())
+
+            with open(file_path, 'rb') as f:
+                signature = self._signature(f, offset)
+            dates_seen = [d for d in (previous, last_date) if d is not None]
+            watermark = max(dates_seen) if dates_seen else None
+            if previous is None or (last_date is not None and last_date > previous):
+                watermark_rows = on_last
+            else:
+                watermark_rows = file_state.get('watermark_rows', 0) + on_previous
+            self.state['files'][name] = {
+                'header': read_csv_header(file_path),
+                'offset': offset,
+                'signature': signature,
+                'watermark': None if watermark is None else str(watermark),
+                'watermark_rows': watermark_rows,
+            }
+            look['files'][name] = {'rows': rows, 'late_rows': late, 'skipped_rows': skipped,
+                                   'first_date': None if first_date is None else str(first_date.date()),
+                                   'last_date': None if last_date is None else str(last_date.date())}
+            self._log(f"  {DATASETS[name][0]}: {rows:,} new rows"
+                      + (f" ({first_date.date()} .. {last_date.date()})" if rows else "")
+                      + (f", {late:,} dated on/before the previous watermark" if late else "")
+                      + (f", {skipped:,} already folded rows skipped on rescan" if skipped else ""))
+
+        status = self.status(record=True)
+        look['metrics'] = status.set_index('metric').to_dict(orient='index')
+        self.state['looks'].append(look)
+        self.save()
+        return status
+
+    def status(self, control='control', test='test', record=False):
+        """
+        Current per-metric comparison: means, lift, fixed-horizon and always-valid p-values
+
+        With record=True the mSPRT running minimum is advanced (one look);
+        plain status() calls do not spend a look.
+        """
+        rows = []
+        for metric, cells in self.cells.items():
+            n_c, mean_c, var_c = cells.group_moments(control)
+            n_t, mean_t, var_t = cells.group_moments(test)
+            row = {'metric': metric, 'n_control': int(n_c), 'n_test': int(n_t),
+                   'control_mean': mean_c, 'test_mean': mean_t,
+                   'lift': np.nan, 'p_value': np.nan,
+                   'always_valid_p': self.state['always_valid_p'].get(metric, 1.0)}
+
+            if n_c > 1 and n_t > 1 and var_c + var_t > 0:
+                row['lift'] = (mean_t - mean_c) / mean_c * 100 if mean_c else np.nan
+                row['p_value'] = float(ttest_from_stats(n_c, mean_c, var_c, n_t, mean_t, var_t)[1])
+
+                # Mixture variance fixed at the first usable look
+                tau2 = self.state['tau2'].get(metric)
+                if tau2 is None and mean_c:
+                    tau2 = (self.mixture_effect * mean_c) ** 2
+                    if record:
+                        self.state['tau2'][metric] = tau2
+                if tau2:
+                    statistic = msprt_statistic(n_c, mean_c, var_c, n_t, mean_t, var_t, tau2)
+                    p_value = min(row['always_valid_p'], 1 / statistic if statistic > 0 else 1.0)
+                    row['always_valid_p'] = p_value
+                    if record:
+                        self.state['always_valid_p'][metric] = p_value
+
+            row['significant'] = bool(row['always_valid_p'] < self.alpha)
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def history(self):
+        """One row per look and metric with the always-valid p-value at that point"""
+        rows = []
+        for look in self.state['looks']:
+            for metric, values in look['metrics'].items():
+                rows.append({'look': look['look'], 'checked_at': look['checked_at'], 'metric': metric,
+                             **{k: values[k] for k in ('lift', 'p_value', 'always_valid_p')}})
+        return pd.DataFrame(rows)
+
+
+def run_monitor_update(data_path="./data", logger=None):
+    """Daily check: fold new rows in and print the sequential test status"""
+    monitor = ExperimentMonitor(data_path, logger=logger)
+    status = monitor.update()
+    monitor._log("\nExperiment status (always-valid p-values, mSPRT):")
+    monitor._log(status.round(6).to_string(index=False))
+    return status
+
+
+if __name__ == "__main__":
+    run_monitor_update()
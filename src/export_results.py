@@ -3,6 +3,11 @@ Quick export of A/B test results to Excel for codex documentation
 """
 import pandas as pd
 from datetime import datetime
+from results_artifact import load_latest_artifact
+
+# Results of the latest run_complete_analysis() (artifact in reports/);
+# the numbers of the final course analysis when no run has written one
+artifact = load_latest_artifact()
 
 # Create summary results
 results_summary = {
@@ -14,6 +19,17 @@ results_summary = {
     'Statistically_Significant': ['Yes', 'Yes', 'Yes']
 }
 
+if artifact is not None:
+    metrics = [artifact.metric(metric) for metric in ('arpu', 'arppu', 'cash')]
+    results_summary = {
+        'Metric': ['ARPU', 'ARPPU', 'Cash Spending'],
+        'Control_Group': [round(m['groups']['control']['mean'], 4) for m in metrics],
+        'Test_Group': [round(m['groups']['test']['mean'], 4) for m in metrics],
+        'Improvement_Percent': [round(m['lift_percent'], 2) for m in metrics],
+        'P_Value': ['< 0.000001' if m['p_value'] < 1e-6 else f"{m['p_value']:.6f}" for m in metrics],
+        'Statistically_Significant': ['Yes' if m['p_value'] < 0.05 else 'No' for m in metrics]
+    }
+
 summary_df = pd.DataFrame(results_summary)
 
 # Platform distribution
@@ -23,6 +39,14 @@ platform_summary = {
     'Percentage': [33.3, 33.3, 33.4]
 }
 
+if artifact is not None:
+    platform_counts = artifact.summary['platforms']
+    platform_summary = {
+        'Platform': list(platform_counts),
+        'Player_Count': list(platform_counts.values()),
+        'Percentage': [round(count / sum(platform_counts.values()) * 100, 1) for count in platform_counts.values()]
+    }
+
 platform_df = pd.DataFrame(platform_summary)
 
 # Export to Excel
@@ -43,10 +67,23 @@ with pd.ExcelWriter(excel_filename) as writer:
         'Risk_Assessment': ['Low - Validated with p < 0.000001']
     }
     
+    if artifact is not None:
+        groups = artifact.summary['groups']
+        significant = artifact.summary['significant_metrics']
+        recommendation_data.update({
+            'Recommendation': [artifact.summary['recommendation']],
+            'Confidence_Level': [f'{significant} of 3 metrics statistically significant'],
+            'Expected_Revenue_Increase': [f"{metrics[0]['lift_percent']:+.1f}% ARPU"],
+            'Sample_Size': [f"{sum(groups.values()):,} players ({groups['control']:,} control, "
+                            f"{groups['test']:,} test)"],
+            'Risk_Assessment': [f"ARPU p = {summary_df['P_Value'][0]}"]
+        })
+    
     recommendation_df = pd.DataFrame(recommendation_data)
     recommendation_df.to_excel(writer, sheet_name='Business_Recommendation', index=False)
 
 print(f"✅ Excel results exported to: {excel_filename}")
-print(f"📊 Summary: Premium armor discount campaign should be implemented permanently")
-print(f"💰 Expected revenue increase: 5.7% across ARPU/ARPPU")
-print(f"🎮 In-game spending increase: 7.4%") 
\ No newline at end of file
+print(f"📊 Summary: {recommendation_data['Recommendation'][0]}")
+print(f"💰 Revenue per user change: {summary_df['Improvement_Percent'][0]:+.1f}% ARPU, "
+      f"{summary_df['Improvement_Percent'][1]:+.1f}% ARPPU")
+print(f"🎮 In-game spending change: {summary_df['Improvement_Percent'][2]:+.1f}%")
\ No newline at end of file
@@ -3,17 +3,53 @@ Complete A/B Testing Analysis with Comprehensive Logging
 Gaming Company Premium Armor Campaign Analysis
 """
 
+import time
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from logger_config import setup_logging
+from logger_config import setup_logging, logged_stage
+from data_io import DATASETS, load_datasets
+from player_index import PlayerDimension
+from exclusion import ExclusionMask
+from quantile_sketch import quartiles
+from threshold_sweep import sweep_iqr_thresholds
+from sufficient_stats import CellStats
+from bootstrap import bootstrap_lift_intervals
+from segment_cube import SegmentCube
+from excel_export import StreamingExcelWriter
+from results_artifact import ARTIFACT_PREFIX, ResultsArtifact
+from player_features import PlayerFeatures
+from sharded_analysis import ShardedRun
+from pipeline import Stage, StagePipeline, module_sources
+from rank_tests import mann_whitney_by_group
 from datetime import datetime
 
 class FullABAnalysis:
-    def __init__(self, data_path="./data"):
+    def __init__(self, data_path="./data", use_cache=True, max_workers=1,
+                 aggregate_transactions=False, quantile_sketch_k=None,
+                 threshold_multiplier=3, build_cube=True):
         self.data_path = Path(data_path)
+        self.use_cache = use_cache
+        self.max_workers = max_workers
+        # Stream Money/Cash into per-player totals instead of raw transactions
+        self.aggregate_transactions = aggregate_transactions
+        # KLL sketch size for the sharded / out-of-core outlier threshold and medians;
+        # in memory the per-player totals exist anyway and quartiles are exact
+        self.quantile_sketch_k = quantile_sketch_k
+        # Cash outliers: total spending above Q3 + threshold_multiplier * IQR
+        self.threshold_multiplier = threshold_multiplier
+        # Materialize the group x platform x payer x rule x date segment cube
+        self.build_cube = build_cube
         self.logger = setup_logging("../logs")
         self.results = {}
+        self.players = None
+        self.exclusion = None
+        self.outlier_threshold = None
+        self.cube = None
+        self.artifact_path = None
+        # Per-player feature table: all players while cleaning, kept players for the metrics
+        self.all_features = None
+        self.features = None
         
     def load_and_explore_data(self):
         """Load all data and perform initial exploration"""
@@ -22,104 +58,152 @@ class FullABAnalysis:
         self.logger.info(f"Analysis started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         self.logger.info("="*80)
         
-        # Load datasets
-        datasets = {
-            "abgroup": ("ABgroup.csv", "Player group assignments"),
-            "cash": ("Cash.csv", "In-game currency spending"),
-            "cheaters": ("Cheaters.csv", "Known cheaters"),
-            "money": ("Money.csv", "Real money payments"),
-            "platforms": ("Platforms.csv", "Gaming platforms")
-        }
-        
-        data = {}
-        for name, (filename, description) in datasets.items():
-            self.logger.info(f"\nLoading {filename}...")
-            df = pd.read_csv(self.data_path / filename)
-            data[name] = df
-            self.logger.info(f"✓ {description}: {len(df):,} rows, {df.shape[1]} columns")
-        
-        self.logger.info(f"\n✅ All datasets loaded: {sum(len(df) for df in data.values()):,} total rows")
-        
-        # Fix column naming inconsistency (user_id vs player_id)
-        for name, df in data.items():
-            if 'user_id' in df.columns and name != 'abgroup':
-                df.rename(columns={'user_id': 'player_id'}, inplace=True)
-                self.logger.info(f"Renamed user_id to player_id in {name}")
-            elif 'user_id' in df.columns and name == 'abgroup':
-                df.rename(columns={'user_id': 'player_id'}, inplace=True)
+        # Load datasets (typed schema, user_id already renamed to player_id);
+        # max_workers > 1 reads the independent files concurrently
+        self.logger.info(f"\nLoading datasets (workers: {self.max_workers})...")
+        started = time.perf_counter()
+        with self.logger.stage('load') as stage:
+            data = load_datasets(self.data_path, max_workers=self.max_workers,
+                                 use_cache=self.use_cache, logger=self.logger,
+                                 aggregate_transactions=self.aggregate_transactions)
+            stage['rows'] = sum(len(df) for df in data.values())
+        
+        self.logger.info(f"\n✅ All datasets loaded: {sum(len(df) for df in data.values()):,} total rows "
+                         f"in {time.perf_counter() - started:.2f}s")
+        total_memory = sum(df.memory_usage(deep=True).sum() for df in data.values()) / 1024**2
+        self.logger.info(f"Total memory usage: {total_memory:.1f} MB")
         
         return data
     
-    def clean_and_filter_data(self, data):
-        """Clean data and remove cheaters"""
+    @logged_stage('clean')
+    def clean_and_filter_data(self, data, build_cube=None):
+        """Clean data and remove cheaters (build_cube overrides self.build_cube)"""
         self.logger.info("\n" + "="*60)
         self.logger.info("DATA CLEANING AND CHEATER REMOVAL")
         self.logger.info("="*60)
         
-        # Identify actual cheaters (where cheaters column = 1)
-        actual_cheaters = data['cheaters'][data['cheaters']['cheaters'] == 1]
-        cheater_ids = set(actual_cheaters['player_id'].unique())
+        # Player dimension with the known-cheater flag (cheaters column = 1)
+        self.players = PlayerDimension.from_tables(data['abgroup'], data['platforms'], data['cheaters'])
+        self.exclusion = ExclusionMask(self.players)
+        
+        # Totals, transaction counts and paying flag per player in one pass per table
+        with self.logger.stage('player_features', rows=self.players.n_players):
+            self.all_features = PlayerFeatures.build(self.players, data['money'], data['cash'])
         
-        self.logger.info(f"Found {len(cheater_ids):,} actual cheaters (cheaters=1)")
-        cheater_rate = len(cheater_ids) / len(data['cheaters']) * 100
+        cheater_count = int((data['cheaters']['cheaters'] == 1).sum())
+        self.logger.info(f"Found {cheater_count:,} actual cheaters (cheaters=1)")
+        cheater_rate = cheater_count / len(data['cheaters']) * 100
         self.logger.info(f"Actual cheater rate: {cheater_rate:.3f}% of total players")
         
-        # Remove cheaters from all datasets
+        # Every rule only sets bits in one per-player mask; tables are filtered once at the end
+        with self.logger.stage('cheater_removal', rows=cheater_count):
+            self.exclusion.add_rule('known_cheaters', self.players.cheater)
+        
+        # Additional outlier detection on cash spending (players left after the cheater rule)
+        cash_outliers = self._detect_cash_outliers(self.exclusion.excluded)
+        self.exclusion.add_rule('cash_outliers', cash_outliers)
+        
+        self.logger.info("\nExcluded players by rule:")
+        for rule in self.exclusion.rule_counts():
+            self.logger.info(f"  {rule['rule']}: {rule['flagged']:,} flagged, {rule['added']:,} newly excluded")
+        
+        # Segment cube over all players (kept and excluded) from the raw tables
+        if build_cube is None:
+            build_cube = self.build_cube
+        if build_cube:
+            self.build_segment_cube(data)
+        
+        # Remove excluded players from all datasets in a single pass per table
         cleaned_data = {}
-        for name, df in data.items():
-            if name == 'cheaters':
-                continue  # Don't need cheaters dataset after identification
+        with self.logger.stage('filter_tables') as stage:
+            for name, df in data.items():
+                if name == 'cheaters':
+                    continue  # Don't need cheaters dataset after identification
                 
-            if 'player_id' in df.columns:
-                before_count = len(df)
-                df_clean = df[~df['player_id'].isin(cheater_ids)].copy()
-                after_count = len(df_clean)
-                removed = before_count - after_count
-                
-                self.logger.info(f"{name}: Removed {removed:,} records ({removed/before_count:.3f}%)")
+                df_clean = self.exclusion.apply(df)
+                removed = len(df) - len(df_clean)
+                if 'player_id' in df.columns:
+                    self.logger.info(f"{name}: Removed {removed:,} records ({removed/max(len(df), 1):.3%})")
                 cleaned_data[name] = df_clean
-            else:
-                cleaned_data[name] = df.copy()
-        
-        # Additional outlier detection on cash spending
-        cash_outliers = self._detect_cash_outliers(cleaned_data['cash'])
-        
-        # Remove cash outliers
-        for name, df in cleaned_data.items():
-            if 'player_id' in df.columns:
-                before_count = len(df)
-                df_clean = df[~df['player_id'].isin(cash_outliers)].copy()
-                after_count = len(df_clean)
-                removed = before_count - after_count
-                
-                if removed > 0:
-                    self.logger.info(f"{name}: Removed {removed:,} additional outliers ({removed/before_count:.3f}%)")
-                    cleaned_data[name] = df_clean
+            stage['rows'] = sum(len(df) for df in cleaned_data.values())
         
         return cleaned_data
     
-    def _detect_cash_outliers(self, cash_data):
-        """Detect statistical outliers in cash spending"""
+    @logged_stage('segment_cube')
+    def build_segment_cube(self, data):
+        """Segment cube of the loaded tables over the current players and exclusion mask"""
+        start_time = time.time()
+        self.cube = SegmentCube.build(self.players, self.exclusion, data['money'], data['cash'],
+                                      features=self.all_features)
+        self.logger.info(f"Segment cube: {len(self.cube.players):,} player cells, "
+                         f"{len(self.cube.daily):,} daily cells in {time.time() - start_time:.2f}s")
+        return self.cube
+    
+    @logged_stage('outlier_detection')
+    def _detect_cash_outliers(self, excluded=None):
+        """
+        Detect statistical outliers in cash spending
+        
+        Returns a bool mask over the player dimension; players already
+        `excluded` are left out of the quantiles.
+        """
         self.logger.info("\nDetecting cash spending outliers...")
         
-        # Calculate total spending per player
-        player_spending = cash_data.groupby('player_id')['cash'].sum()
+        # Total spending per player (players with any cash transaction)
+        player_spending = self.all_features['cash']
+        candidates = self.all_features['cash_count'] > 0
+        if excluded is not None:
+            candidates &= ~excluded
         
         # Use IQR method for outlier detection
-        Q1 = player_spending.quantile(0.25)
-        Q3 = player_spending.quantile(0.75)
+        Q1, Q3 = quartiles(player_spending[candidates])
         IQR = Q3 - Q1
         
-        # Define outlier threshold (3 * IQR)
-        outlier_threshold = Q3 + 3 * IQR
+        # Define outlier threshold (3 * IQR by default)
+        outlier_threshold = Q3 + self.threshold_multiplier * IQR
         
-        outliers = player_spending[player_spending > outlier_threshold].index.tolist()
+        outliers = candidates & (player_spending > outlier_threshold)
+        self.outlier_threshold = float(outlier_threshold)
         
         self.logger.info(f"Cash spending outlier threshold: {outlier_threshold:,.0f}")
-        self.logger.info(f"Detected {len(outliers):,} spending outliers")
+        self.logger.info(f"Detected {int(outliers.sum()):,} spending outliers")
         
-        return set(outliers)
+        return outliers
     
+    def sweep_outlier_thresholds(self, data, multipliers):
+        """
+        Threshold sensitivity sweep for cash-outlier detection
+        
+        Takes the loaded (uncleaned) data and returns one row per IQR
+        multiplier: threshold, players excluded and ARPU/ARPPU/cash
+        means, lift and p-values. Spend is sorted once, so a long list
+        of multipliers costs about as much as a single analysis run.
+        """
+        self.logger.info("\n" + "="*60)
+        self.logger.info("OUTLIER THRESHOLD SENSITIVITY SWEEP")
+        self.logger.info("="*60)
+        
+        players = PlayerDimension.from_tables(data['abgroup'], data['platforms'], data['cheaters'])
+        players = players.subset(~players.cheater)
+        features = PlayerFeatures.build(players, data['money'], data['cash'])
+        
+        sweep = sweep_iqr_thresholds(
+            spend=features['cash'],
+            candidates=features['cash_count'] > 0,
+            group_codes=players.group_codes,
+            group_names=players.group_categories,
+            money=features['money'],
+            paying=features.paying,
+            paying_money=features['paying_money'],
+            multipliers=multipliers,
+        )
+        
+        self.logger.info(str(sweep[['multiplier', 'threshold', 'players_excluded',
+                                    'arpu_lift', 'arpu_p_value', 'arppu_lift',
+                                    'arppu_p_value', 'cash_lift', 'cash_p_value']].round(6)))
+        return sweep
+    
+    @logged_stage('analyze')
     def analyze_ab_groups(self, cleaned_data):
         """Analyze A/B test groups and calculate key metrics"""
         self.logger.info("\n" + "="*60)
@@ -133,6 +217,15 @@ class FullABAnalysis:
             percentage = count / len(cleaned_data['abgroup']) * 100
             self.logger.info(f"  {group}: {count:,} players ({percentage:.1f}%)")
         
+        # Player feature table built once; every metric reads its columns. After
+        # clean_and_filter_data it is the kept players of the exclusion mask.
+        if self.exclusion is not None:
+            self.features = self.all_features.subset(~self.exclusion.excluded)
+        else:
+            players = PlayerDimension.from_tables(cleaned_data['abgroup'], cleaned_data['platforms'])
+            self.features = PlayerFeatures.build(players, cleaned_data['money'], cleaned_data['cash'])
+        self.players = self.features.players
+        
         # Calculate ARPU (Average Revenue Per User)
         arpu_results = self._calculate_arpu(cleaned_data)
         
@@ -145,125 +238,264 @@ class FullABAnalysis:
         # Platform Analysis
         platform_results = self._analyze_by_platform(cleaned_data)
         
+        # Confidence intervals for every metric and level from the cell statistics
+        confidence_intervals = self._confidence_intervals(arpu_results, arppu_results, cash_results)
+        
+        return {
+            'group_distribution': group_dist,
+            'arpu': arpu_results,
+            'arppu': arppu_results,
+            'cash': cash_results,
+            'platform': platform_results,
+            'confidence_intervals': confidence_intervals,
+            'cleaning': self._cleaning_summary(),
+            'player_features': self.features
+        }
+    
+    def _cleaning_summary(self):
+        """Players before cleaning, per-rule exclusions, kept players and the outlier threshold"""
+        if self.exclusion is None:
+            return None
+        return {
+            'players': int(self.exclusion.players.n_players),
+            'rules': [{key: rule[key] for key in ('rule', 'flagged', 'added')}
+                      for rule in self.exclusion.rule_counts()],
+            'kept': int(np.count_nonzero(~self.exclusion.excluded)),
+            'outlier_threshold': self.outlier_threshold,
+        }
+    
+    @logged_stage('sharded_run')
+    def analyze_sharded(self, n_shards=None, max_workers=None, spill_dir=None, memory_budget=None):
+        """
+        Same results as load + clean + analyze_ab_groups, computed by hash-sharded map-reduce
+        
+        Players are split into n_shards by a hash of player_id; worker
+        processes (max_workers, default one per shard) read byte ranges of
+        the CSVs, then clean and aggregate their shards into cell sums and
+        value histograms, which are merged here as shards finish. Medians,
+        the outlier threshold and Mann-Whitney tests are exact (merged
+        histograms) unless quantile_sketch_k is set; then threshold and
+        medians come from KLL sketches and the tests stay exact. No per-player table exists in this process,
+        so bootstrap_lift is not available in this mode.
+        
+        memory_budget (bytes or e.g. '2GB') makes the run out of core:
+        shards and read sizes are chosen so that peak memory is set by the
+        budget, not by the input size; partitions live in spill_dir
+        (system temp directory by default) and are removed afterwards.
+        Out of core, sketches are used even without quantile_sketch_k
+        (sharded_analysis.BUDGET_SKETCH_K), so that no per-value data of
+        all shards is held here.
+        """
+        start_time = time.time()
+        run = ShardedRun(self.data_path, n_shards, max_workers=max_workers, spill_dir=spill_dir,
+                         threshold_multiplier=self.threshold_multiplier,
+                         sketch_k=self.quantile_sketch_k, memory_budget=memory_budget,
+                         logger=self.logger)
+        self.logger.info("\n" + "="*60)
+        self.logger.info(f"SHARDED A/B TESTING ANALYSIS ({run.n_shards} shards)")
+        self.logger.info("="*60)
+        
+        merged = run.run()
+        
+        self.logger.info(f"Found {merged['cheater_rows']:,} actual cheaters (cheaters=1)")
+        self.logger.info("\nExcluded players by rule:")
+        for rule in merged['rules']:
+            self.logger.info(f"  {rule['rule']}: {rule['flagged']:,} flagged, {rule['added']:,} newly excluded")
+        for name, removed in merged['removed_rows'].items():
+            self.logger.info(f"{name}: Removed {removed:,} records")
+        
+        group_dist = merged['kept_by_group'].sort_values(ascending=False).rename('count')
+        self.logger.info("A/B Group Distribution (after cleaning):")
+        for group, count in group_dist.items():
+            self.logger.info(f"  {group}: {count:,} players ({count / group_dist.sum() * 100:.1f}%)")
+        
+        arpu_results = self._merged_metric("ARPU", merged, 'arpu', 4)
+        arppu_results = self._merged_metric("ARPPU", merged, 'arppu', 4)
+        cash_results = self._merged_metric("Cash Spending", merged, 'cash', 2)
+        
+        platform_dist = merged['kept_by_platform'].sort_values(ascending=False).rename('count')
+        arpu_by_platform_group = merged['cells']['arpu'].summary(by=('platform', 'group')).round(4)
+        self.logger.info("\nARPU by Platform and Group:")
+        self.logger.info(str(arpu_by_platform_group))
+        
+        confidence_intervals = self._confidence_intervals(arpu_results, arppu_results, cash_results)
+        self.logger.info(f"Sharded analysis time: {time.time() - start_time:.2f} seconds")
+        
         return {
             'group_distribution': group_dist,
             'arpu': arpu_results,
             'arppu': arppu_results,
             'cash': cash_results,
-            'platform': platform_results
+            'platform': {'distribution': platform_dist,
+                         'arpu_by_platform_group': arpu_by_platform_group},
+            'confidence_intervals': confidence_intervals,
+            'cleaning': {'players': merged['players'], 'rules': merged['rules'],
+                         'kept': int(merged['kept_by_group'].sum()),
+                         'outlier_threshold': float(merged['threshold'])}
         }
     
+    def _merged_metric(self, label, merged, metric, digits):
+        """Summary and tests of one metric from merged shard statistics"""
+        self.logger.info(f"\n--- {label} Analysis ---")
+        cells = merged['cells'][metric]
+        
+        summary = cells.summary()
+        summary['median'] = merged['medians'][metric].reindex(summary.index)
+        summary = summary.round(digits)
+        self.logger.info(f"{label} by Group:")
+        self.logger.info(str(summary))
+        
+        t_stat, p_value = cells.ttest('control', 'test')
+        u_stat, u_p_value = merged['mann_whitney'][metric]
+        self.logger.info(f"\n{label} Statistical Test:")
+        self.logger.info(f"  T-statistic: {t_stat:.4f}")
+        self.logger.info(f"  P-value: {p_value:.6f}")
+        self.logger.info(f"  Significant (p<0.05): {'Yes' if p_value < 0.05 else 'No'}")
+        self.logger.info(f"  Mann-Whitney U: {u_stat:,.1f}")
+        self.logger.info(f"  Mann-Whitney P-value: {u_p_value:.6f}")
+        
+        return {
+            'summary': summary,
+            'cell_stats': cells,
+            'test_results': {'t_stat': t_stat, 'p_value': p_value,
+                             'u_stat': u_stat, 'u_p_value': u_p_value}
+        }
+    
+    @logged_stage('confidence_intervals')
+    def _confidence_intervals(self, arpu_results, arppu_results, cash_results,
+                              confidence_levels=(0.90, 0.95, 0.99)):
+        """Tidy CI table (metric x group x level) without another pass over the data"""
+        self.logger.info("\n--- Confidence Intervals ---")
+        
+        arpu_cells = arpu_results['cell_stats']
+        payers = arppu_results['cell_stats'].count
+        # Paying conversion is a 0/1 metric: sum and sum of squares are the payer counts
+        conversion_cells = CellStats(arpu_cells.count, payers, payers,
+                                     arpu_cells.group_names, arpu_cells.platform_names)
+        
+        metrics = {
+            'ARPU': arpu_cells,
+            'ARPPU': arppu_results['cell_stats'],
+            'Cash': cash_results['cell_stats'],
+            'Conversion': conversion_cells,
+        }
+        intervals = pd.concat([cells.confidence_intervals(metric, confidence_levels)
+                               for metric, cells in metrics.items()], ignore_index=True)
+        
+        for row in intervals[intervals['confidence'] == 0.95].itertuples():
+            self.logger.info(f"  {row.metric} {row.group}: {row.mean:.4f} "
+                             f"[{row.ci_lower:.4f}, {row.ci_upper:.4f}] (n={row.n:,})")
+        return intervals
+    
+    @logged_stage('arpu')
     def _calculate_arpu(self, data):
         """Calculate Average Revenue Per User"""
         self.logger.info("\n--- ARPU Analysis ---")
         
-        # Aggregate revenue per player
-        player_revenue = data['money'].groupby('player_id')['money'].sum().reset_index()
+        # Revenue per player from the feature table (non-paying players have 0)
+        revenue = self.features['money']
         
-        # Merge with A/B groups
-        arpu_data = pd.merge(data['abgroup'], player_revenue, on='player_id', how='left')
-        arpu_data['money'] = arpu_data['money'].fillna(0)
-        
-        # Calculate ARPU by group
-        arpu_by_group = arpu_data.groupby('group')['money'].agg([
-            'count', 'mean', 'std', 'median'
-        ]).round(4)
+        # Calculate ARPU by group from per-cell sufficient statistics
+        cells = CellStats.from_players(self.players, revenue)
+        arpu_by_group = self._group_summary(cells, revenue).round(4)
         
         self.logger.info("ARPU by Group:")
         self.logger.info(str(arpu_by_group))
         
-        # Statistical significance test
-        control_revenue = arpu_data[arpu_data['group'] == 'control']['money']
-        test_revenue = arpu_data[arpu_data['group'] == 'test']['money']
-        
-        from scipy import stats
-        t_stat, p_value = stats.ttest_ind(control_revenue, test_revenue)
+        # Statistical significance test (same as ttest_ind on the per-group arrays)
+        t_stat, p_value = cells.ttest('control', 'test')
         
         self.logger.info(f"\nARPU Statistical Test:")
         self.logger.info(f"  T-statistic: {t_stat:.4f}")
         self.logger.info(f"  P-value: {p_value:.6f}")
         self.logger.info(f"  Significant (p<0.05): {'Yes' if p_value < 0.05 else 'No'}")
         
+        u_stat, u_p_value = self._mann_whitney(revenue)
+        
         return {
             'summary': arpu_by_group,
-            'raw_data': arpu_data,
-            'test_results': {'t_stat': t_stat, 'p_value': p_value}
+            'cell_stats': cells,
+            'test_results': {'t_stat': t_stat, 'p_value': p_value,
+                             'u_stat': u_stat, 'u_p_value': u_p_value}
         }
     
+    @logged_stage('arppu')
     def _calculate_arppu(self, data):
         """Calculate Average Revenue Per Paying User"""
         self.logger.info("\n--- ARPPU Analysis ---")
         
-        # Get only paying users (money > 0)
-        paying_users = data['money'][data['money']['money'] > 0]
-        player_revenue = paying_users.groupby('player_id')['money'].sum().reset_index()
-        
-        # Merge with A/B groups
-        arppu_data = pd.merge(data['abgroup'], player_revenue, on='player_id', how='inner')
+        # Paying users: at least one payment with money > 0 (revenue of those payments)
+        revenue = self.features['paying_money']
+        paying = self.features.paying
         
-        # Calculate ARPPU by group
-        arppu_by_group = arppu_data.groupby('group')['money'].agg([
-            'count', 'mean', 'std', 'median'
-        ]).round(4)
+        # Calculate ARPPU by group from per-cell sufficient statistics
+        cells = CellStats.from_players(self.players, revenue, rows=paying)
+        arppu_by_group = self._group_summary(cells, revenue, rows=paying).round(4)
         
         self.logger.info("ARPPU by Group:")
         self.logger.info(str(arppu_by_group))
         
         # Statistical significance test
-        control_revenue = arppu_data[arppu_data['group'] == 'control']['money']
-        test_revenue = arppu_data[arppu_data['group'] == 'test']['money']
-        
-        from scipy import stats
-        t_stat, p_value = stats.ttest_ind(control_revenue, test_revenue)
+        t_stat, p_value = cells.ttest('control', 'test')
         
         self.logger.info(f"\nARPPU Statistical Test:")
         self.logger.info(f"  T-statistic: {t_stat:.4f}")
         self.logger.info(f"  P-value: {p_value:.6f}")
         self.logger.info(f"  Significant (p<0.05): {'Yes' if p_value < 0.05 else 'No'}")
         
+        u_stat, u_p_value = self._mann_whitney(revenue, rows=paying)
+        
         return {
             'summary': arppu_by_group,
-            'raw_data': arppu_data,
-            'test_results': {'t_stat': t_stat, 'p_value': p_value}
+            'cell_stats': cells,
+            'test_results': {'t_stat': t_stat, 'p_value': p_value,
+                             'u_stat': u_stat, 'u_p_value': u_p_value}
         }
     
+    @logged_stage('cash')
     def _calculate_cash_metrics(self, data):
         """Calculate in-game currency spending metrics"""
         self.logger.info("\n--- Cash Spending Analysis ---")
         
-        # Aggregate cash spending per player
-        player_cash = data['cash'].groupby('player_id')['cash'].sum().reset_index()
-        
-        # Merge with A/B groups
-        cash_data = pd.merge(data['abgroup'], player_cash, on='player_id', how='left')
-        cash_data['cash'] = cash_data['cash'].fillna(0)
+        # Cash spending per player from the feature table
+        cash = self.features['cash']
         
-        # Calculate cash metrics by group
-        cash_by_group = cash_data.groupby('group')['cash'].agg([
-            'count', 'mean', 'std', 'median'
-        ]).round(2)
+        # Calculate cash metrics by group from per-cell sufficient statistics
+        cells = CellStats.from_players(self.players, cash)
+        cash_by_group = self._group_summary(cells, cash).round(2)
         
         self.logger.info("Cash Spending by Group:")
         self.logger.info(str(cash_by_group))
         
         # Statistical significance test
-        control_cash = cash_data[cash_data['group'] == 'control']['cash']
-        test_cash = cash_data[cash_data['group'] == 'test']['cash']
-        
-        from scipy import stats
-        t_stat, p_value = stats.ttest_ind(control_cash, test_cash)
+        t_stat, p_value = cells.ttest('control', 'test')
         
         self.logger.info(f"\nCash Spending Statistical Test:")
         self.logger.info(f"  T-statistic: {t_stat:.4f}")
         self.logger.info(f"  P-value: {p_value:.6f}")
         self.logger.info(f"  Significant (p<0.05): {'Yes' if p_value < 0.05 else 'No'}")
         
+        u_stat, u_p_value = self._mann_whitney(cash)
+        
         return {
             'summary': cash_by_group,
-            'raw_data': cash_data,
-            'test_results': {'t_stat': t_stat, 'p_value': p_value}
+            'cell_stats': cells,
+            'test_results': {'t_stat': t_stat, 'p_value': p_value,
+                             'u_stat': u_stat, 'u_p_value': u_p_value}
         }
     
+    def _mann_whitney(self, values, rows=None):
+        """Tie-aware Mann-Whitney U (control vs test) from per-group value counts"""
+        group_codes = self.players.group_codes
+        if rows is not None:
+            group_codes = np.where(rows, group_codes, -1)
+        u_stat, p_value = mann_whitney_by_group(values, group_codes, self.players.group_categories)
+        
+        self.logger.info(f"  Mann-Whitney U: {u_stat:,.1f}")
+        self.logger.info(f"  Mann-Whitney P-value: {p_value:.6f}")
+        return u_stat, p_value
+    
+    @logged_stage('platform')
     def _analyze_by_platform(self, data):
         """Analyze metrics by platform"""
         self.logger.info("\n--- Platform Analysis ---")
@@ -275,25 +507,34 @@ class FullABAnalysis:
             percentage = count / len(data['platforms']) * 100
             self.logger.info(f"  {platform}: {count:,} players ({percentage:.1f}%)")
         
-        # ARPU by platform and group
-        player_revenue = data['money'].groupby('player_id')['money'].sum().reset_index()
-        platform_data = pd.merge(data['abgroup'], data['platforms'], on='player_id')
-        platform_data = pd.merge(platform_data, player_revenue, on='player_id', how='left')
-        platform_data['money'] = platform_data['money'].fillna(0)
-        
-        arpu_by_platform_group = platform_data.groupby(['platform', 'group'])['money'].agg([
-            'count', 'mean', 'std'
-        ]).round(4)
+        # ARPU by platform and group (players with a known platform), answered
+        # from the segment cube when it was built during cleaning
+        if self.cube is not None:
+            cells = self.cube.cell_stats('money', rule='kept')
+        else:
+            cells = CellStats.from_players(self.players, self.features['money'])
+        arpu_by_platform_group = cells.summary(by=('platform', 'group')).round(4)
         
         self.logger.info("\nARPU by Platform and Group:")
         self.logger.info(str(arpu_by_platform_group))
         
         return {
             'distribution': platform_dist,
-            'arpu_by_platform_group': arpu_by_platform_group,
-            'raw_data': platform_data
+            'arpu_by_platform_group': arpu_by_platform_group
         }
     
+    def _group_summary(self, cells, values, rows=None):
+        """count/mean/std per group from cell statistics, plus the per-group median"""
+        summary = cells.summary()
+        selected = np.ones(len(values), dtype=bool) if rows is None else rows
+        # The median is the one statistic that still needs the values themselves
+        summary['median'] = [
+            np.median(values[selected & (self.players.group_codes == cells.group_names.index(group))])
+            for group in summary.index
+        ]
+        return summary
+    
+    @logged_stage('report')
     def generate_final_report(self, results):
         """Generate final business report and recommendations"""
         self.logger.info("\n" + "="*80)
@@ -381,6 +622,119 @@ class FullABAnalysis:
             'recommendation': recommendation
         }
     
+    @logged_stage('bootstrap')
+    def bootstrap_lift(self, results, n_boot=1000, confidence=0.95, seed=0, max_workers=None):
+        """
+        Poisson bootstrap intervals (percentile and BCa) for ARPU/ARPPU/cash lift
+        
+        Uses the player feature table of analyze_ab_groups. Players are processed
+        in fixed-size chunks across a process pool (max_workers, default
+        self.max_workers); a fixed seed gives the same intervals for any
+        number of workers.
+        """
+        self.logger.info("\n" + "="*60)
+        self.logger.info(f"POISSON BOOTSTRAP LIFT INTERVALS ({n_boot} replicates)")
+        self.logger.info("="*60)
+        
+        start_time = time.time()
+        features = results['player_features']
+        metrics = {
+            'ARPU': (features['money'], None),
+            'ARPPU': (features['paying_money'], features.paying),
+            'Cash': (features['cash'], None),
+        }
+        intervals = bootstrap_lift_intervals(
+            features.players.group_codes, features.players.group_categories, metrics,
+            n_boot=n_boot, confidence=confidence, seed=seed,
+            max_workers=max_workers or self.max_workers)
+        
+        for row in intervals.itertuples():
+            self.logger.info(f"  {row.metric} lift {row.lift:.2f}% {row.method}: "
+                             f"[{row.ci_lower:.2f}%, {row.ci_upper:.2f}%]")
+        self.logger.info(f"Bootstrap time: {time.time() - start_time:.2f} seconds")
+        return intervals
+    
+    def build_pipeline(self, cache_dir=None, bootstrap=False, n_boot=1000):
+        """
+        The analysis as a stage DAG with cached outputs
+        
+        load -> clean -> analyze [-> bootstrap] -> report -> export, with
+        cube and analyze also reading load (clean caches only per-player
+        state, not the filtered tables). Outputs are stored in cache_dir (default
+        data_path/.cache/stages) under a hash of the CSV contents, the
+        stage parameters and the source of the stage code, so e.g. a new
+        report wording reruns only report and export, and a new
+        threshold_multiplier reruns clean and everything after it.
+        """
+        cache_dir = Path(cache_dir) if cache_dir else self.data_path / '.cache' / 'stages'
+        sources = [self.data_path / filename for filename, _ in DATASETS.values()]
+        results_stage = 'bootstrap' if bootstrap else 'analyze'
+        
+        stages = [
+            # Parsed tables are already cached as Parquet by load_datasets
+            Stage('load', self.load_and_explore_data, sources=sources, cache=False,
+                  params={'aggregate_transactions': self.aggregate_transactions},
+                  code=(FullABAnalysis.load_and_explore_data, *module_sources(load_datasets))),
+            Stage('clean', self._clean_stage, inputs=('load',),
+                  params={'threshold_multiplier': self.threshold_multiplier},
+                  code=(FullABAnalysis.clean_and_filter_data, FullABAnalysis._detect_cash_outliers,
+                        FullABAnalysis._clean_stage,
+                        *module_sources(PlayerDimension, PlayerFeatures, ExclusionMask, quartiles))),
+            Stage('cube', self._cube_stage, inputs=('load', 'clean'), params={'build_cube': self.build_cube},
+                  code=(FullABAnalysis.build_segment_cube, FullABAnalysis._cube_stage,
+                        *module_sources(SegmentCube))),
+            Stage('analyze', self._analyze_stage, inputs=('load', 'clean'),
+                  code=(FullABAnalysis.analyze_ab_groups, FullABAnalysis._analyze_stage,
+                        FullABAnalysis._calculate_arpu, FullABAnalysis._calculate_arppu,
+                        FullABAnalysis._calculate_cash_metrics, FullABAnalysis._analyze_by_platform,
+                        FullABAnalysis._group_summary, FullABAnalysis._mann_whitney,
+                        FullABAnalysis._confidence_intervals,
+                        *module_sources(CellStats, PlayerDimension, mann_whitney_by_group))),
+            Stage('report', self.generate_final_report, inputs=(results_stage,),
+                  code=(FullABAnalysis.generate_final_report,)),
+            Stage('export', self._export_stage, inputs=(results_stage, 'report', 'cube'), cache=False),
+        ]
+        if bootstrap:
+            stages.append(Stage('bootstrap', self._bootstrap_stage(n_boot), inputs=('analyze',),
+                                params={'n_boot': n_boot},
+                                code=(FullABAnalysis.bootstrap_lift, *module_sources(bootstrap_lift_intervals))))
+        return StagePipeline(stages, cache_dir, logger=self.logger)
+    
+    def _clean_stage(self, data):
+        # Only the per-player state is cached; the filtered tables are rebuilt
+        # from the loaded data and the exclusion mask when needed
+        self.clean_and_filter_data(data, build_cube=False)
+        return {'players': self.players, 'exclusion': self.exclusion,
+                'all_features': self.all_features, 'outlier_threshold': self.outlier_threshold}
+    
+    def _restore_clean_state(self, clean):
+        self.players = clean['players']
+        self.exclusion = clean['exclusion']
+        self.all_features = clean['all_features']
+        self.outlier_threshold = clean['outlier_threshold']
+    
+    def _cube_stage(self, data, clean):
+        if not self.build_cube:
+            return None
+        self._restore_clean_state(clean)
+        return self.build_segment_cube(data)
+    
+    def _analyze_stage(self, data, clean):
+        self._restore_clean_state(clean)
+        # Metrics read the feature table; only the group and platform tables are used directly
+        kept = {name: self.exclusion.apply(data[name]) for name in ('abgroup', 'platforms')}
+        return self.analyze_ab_groups(kept)
+    
+    def _bootstrap_stage(self, n_boot):
+        def run(results):
+            return dict(results, bootstrap=self.bootstrap_lift(results, n_boot=n_boot))
+        return run
+    
+    def _export_stage(self, results, final_report, cube):
+        self.cube = cube
+        return self.export_results(dict(results, final_report=final_report))
+    
+    @logged_stage('export')
     def export_results(self, results):
         """Export results to Excel and log files"""
         self.logger.info("\n" + "="*60)
@@ -391,21 +745,46 @@ class FullABAnalysis:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         excel_filename = f"../reports/ab_test_results_{timestamp}.xlsx"
         
-        with pd.ExcelWriter(excel_filename) as writer:
+        with StreamingExcelWriter(excel_filename) as writer:
             # ARPU results
-            results['arpu']['summary'].to_excel(writer, sheet_name='ARPU_Summary')
+            writer.write(results['arpu']['summary'], 'ARPU_Summary', index=True)
             
             # ARPPU results
-            results['arppu']['summary'].to_excel(writer, sheet_name='ARPPU_Summary')
+            writer.write(results['arppu']['summary'], 'ARPPU_Summary', index=True)
             
             # Cash results
-            results['cash']['summary'].to_excel(writer, sheet_name='Cash_Summary')
+            writer.write(results['cash']['summary'], 'Cash_Summary', index=True)
             
             # Platform analysis
-            results['platform']['arpu_by_platform_group'].to_excel(writer, sheet_name='Platform_Analysis')
+            writer.write(results['platform']['arpu_by_platform_group'], 'Platform_Analysis', index=True)
+            
+            # Confidence intervals (all metrics and levels)
+            if 'confidence_intervals' in results:
+                writer.write(results['confidence_intervals'], 'Confidence_Intervals')
+            
+            # Bootstrap lift intervals (bootstrap mode only)
+            if 'bootstrap' in results:
+                writer.write(results['bootstrap'], 'Bootstrap_Lift')
         
         self.logger.info(f"✅ Excel results exported to: {excel_filename}")
         
+        # Segment cube next to the Excel file, for reports and notebooks
+        if self.cube is not None:
+            cube_path = self.cube.save(f"../reports/segment_cube_{timestamp}")
+            results['segment_cube_path'] = str(cube_path)
+            self.logger.info(f"✅ Segment cube saved to: {cube_path}")
+        
+        # Versioned results artifact: the report builders read it instead of the raw data
+        artifact = ResultsArtifact.from_results(results, cube=self.cube, params={
+            'data_path': str(self.data_path),
+            'threshold_multiplier': self.threshold_multiplier,
+            'quantile_sketch_k': self.quantile_sketch_k,
+            'aggregate_transactions': self.aggregate_transactions,
+        })
+        self.artifact_path = artifact.save(f"../reports/{ARTIFACT_PREFIX}{timestamp}")
+        results['artifact_path'] = str(self.artifact_path)
+        self.logger.info(f"✅ Results artifact saved to: {self.artifact_path}")
+        
         # Save to structured results file
         self.logger.save_results_to_file(results)
         
@@ -415,31 +794,66 @@ class FullABAnalysis:
         
         return excel_filename
 
-def run_complete_analysis():
-    """Run the complete A/B testing analysis"""
-    analyzer = FullABAnalysis()
-    
-    # Load and explore data
-    data = analyzer.load_and_explore_data()
-    
-    # Clean data
-    cleaned_data = analyzer.clean_and_filter_data(data)
+def run_complete_analysis(max_workers=1, aggregate_transactions=False, bootstrap=False, n_boot=1000,
+                          shards=None, memory_budget=None, spill_dir=None, stage_cache=True,
+                          threshold_multiplier=3):
+    """
+    Run the complete A/B testing analysis
     
-    # Run A/B analysis
-    results = analyzer.analyze_ab_groups(cleaned_data)
+    bootstrap=True adds bootstrap lift intervals; shards=N runs load, clean
+    and analysis as hash-sharded map-reduce over N worker processes;
+    memory_budget (e.g. '4GB') runs the sharded pipeline out of core with
+    partitions spilled to spill_dir. Otherwise the stages are cached
+    (see FullABAnalysis.build_pipeline) unless stage_cache=False.
+    """
+    analyzer = FullABAnalysis(max_workers=max_workers,
+                              aggregate_transactions=aggregate_transactions,
+                              threshold_multiplier=threshold_multiplier)
     
-    # Generate final report
-    final_report = analyzer.generate_final_report(results)
-    results['final_report'] = final_report
-    
-    # Export results
-    excel_file = analyzer.export_results(results)
+    if stage_cache and not (shards or memory_budget):
+        pipeline = analyzer.build_pipeline(bootstrap=bootstrap, n_boot=n_boot)
+        excel_file = pipeline.run()['export']
+        results = dict(pipeline.value('bootstrap' if bootstrap else 'analyze'))
+        results['final_report'] = pipeline.value('report')
+        results['artifact_path'] = str(analyzer.artifact_path)
+    else:
+        if shards or memory_budget:
+            # Load, clean and analyze shard by shard in worker processes
+            # (one per shard; under a memory budget max_workers share the budget)
+            workers = max_workers if memory_budget else None
+            results = analyzer.analyze_sharded(shards, max_workers=workers, spill_dir=spill_dir,
+                                               memory_budget=memory_budget)
+        else:
+            # Load and explore data
+            data = analyzer.load_and_explore_data()
+            
+            # Clean data
+            cleaned_data = analyzer.clean_and_filter_data(data)
+            
+            # Run A/B analysis
+            results = analyzer.analyze_ab_groups(cleaned_data)
+        
+        if bootstrap and 'player_features' in results:
+            results['bootstrap'] = analyzer.bootstrap_lift(results, n_boot=n_boot)
+        elif bootstrap:
+            analyzer.logger.warning("Bootstrap needs the per-player table and is skipped in sharded mode")
+        
+        # Generate final report
+        results['final_report'] = analyzer.generate_final_report(results)
+        
+        # Export results
+        excel_file = analyzer.export_results(results)
     
     analyzer.logger.info("\n" + "="*80)
     analyzer.logger.info("ANALYSIS COMPLETE!")
-    analyzer.logger.info(f"Final recommendation: {final_report['recommendation']}")
+    analyzer.logger.info(f"Final recommendation: {results['final_report']['recommendation']}")
     analyzer.logger.info("="*80)
     
+    # Where the time and memory went, per stage
+    analyzer.logger.log_stage_summary()
+    metrics_files = analyzer.logger.save_stage_metrics()
+    analyzer.logger.info(f"📄 Stage metrics saved to: {metrics_files['json']} (and .csv)")
+    
     return results, excel_file
 
 if __name__ == "__main__":
@@ -0,0 +1,272 @@
+"""
+Synthetic Experiment Data Generator
+Writes ABgroup / Cash / Money / Platforms / Cheaters in the schemas the
+loaders expect, at any scale: players are generated in vectorized chunks
+and streamed to CSV (and Parquet with pyarrow), so memory stays flat
+"""
+
+import argparse
+import json
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from columnar_cache import PARQUET_AVAILABLE
+from data_io import DATASETS
+
+if PARQUET_AVAILABLE:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+GROUPS = ('control', 'test')
+PLATFORMS = ('PC', 'PS4', 'XBox')
+
+# Raw column order per table, as in the original exports
+COLUMNS = {
+    'abgroup': ['user_id', 'group'],
+    'cash': ['user_id', 'date', 'cash'],
+    'cheaters': ['user_id', 'cheaters'],
+    'money': ['user_id', 'date', 'money'],
+    'platforms': ['user_id', 'platform'],
+}
+
+DEFAULTS = {
+    'n_players': 1_000_000,
+    'test_share': 0.5,
+    'platform_weights': (1 / 3, 1 / 3, 1 / 3),
+    'payer_rate': 0.6,
+    'money_mu': 1.0,             # log-normal payment amount (log-scale mean / sigma)
+    'money_sigma': 1.0,
+    'cash_mu': 7.5,              # log-normal in-game currency spending
+    'cash_sigma': 0.9,
+    'lift': 0.05,                # treatment effect on payment amounts
+    'payer_lift': 0.0,           # treatment effect on the payer rate
+    'cash_lift': 0.0,            # treatment effect on cash spending
+    'cheater_rate': 0.0005,      # flagged in Cheaters.csv
+    'hidden_cheater_rate': 0.0005,  # same spending pattern, not flagged
+    'cheater_cash_multiplier': 20.0,
+    'transactions_per_player': 1.0,  # Money/Cash rows per player (fraction -> extra row with that probability)
+    'start_date': '2021-07-01',
+    'end_date': '2021-07-31',
+    'date_format': '%Y-%m-%d',
+    'seed': 0,
+}
+
+
+def _rows_per_player(rng, n_players, rate):
+    """floor(rate) rows for every player plus one more with probability frac(rate)"""
+    whole = int(np.floor(rate))
+    return whole + (rng.random(n_players) < rate - whole).astype('int64')
+
+
+def generate_chunk(rng, first_id, n_players, params):
+    """
+    One chunk of players as {table: DataFrame of raw columns}
+
+    Dates are returned as day offsets (`day` column) and formatted by the
+    writer; group/platform as codes into GROUPS/PLATFORMS.
+    """
+    ids = np.arange(first_id, first_id + n_players, dtype='int64')
+    group = (rng.random(n_players) < params['test_share']).astype('int8')
+    weights = np.asarray(params['platform_weights'], dtype='float64')
+    platform = rng.choice(len(PLATFORMS), size=n_players, p=weights / weights.sum()).astype('int8')
+
+    cheater = rng.random(n_players) < params['cheater_rate']
+    hidden_cheater = ~cheater & (rng.random(n_players) < params['hidden_cheater_rate'])
+    test = group == 1
+    payer = rng.random(n_players) < params['payer_rate'] * np.where(test, 1 + params['payer_lift'], 1.0)
+
+    n_days = (date.fromisoformat(params['end_date']) - date.fromisoformat(params['start_date'])).days + 1
+    tables = {
+        'abgroup': pd.DataFrame({'user_id': ids, 'group': group}),
+        'platforms': pd.DataFrame({'user_id': ids, 'platform': platform}),
+        'cheaters': pd.DataFrame({'user_id': ids, 'cheaters': cheater.astype('int8')}),
+    }
+
+    # Money: heavy-tailed positive amounts for payers, 0.0 rows for everyone else
+    rows = np.repeat(np.arange(n_players), _rows_per_player(rng, n_players, params['transactions_per_player']))
+    amount = rng.lognormal(params['money_mu'], params['money_sigma'], len(rows))
+    amount *= np.where(test[rows], 1 + params['lift'], 1.0)
+    tables['money'] = pd.DataFrame({
+        'user_id': ids[rows],
+        'day': rng.integers(0, n_days, len(rows)).astype('int32'),
+        'money': np.where(payer[rows], np.round(amount, 2), 0.0),
+    })
+
+    # Cash: every row spends; cheaters (flagged or not) spend far more
+    rows = np.repeat(np.arange(n_players), _rows_per_player(rng, n_players, params['transactions_per_player']))
+    spend = rng.lognormal(params['cash_mu'], params['cash_sigma'], len(rows))
+    spend *= np.where(test[rows], 1 + params['cash_lift'], 1.0)
+    spend *= np.where((cheater | hidden_cheater)[rows], params['cheater_cash_multiplier'], 1.0)
+    tables['cash'] = pd.DataFrame({
+        'user_id': ids[rows],
+        'day': rng.integers(0, n_days, len(rows)).astype('int32'),
+        'cash': spend.astype('int64'),
+    })
+    return tables
+
+
+class _ArrowWriters:
+    """Streams chunks to <table>.csv (unquoted, like the exports) and parquet/<table>.parquet"""
+
+    def __init__(self, out_dir, params, columnar=True):
+        self.out_dir = Path(out_dir)
+        self.columnar = columnar
+        start = date.fromisoformat(params['start_date'])
+        n_days = (date.fromisoformat(params['end_date']) - start).days + 1
+        days = [start + timedelta(days=offset) for offset in range(n_days)]
+        self.date_strings = pa.array([day.strftime(params['date_format']) for day in days])
+        self.date_values = pa.array(pd.DatetimeIndex(days).as_unit('s'))
+        self.labels = {'group': pa.array(GROUPS), 'platform': pa.array(PLATFORMS)}
+        self.csv_files = {}
+        self.csv_writers = {}
+        self.parquet_writers = {}
+
+    def _tables(self, name, df):
+        csv_columns, parquet_columns = {}, {}
+        for column in COLUMNS[name]:
+            if column == 'date':
+                days = pa.array(df['day'].to_numpy())
+                csv_columns[column] = pc.take(self.date_strings, days)
+                parquet_columns[column] = pc.take(self.date_values, days)
+            elif column in self.labels:
+                codes = pa.array(df[column].to_numpy())
+                csv_columns[column] = pc.take(self.labels[column], codes)
+                parquet_columns[column] = pa.DictionaryArray.from_arrays(codes, self.labels[column])
+            else:
+                values = pa.array(df[column].to_numpy())
+                csv_columns[column] = parquet_columns[column] = values
+        return pa.table(csv_columns), pa.table(parquet_columns)
+
+    def write(self, name, df):
+        csv_table, parquet_table = self._tables(name, df)
+        if name not in self.csv_writers:
+            # Unquoted header line like the exports (pyarrow always quotes its own header)
+            self.csv_files[name] = open(self.out_dir / DATASETS[name][0], 'wb')
+            self.csv_files[name].write((','.join(COLUMNS[name]) + '\n').encode('utf-8'))
+            self.csv_writers[name] = pa_csv.CSVWriter(
+                self.csv_files[name], csv_table.schema,
+                write_options=pa_csv.WriteOptions(include_header=False, quoting_style='none'))
+            if self.columnar:
+                parquet_path = self.out_dir / 'parquet' / DATASETS[name][0].replace('.csv', '.parquet')
+                parquet_path.parent.mkdir(parents=True, exist_ok=True)
+                self.parquet_writers[name] = pq.ParquetWriter(parquet_path, parquet_table.schema)
+        self.csv_writers[name].write_table(csv_table)
+        if self.columnar:
+            self.parquet_writers[name].write_table(parquet_table)
+
+    def close(self):
+        for writer in list(self.csv_writers.values()) + list(self.parquet_writers.values()):
+            writer.close()
+        for f in self.csv_files.values():
+            f.close()
+
+
+class _PandasWriters:
+    """CSV-only fallback without pyarrow"""
+
+    def __init__(self, out_dir, params):
+        self.out_dir = Path(out_dir)
+        start = pd.Timestamp(params['start_date'])
+        n_days = (pd.Timestamp(params['end_date']) - start).days + 1
+        self.date_strings = (start + pd.to_timedelta(np.arange(n_days), unit='D')).strftime(params['date_format'])
+        self.labels = {'group': np.asarray(GROUPS), 'platform': np.asarray(PLATFORMS)}
+        self.started = set()
+
+    def write(self, name, df):
+        df = df.copy()
+        if 'day' in df.columns:
+            df['date'] = self.date_strings[df.pop('day').to_numpy()]
+        for column, labels in self.labels.items():
+            if column in df.columns:
+                df[column] = labels[df[column].to_numpy()]
+        header = name not in self.started
+        df[COLUMNS[name]].to_csv(self.out_dir / DATASETS[name][0], mode='w' if header else 'a',
+                                 header=header, index=False)
+        self.started.add(name)
+
+    def close(self):
+        pass
+
+
+def generate_experiment_data(out_dir, n_players=None, chunk_size=1_000_000, columnar=True, **overrides):
+    """
+    Write a synthetic experiment of n_players into out_dir
+
+    Every table has one row per player except Money/Cash
+    (transactions_per_player rows each). Parameters default to DEFAULTS;
+    see there for the distributions, treatment lift and cheater settings.
+    With pyarrow, Parquet copies go to out_dir/parquet (columnar=True).
+    Chunks use seeds derived from `seed`, so the output depends only on
+    the parameters and chunk_size. Returns the manifest written to
+    out_dir/synthetic_data.json.
+    """
+    unknown = set(overrides) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown generator parameters: {', '.join(sorted(unknown))}")
+    params = dict(DEFAULTS, **overrides)
+    if n_players is not None:
+        params['n_players'] = int(n_players)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    writers = (_ArrowWriters(out_dir, params, columnar) if PARQUET_AVAILABLE
+               else _PandasWriters(out_dir, params))
+
+    started = time.perf_counter()
+    rows = dict.fromkeys(COLUMNS, 0)
+    seeds = np.random.SeedSequence(params['seed'])
+    n_chunks = -(-params['n_players'] // chunk_size)
+    try:
+        for chunk, seed in enumerate(seeds.spawn(n_chunks)):
+            first_id = 1 + chunk * chunk_size
+            size = min(chunk_size, params['n_players'] - chunk * chunk_size)
+            for name, df in generate_chunk(np.random.default_rng(seed), first_id, size, params).items():
+                writers.write(name, df)
+                rows[name] += len(df)
+            print(f"  chunk {chunk + 1}/{n_chunks}: {first_id + size - 1:,} players "
+                  f"({time.perf_counter() - started:.1f}s)")
+    finally:
+        writers.close()
+
+    manifest = {
+        'params': params,
+        'chunk_size': chunk_size,
+        'rows': rows,
+        'files': {name: DATASETS[name][0] for name in COLUMNS},
+        'columnar': bool(columnar and PARQUET_AVAILABLE),
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+    with open(out_dir / 'synthetic_data.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic A/B experiment data")
+    parser.add_argument('--out', default='../data', help="output directory (default ../data)")
+    parser.add_argument('--players', type=int, default=DEFAULTS['n_players'])
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument('--no-parquet', action='store_true', help="CSV only")
+    for name, default in DEFAULTS.items():
+        if name in ('n_players', 'platform_weights'):
+            continue
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = vars(parser.parse_args())
+
+    out_dir, n_players = args.pop('out'), args.pop('players')
+    chunk_size, columnar = args.pop('chunk_size'), not args.pop('no_parquet')
+    print(f"Generating {n_players:,} players into {out_dir}...")
+    manifest = generate_experiment_data(out_dir, n_players, chunk_size=chunk_size, columnar=columnar, **args)
+    for name, count in manifest['rows'].items():
+        print(f"  {DATASETS[name][0]}: {count:,} rows")
+    print(f"✓ Done in {manifest['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
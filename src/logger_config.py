@@ -3,11 +3,70 @@ Logging Configuration for A/B Testing Analysis
 Captures all console output and analysis results to log files
 """
 
+import csv
+import functools
+import json
 import logging
 import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+STAGE_METRIC_FIELDS = ['stage', 'depth', 'started', 'wall_seconds', 'cpu_seconds',
+                       'peak_rss_mb', 'traced_peak_mb', 'rows']
+
+
+def _children_cpu_seconds():
+    """CPU time of finished child processes (process pools)"""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process since the last _reset_peaks (Linux), else lifetime peak"""
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _traced_peak_mb():
+    """tracemalloc peak (only while tracing, e.g. python -X tracemalloc)"""
+    if not tracemalloc.is_tracing():
+        return None
+    return tracemalloc.get_traced_memory()[1] / 1024**2
+
+
+def _reset_peaks():
+    """Restart the RSS high-water mark (Linux >= 4.0) and the tracemalloc peak"""
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write('5')
+    except OSError:
+        pass
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+
+def _max(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
 class DualLogger:
     """Logger that writes to both console and file"""
     
@@ -60,6 +119,10 @@ class DualLogger:
         # Store current timestamp for file naming
         self.timestamp = timestamp
         
+        # Per-stage timing / memory records (see stage())
+        self.stage_metrics = []
+        self._active_stages = []
+        
     def info(self, message):
         """Log info message"""
         self.logger.info(message)
@@ -132,14 +195,91 @@ class DualLogger:
         
         self.info(f"Results saved to: {results_file}")
         
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Record wall time, CPU time, peak RSS, tracemalloc peak and rows of a block
+        
+        Yields the record; set record['rows'] inside the block when the row
+        count is only known there. CPU time includes finished child
+        processes; peaks of nested stages also count for their parents.
+        """
+        current = (_peak_rss_mb(), _traced_peak_mb())
+        for active in self._active_stages:
+            active['peak_rss_mb'] = _max(active['peak_rss_mb'], current[0])
+            active['traced_peak_mb'] = _max(active['traced_peak_mb'], current[1])
+        _reset_peaks()
+        
+        record = {'stage': name, 'depth': len(self._active_stages),
+                  'started': datetime.now().isoformat(timespec='seconds'),
+                  'wall_seconds': None, 'cpu_seconds': None,
+                  'peak_rss_mb': None, 'traced_peak_mb': None, 'rows': rows}
+        self.stage_metrics.append(record)
+        self._active_stages.append(record)
+        wall, cpu, children = time.perf_counter(), time.process_time(), _children_cpu_seconds()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - wall, 4)
+            record['cpu_seconds'] = round(time.process_time() - cpu + _children_cpu_seconds() - children, 4)
+            record['peak_rss_mb'] = _max(record['peak_rss_mb'], _peak_rss_mb())
+            record['traced_peak_mb'] = _max(record['traced_peak_mb'], _traced_peak_mb())
+            self._active_stages.pop()
+            for active in self._active_stages:
+                active['peak_rss_mb'] = _max(active['peak_rss_mb'], record['peak_rss_mb'])
+                active['traced_peak_mb'] = _max(active['traced_peak_mb'], record['traced_peak_mb'])
+            self.debug(f"Stage {name}: {record['wall_seconds']:.3f}s wall, {record['cpu_seconds']:.3f}s CPU, "
+                       f"peak RSS {record['peak_rss_mb']} MB, rows {record['rows']}")
+    
+    def save_stage_metrics(self):
+        """Write the stage records as stage_metrics_<timestamp>.json and .csv next to the logs"""
+        paths = {'json': self.log_dir / f"stage_metrics_{self.timestamp}.json",
+                 'csv': self.log_dir / f"stage_metrics_{self.timestamp}.csv"}
+        with open(paths['json'], 'w', encoding='utf-8') as f:
+            json.dump(self.stage_metrics, f, indent=2)
+        with open(paths['csv'], 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=STAGE_METRIC_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.stage_metrics)
+        return paths
+    
+    def log_stage_summary(self):
+        """Log the stage records as a table (nested stages indented)"""
+        if not self.stage_metrics:
+            return
+        header = f"{'Stage':<28}{'Wall s':>10}{'CPU s':>10}{'Peak RSS MB':>13}{'Traced MB':>11}{'Rows':>14}"
+        self.info("\n" + "="*len(header))
+        self.info("STAGE TIMING AND MEMORY")
+        self.info("="*len(header))
+        self.info(header)
+        for record in self.stage_metrics:
+            name = '  ' * record['depth'] + record['stage']
+            peak = '' if record['peak_rss_mb'] is None else f"{record['peak_rss_mb']:,.1f}"
+            traced = '' if record['traced_peak_mb'] is None else f"{record['traced_peak_mb']:,.1f}"
+            rows = '' if record['rows'] is None else f"{record['rows']:,}"
+            self.info(f"{name:<28}{record['wall_seconds'] or 0:>10.3f}{record['cpu_seconds'] or 0:>10.3f}"
+                      f"{peak:>13}{traced:>11}{rows:>14}")
+        
     def get_log_files(self):
         """Return paths to current log files"""
         return {
             'detailed_log': self.log_dir / f"analysis_detailed_{self.timestamp}.log",
             'console_log': self.log_dir / f"console_output_{self.timestamp}.log",
+            'stage_metrics': self.log_dir / f"stage_metrics_{self.timestamp}.json",
             'log_directory': self.log_dir
         }
 
+
+def logged_stage(name):
+    """Decorator: run a method inside self.logger.stage(name)"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.logger.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
 # Global logger instance
 logger = None
 
@@ -0,0 +1,202 @@
+"""
+Stage DAG with content-addressed result caching
+Every stage output is stored under a hash of its parameters, its code
+and the keys of its inputs (content hashes for source files), so a rerun
+only recomputes the stages downstream of what actually changed
+"""
+
+import ast
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+import time
+from pathlib import Path
+
+from columnar_cache import file_content_hash
+
+# Bump to invalidate every cached stage (e.g. when the key layout changes)
+PIPELINE_VERSION = 1
+
+# Cached outputs kept per stage (e.g. results for a few threshold settings)
+KEEP_OUTPUTS = 3
+
+
+def code_fingerprint(functions):
+    """Hash of the source code of the given functions/methods/classes"""
+    digest = hashlib.blake2b(digest_size=16)
+    for function in functions:
+        function = getattr(function, '__func__', function)
+        try:
+            source = inspect.getsource(function)
+        except (OSError, TypeError):
+            source = getattr(function, '__qualname__', repr(function))
+        digest.update(source.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def module_sources(*objects):
+    """
+    Modules defining the given functions/classes/modules plus every project
+    module they import, transitively, sorted by name (for Stage code=...)
+
+    Hashing whole modules catches changes in module-level helpers a stage
+    calls indirectly; third-party modules are left out.
+    """
+    project_dir = Path(__file__).resolve().parent
+
+    def imported_names(module):
+        for node in ast.walk(ast.parse(inspect.getsource(module))):
+            if isinstance(node, ast.Import):
+                yield from (alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                yield node.module
+
+    found = {}
+    pending = [value.__name__ if inspect.ismodule(value) else value.__module__ for value in objects]
+    while pending:
+        module = sys.modules.get(pending.pop())
+        path = getattr(module, '__file__', None)
+        if module is None or module.__name__ in found or path is None \
+                or Path(path).resolve().parent != project_dir:
+            continue
+        found[module.__name__] = module
+        pending.extend(imported_names(module))
+    return [found[name] for name in sorted(found)]
+
+
+class Stage:
+    """
+    One node of the pipeline
+
+    function(*input_values) computes the output from the outputs of the
+    `inputs` stages. params (JSON-serializable), the source of `code`
+    (the functions the stage depends on) and the content of `sources`
+    (files) enter the cache key. cache=False stages always run (e.g.
+    exports with side effects) but still have a key for their dependents.
+    """
+
+    def __init__(self, name, function, inputs=(), params=None, code=(), sources=(), cache=True):
+        self.name = name
+        self.function = function
+        self.inputs = tuple(inputs)
+        self.params = params or {}
+        self.code = tuple(code) or (function,)
+        self.sources = tuple(Path(source) for source in sources)
+        self.cache = cache
+
+
+class StagePipeline:
+    """
+    Runs stages lazily: a stage is loaded from cache_dir when its key is
+    cached, otherwise computed from its inputs (which are loaded or computed
+    only then). `timings` records per stage whether it ran or hit the cache.
+    """
+
+    def __init__(self, stages, cache_dir, logger=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_dir = Path(cache_dir)
+        self.logger = logger
+        self.values = {}
+        self.keys = {}
+        self.timings = []
+        self._source_hashes = self._read_source_hashes()
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
+        else:
+            print(message)
+
+    def _read_source_hashes(self):
+        try:
+            with open(self.cache_dir / 'sources.json', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _source_hash(self, path):
+        """Content hash of a source file, re-hashed only when size or mtime change"""
+        stat = path.stat()
+        known = self._source_hashes.get(str(path))
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['hash']
+        content_hash = file_content_hash(path)
+        self._source_hashes[str(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                          'hash': content_hash}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_dir / 'sources.json', 'w', encoding='utf-8') as f:
+            json.dump(self._source_hashes, f, indent=2)
+        return content_hash
+
+    def key(self, name):
+        """Cache key of a stage (recursively over its inputs)"""
+        if name not in self.keys:
+            stage = self.stages[name]
+            description = {
+                'version': PIPELINE_VERSION,
+                'stage': name,
+                'params': stage.params,
+                'code': code_fingerprint(stage.code),
+                'inputs': {input_name: self.key(input_name) for input_name in stage.inputs},
+                'sources': {source.name: self._source_hash(source) for source in stage.sources},
+            }
+            encoded = json.dumps(description, sort_keys=True, default=str).encode('utf-8')
+            self.keys[name] = hashlib.blake2b(encoded, digest_size=16).hexdigest()
+        return self.keys[name]
+
+    def _path(self, name):
+        return self.cache_dir / name / f'{self.key(name)}.pkl'
+
+    def is_cached(self, name):
+        return self.stages[name].cache and self._path(name).exists()
+
+    def value(self, name):
+        """Output of a stage: memoized, from cache, or computed"""
+        if name in self.values:
+            return self.values[name]
+
+        stage = self.stages[name]
+        path = self._path(name)
+        started = time.perf_counter()
+        if stage.cache and path.exists():
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # most recently used outputs are the ones kept
+            status = 'cached'
+        else:
+            inputs = [self.value(input_name) for input_name in stage.inputs]
+            started = time.perf_counter()
+            value = stage.function(*inputs)
+            status = 'ran'
+            if stage.cache:
+                self._store(path, value)
+        elapsed = time.perf_counter() - started
+
+        self.timings.append({'stage': name, 'status': status, 'seconds': elapsed, 'key': self.key(name)})
+        self._log(f"Stage {name}: {status} in {elapsed:.2f}s (key {self.key(name)[:12]})")
+        self.values[name] = value
+        return value
+
+    def _store(self, path, value):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.pkl.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        # Keep only the most recent outputs of this stage
+        outputs = sorted(path.parent.glob('*.pkl'), key=lambda output: output.stat().st_mtime, reverse=True)
+        for stale in outputs[KEEP_OUTPUTS:]:
+            stale.unlink()
+
+    def run(self, targets=None):
+        """
+        Compute (or load) the targets, by default the final stages (those no
+        other stage depends on); returns {name: value}
+        """
+        if targets is None:
+            needed = {input_name for stage in self.stages.values() for input_name in stage.inputs}
+            targets = [name for name in self.stages if name not in needed]
+        return {name: self.value(name) for name in targets}
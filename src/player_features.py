@@ -0,0 +1,123 @@
+"""
+Per-Player Feature Table for A/B Testing Analysis
+Money/Cash transactions are folded onto the player dimension once
+(totals, transaction counts, paying flag, first/last purchase date) and
+every metric reads its column from this one table
+"""
+
+import numpy as np
+
+from data_io import TRANSACTION_TABLES
+
+
+class PlayerFeatures:
+    """
+    Columnar per-player features aligned with a PlayerDimension
+
+    Columns (numpy arrays, index i = players.player_ids[i]):
+      money, money_count            - total payments and number of payments
+      paying_money, paying_count    - the same over positive payments only
+      first_purchase, last_purchase - dates of the first/last positive payment (NaT if none);
+                                      only when the money table has dates
+      cash, cash_count              - total in-game currency spending and transactions
+
+    Tables may be raw transactions or per-player totals from
+    read_player_totals (<value>_count / first_date / last_date columns);
+    with totals the payment columns describe the player's total.
+    """
+
+    def __init__(self, players, columns=None):
+        self.players = players
+        self.columns = dict(columns or {})
+
+    @classmethod
+    def build(cls, players, money=None, cash=None):
+        """Features of the given tables, one pass over each"""
+        features = cls(players)
+        for table, df in (('money', money), ('cash', cash)):
+            if df is not None:
+                features.add_transactions(table, df)
+        return features
+
+    def add_transactions(self, table, df):
+        """(Re)compute the columns of one transaction table ('money' or 'cash')"""
+        value_column = next(c for c in TRANSACTION_TABLES[table] if c in df.columns)
+        n_players = self.players.n_players
+
+        # One id -> index mapping per table; every column is a bincount over it
+        index = self.players.lookup(df['player_id'].to_numpy())
+        found = index >= 0
+        index = index[found]
+        values = df[value_column].to_numpy(dtype='float64')[found]
+        count_column = f'{value_column}_count'
+        counts = (df[count_column].to_numpy(dtype='float64')[found] if count_column in df.columns
+                  else None)
+
+        def per_player(rows=None, weights=None):
+            selected = index if rows is None else index[rows]
+            if weights is not None and rows is not None:
+                weights = weights[rows]
+            return np.bincount(selected, weights=weights, minlength=n_players)
+
+        self.columns[table] = per_player(weights=values)
+        self.columns[f'{table}_count'] = per_player(weights=counts).astype('int64')
+
+        if table == 'money':
+            paying = values > 0
+            self.columns['paying_money'] = per_player(paying, values)
+            self.columns['paying_count'] = per_player(
+                paying, None if counts is None else counts).astype('int64')
+
+            # First/last purchase need dates; a bare player_id/money_amount table has none
+            first_column = 'first_date' if 'first_date' in df.columns else 'date'
+            last_column = 'last_date' if 'last_date' in df.columns else 'date'
+            if first_column in df.columns and last_column in df.columns:
+                self.columns['first_purchase'] = self._date_extreme(
+                    np.minimum, index[paying], df[first_column].to_numpy()[found][paying])
+                self.columns['last_purchase'] = self._date_extreme(
+                    np.maximum, index[paying], df[last_column].to_numpy()[found][paying])
+            else:
+                self.columns.pop('first_purchase', None)
+                self.columns.pop('last_purchase', None)
+        return self
+
+    def _date_extreme(self, ufunc, index, dates):
+        """Per-player min/max of a datetime64 column (NaT for players without rows)"""
+        dates = dates.astype('datetime64[ns]').view('int64')
+        initial = np.iinfo('int64').max if ufunc is np.minimum else np.iinfo('int64').min
+        result = np.full(self.players.n_players, initial, dtype='int64')
+        ufunc.at(result, index, dates)
+        result[result == initial] = np.iinfo('int64').min  # NaT
+        return result.view('datetime64[ns]')
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    @property
+    def paying(self):
+        """Bool array: player made at least one positive payment"""
+        return self.columns['paying_count'] > 0
+
+    def subset(self, mask):
+        """Features of the players selected by a bool mask (with the matching dimension)"""
+        return PlayerFeatures(self.players.subset(mask),
+                              {name: values[mask] for name, values in self.columns.items()})
+
+    def frame(self, rows=None, columns=None):
+        """
+        Per-player DataFrame: player_id, group[, platform], features and `paying`
+
+        `columns` limits the feature columns; `rows` selects players as in
+        PlayerDimension.frame.
+        """
+        selected = {name: self.columns[name] for name in (columns or self.columns)}
+        if 'paying_count' in self.columns:
+            selected['paying'] = self.paying
+        return self.players.frame(rows=rows, **selected)
+
+    def __repr__(self):
+        return (f"PlayerFeatures({self.players.n_players:,} players, "
+                f"columns: {', '.join(self.columns)})")
@@ -0,0 +1,150 @@
+"""
+Player Dimension for A/B Testing Analysis
+Maps raw player ids to contiguous int32 indices once, so per-player
+aggregates are joined to group/platform by array indexing instead of
+repeated pd.merge hash joins
+"""
+
+import numpy as np
+import pandas as pd
+
+# Use a direct id -> index lookup table while it stays this sparse at most
+DIRECT_LOOKUP_MAX_RATIO = 4
+
+
+def _codes_for(dimension_ids, lookup, table, column, categories=None):
+    """Categorical codes of table[column] aligned to the dimension (-1 = missing)"""
+    values = pd.Categorical(table[column], categories=categories)
+    codes = np.full(len(dimension_ids), -1, dtype='int16')
+    index = lookup(table['player_id'].to_numpy())
+    found = index >= 0
+    codes[index[found]] = values.codes[found]
+    return codes, values.categories
+
+
+class PlayerDimension:
+    """
+    Players of the experiment with aligned attribute arrays
+
+    Index i refers to player_ids[i] (sorted). group/platform are stored as
+    categorical codes (-1 = unknown) and cheater as a bool array; any
+    per-player values are aligned with `accumulate` and read back with
+    `frame`.
+    """
+
+    def __init__(self, player_ids, group_codes, group_categories,
+                 platform_codes=None, platform_categories=None, cheater=None):
+        self.player_ids = player_ids
+        self.n_players = len(player_ids)
+        self.group_codes = group_codes
+        self.group_categories = group_categories
+        self.platform_codes = platform_codes
+        self.platform_categories = platform_categories
+        self.cheater = cheater if cheater is not None else np.zeros(self.n_players, dtype=bool)
+        self._build_lookup()
+
+    @classmethod
+    def from_tables(cls, abgroup, platforms=None, cheaters=None,
+                    group_categories=None, platform_categories=None):
+        """
+        Build the dimension from the abgroup table plus optional platforms/cheaters
+
+        Fixed group/platform categories keep codes comparable between
+        dimensions built from different parts of the data (e.g. shards).
+        """
+        abgroup = abgroup.sort_values('player_id')
+        player_ids = abgroup['player_id'].to_numpy(dtype='int64')
+        groups = pd.Categorical(abgroup['group'], categories=group_categories)
+        dimension = cls(player_ids, groups.codes.astype('int8'), groups.categories)
+
+        if platforms is not None:
+            dimension.platform_codes, dimension.platform_categories = _codes_for(
+                player_ids, dimension.lookup, platforms, 'platform', platform_categories)
+
+        if cheaters is not None:
+            flagged = cheaters
+            if 'cheaters' in cheaters.columns:
+                flagged = cheaters[cheaters['cheaters'] == 1]
+            dimension.cheater = dimension.mask_of(flagged['player_id'].to_numpy())
+
+        return dimension
+
+    def subset(self, mask):
+        """New dimension with only the players selected by a bool mask"""
+        return PlayerDimension(
+            self.player_ids[mask], self.group_codes[mask], self.group_categories,
+            None if self.platform_codes is None else self.platform_codes[mask],
+            self.platform_categories, self.cheater[mask])
+
+    def _build_lookup(self):
+        self._direct = None
+        if self.n_players == 0:
+            return
+        min_id, max_id = int(self.player_ids[0]), int(self.player_ids[-1])
+        if min_id >= 0 and max_id < DIRECT_LOOKUP_MAX_RATIO * self.n_players + 1024:
+            self._direct = np.full(max_id + 1, -1, dtype='int32')
+            self._direct[self.player_ids] = np.arange(self.n_players, dtype='int32')
+
+    def lookup(self, player_ids):
+        """Dense indices for raw player ids (-1 for ids outside the experiment)"""
+        player_ids = np.asarray(player_ids, dtype='int64')
+        if self.n_players == 0:
+            return np.full(len(player_ids), -1, dtype='int32')
+
+        if self._direct is not None:
+            in_range = (player_ids >= 0) & (player_ids < len(self._direct))
+            index = np.full(len(player_ids), -1, dtype='int32')
+            index[in_range] = self._direct[player_ids[in_range]]
+            return index
+
+        position = np.searchsorted(self.player_ids, player_ids)
+        position = np.minimum(position, self.n_players - 1)
+        found = self.player_ids[position] == player_ids
+        return np.where(found, position, -1).astype('int32')
+
+    def mask_of(self, player_ids):
+        """Bool array over the dimension marking the given player ids"""
+        mask = np.zeros(self.n_players, dtype=bool)
+        index = self.lookup(player_ids)
+        mask[index[index >= 0]] = True
+        return mask
+
+    def accumulate(self, player_ids, values=None):
+        """
+        Sum values per player into an array aligned with the dimension
+
+        Works for raw transactions (repeated ids) and per-player totals
+        alike; with values=None it counts rows per player instead.
+        """
+        index = self.lookup(player_ids)
+        found = index >= 0
+        weights = None if values is None else np.asarray(values, dtype='float64')[found]
+        totals = np.bincount(index[found], weights=weights, minlength=self.n_players)
+        return totals if values is not None else totals.astype('int64')
+
+    def group_labels(self):
+        return pd.Categorical.from_codes(self.group_codes, self.group_categories)
+
+    def platform_labels(self):
+        if self.platform_codes is None:
+            return None
+        return pd.Categorical.from_codes(self.platform_codes, self.platform_categories)
+
+    def frame(self, rows=None, **columns):
+        """
+        Per-player DataFrame (player_id, group[, platform] + columns)
+
+        `rows` optionally selects players (bool mask or index array); the
+        column arrays must be aligned with the full dimension.
+        """
+        data = {'player_id': self.player_ids, 'group': self.group_labels()}
+        platforms = self.platform_labels()
+        if platforms is not None:
+            data['platform'] = platforms
+        data.update(columns)
+
+        df = pd.DataFrame(data)
+        if rows is not None:
+            df = df[rows] if np.asarray(rows).dtype == bool else df.iloc[rows]
+            df = df.reset_index(drop=True)
+        return df
@@ -0,0 +1,124 @@
+"""
+Rank-Based Tests for heavily tied A/B metrics
+Mann-Whitney U from per-group value-count histograms: values are sorted
+once, and ranks, tie correction and the U statistic are computed over the
+distinct values only (most players share a handful of values, e.g. 0)
+"""
+
+import numpy as np
+from scipy import stats
+
+
+def value_histogram(values, group_codes, n_groups=None):
+    """
+    Distinct values and their count per group
+
+    Returns (distinct_values, counts) with counts shaped
+    (n_groups, len(distinct_values)); players with a negative group code
+    are ignored. One sort of `values` is the only O(n log n) step.
+    """
+    values = np.asarray(values)
+    group_codes = np.asarray(group_codes, dtype='int64')
+    keep = group_codes >= 0
+    if not keep.all():
+        values, group_codes = values[keep], group_codes[keep]
+    if n_groups is None:
+        n_groups = int(group_codes.max()) + 1 if len(group_codes) else 0
+
+    distinct, inverse = np.unique(values, return_inverse=True)
+    cell = group_codes * len(distinct) + inverse.ravel()
+    counts = np.bincount(cell, minlength=n_groups * len(distinct)).reshape(n_groups, len(distinct))
+    return distinct, counts
+
+
+def merge_value_histograms(histograms):
+    """
+    Combine (distinct_values, counts) histograms, e.g. from data shards
+
+    Counts must have the same number of rows (groups); the result is over
+    the union of the distinct values.
+    """
+    histograms = [(np.asarray(values), np.asarray(counts)) for values, counts in histograms]
+    distinct, inverse = np.unique(np.concatenate([values for values, _ in histograms]),
+                                  return_inverse=True)
+    merged = np.zeros((histograms[0][1].shape[0], len(distinct)), dtype='int64')
+    start = 0
+    for values, counts in histograms:
+        np.add.at(merged, (slice(None), inverse.ravel()[start:start + len(values)]), counts)
+        start += len(values)
+    return distinct, merged
+
+
+def mann_whitney_from_counts(counts_x, counts_y, use_continuity=True, alternative='two-sided'):
+    """
+    Mann-Whitney U test from value counts of two samples over the same sorted values
+
+    Same statistic and asymptotic p-value as
+    scipy.stats.mannwhitneyu(x, y, method='asymptotic'), including the
+    exact tie correction of the variance. Returns (u_stat, p_value) with
+    u_stat the U of the first sample.
+    """
+    return mann_whitney_from_count_chunks([(counts_x, counts_y)], use_continuity, alternative)
+
+
+def mann_whitney_from_count_chunks(chunks, use_continuity=True, alternative='two-sided'):
+    """
+    mann_whitney_from_counts over value counts given in consecutive chunks
+
+    `chunks` yields (counts_x, counts_y) over ascending, non-overlapping
+    runs of the sorted distinct values, so the pooled histogram never has
+    to be in memory at once (e.g. merged shard histograms by value range).
+    """
+    n1 = n2 = below = rank_sum = tie_term = 0.0
+    for counts_x, counts_y in chunks:
+        counts_x = np.asarray(counts_x, dtype='float64')
+        counts_y = np.asarray(counts_y, dtype='float64')
+
+        # Midrank of every distinct value in the pooled sample
+        ties = counts_x + counts_y
+        midrank = below + np.cumsum(ties) - (ties - 1) / 2
+        rank_sum += np.dot(counts_x, midrank)
+        tie_term += np.sum(ties ** 3 - ties)
+        below += ties.sum()
+        n1 += counts_x.sum()
+        n2 += counts_y.sum()
+
+    n = n1 + n2
+    u1 = rank_sum - n1 * (n1 + 1) / 2
+    u2 = n1 * n2 - u1
+
+    mu = n1 * n2 / 2
+    sigma = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+
+    if alternative == 'two-sided':
+        u = max(u1, u2)
+    elif alternative == 'greater':
+        u = u1
+    elif alternative == 'less':
+        u = u2
+    else:
+        raise ValueError(f"Unknown alternative: {alternative}")
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (u - mu - (0.5 if use_continuity else 0.0)) / sigma
+    p_value = stats.norm.sf(z)
+    if alternative == 'two-sided':
+        p_value = min(2 * p_value, 1.0)
+    return float(u1), float(p_value)
+
+
+def mann_whitney_by_group(values, group_codes, group_names, group_x='control', group_y='test',
+                          use_continuity=True, alternative='two-sided'):
+    """Mann-Whitney U between two groups of per-player values aligned with group codes"""
+    names = list(group_names)
+    _, counts = value_histogram(values, group_codes, len(names))
+    return mann_whitney_from_counts(counts[names.index(group_x)], counts[names.index(group_y)],
+                                    use_continuity, alternative)
+
+
+def mann_whitney_u(x, y, use_continuity=True, alternative='two-sided'):
+    """Drop-in for scipy.stats.mannwhitneyu(x, y, method='asymptotic') returning (u_stat, p_value)"""
+    values = np.concatenate([np.asarray(x), np.asarray(y)])
+    codes = np.repeat([0, 1], [len(x), len(y)])
+    _, counts = value_histogram(values, codes, 2)
+    return mann_whitney_from_counts(counts[0], counts[1], use_continuity, alternative)
@@ -0,0 +1,164 @@
+"""
+Results Artifact of a complete analysis run
+Every metric, test, confidence interval, cleaning count and segment stat
+of one run in a small versioned directory (results.json plus Parquet
+tables), so Excel, PNG and HTML reports are rebuilt from it in seconds
+without touching the raw data
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from columnar_cache import PARQUET_AVAILABLE
+from segment_cube import SegmentCube
+
+ARTIFACT_VERSION = 1
+
+# Artifact directories are reports/results_<timestamp>
+ARTIFACT_PREFIX = 'results_'
+
+# Metric key in the analysis results -> label in the CI table
+METRICS = {'arpu': 'ARPU', 'arppu': 'ARPPU', 'cash': 'Cash'}
+
+
+def _json_default(value):
+    """numpy scalars / arrays and timestamps in results.json"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def _counts(series):
+    return {str(key): int(value) for key, value in series.items()}
+
+
+def _metric_entry(metric_results):
+    """Exact per-group moments, lift, effect size and tests of one metric"""
+    cells = metric_results['cell_stats']
+    summary = metric_results['summary']
+    groups = {}
+    for group in cells.group_names:
+        n, mean, var = cells.group_moments(group)
+        groups[str(group)] = {'count': int(n), 'mean': mean, 'std': float(np.sqrt(var))}
+        if 'median' in summary.columns and group in summary.index:
+            groups[str(group)]['median'] = float(summary.loc[group, 'median'])
+
+    control, test = groups['control'], groups['test']
+    dof = control['count'] + test['count'] - 2
+    pooled_var = ((control['count'] - 1) * control['std'] ** 2 + (test['count'] - 1) * test['std'] ** 2) / dof
+    return {
+        'groups': groups,
+        'absolute_change': test['mean'] - control['mean'],
+        'lift_percent': (test['mean'] - control['mean']) / control['mean'] * 100,
+        # Sign as in the t-statistic: control minus test
+        'cohens_d': (control['mean'] - test['mean']) / np.sqrt(pooled_var),
+        **{name: float(value) for name, value in metric_results['test_results'].items()},
+    }
+
+
+class ResultsArtifact:
+    """
+    summary: JSON-serializable dict (metrics, tests, group / platform
+      counts, cleaning counts, recommendation, run parameters)
+    tables: {name: DataFrame} - per-metric summaries, ARPU by platform
+      and group, confidence intervals, bootstrap lift and the segment cube
+    """
+
+    def __init__(self, summary, tables):
+        self.summary = summary
+        self.tables = tables
+
+    @classmethod
+    def from_results(cls, results, cube=None, params=None):
+        """Collect a FullABAnalysis results dict (with final_report) and its segment cube"""
+        summary = {
+            'version': ARTIFACT_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'params': params or {},
+            'metrics': {metric: _metric_entry(results[metric]) for metric in METRICS},
+            'groups': _counts(results['group_distribution']),
+            'platforms': _counts(results['platform']['distribution']),
+            'cleaning': results.get('cleaning'),
+        }
+        if 'final_report' in results:
+            summary['recommendation'] = results['final_report']['recommendation']
+            summary['significant_metrics'] = int(results['final_report']['metrics_summary']['significant_metrics'])
+
+        tables = {f'{metric}_summary': results[metric]['summary'].reset_index() for metric in METRICS}
+        tables['arpu_by_platform_group'] = results['platform']['arpu_by_platform_group'].reset_index()
+        tables['confidence_intervals'] = results['confidence_intervals']
+        if 'bootstrap' in results:
+            tables['bootstrap'] = results['bootstrap']
+        if cube is not None:
+            tables['segments'] = cube.players
+            tables['segments_daily'] = cube.daily
+            summary['cube'] = cube.meta
+        return cls(summary, tables)
+
+    def save(self, path):
+        """Write results.json and tables/<name>.parquet (pickle without pyarrow) into `path`"""
+        path = Path(path)
+        (path / 'tables').mkdir(parents=True, exist_ok=True)
+        for name, frame in self.tables.items():
+            if PARQUET_AVAILABLE:
+                frame.to_parquet(path / 'tables' / f'{name}.parquet', index=False)
+            else:
+                frame.to_pickle(path / 'tables' / f'{name}.pkl')
+        with open(path / 'results.json', 'w', encoding='utf-8') as f:
+            json.dump(dict(self.summary, tables=sorted(self.tables)), f, indent=2,
+                      ensure_ascii=False, default=_json_default)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Read an artifact written by save()"""
+        path = Path(path)
+        with open(path / 'results.json', encoding='utf-8') as f:
+            summary = json.load(f)
+        if summary.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"Results artifact version {summary.get('version')} is not supported")
+
+        tables = {}
+        for name in summary.pop('tables'):
+            parquet_path = path / 'tables' / f'{name}.parquet'
+            tables[name] = pd.read_parquet(parquet_path) if parquet_path.exists() \
+                else pd.read_pickle(path / 'tables' / f'{name}.pkl')
+        return cls(summary, tables)
+
+    def metric(self, name):
+        """Summary entry of 'arpu' / 'arppu' / 'cash'"""
+        return self.summary['metrics'][name]
+
+    def table(self, name):
+        return self.tables[name]
+
+    def confidence_interval(self, metric, group, confidence=0.95):
+        """CI row (mean, ci_lower, ci_upper, ...) of one metric and group"""
+        table = self.tables['confidence_intervals']
+        rows = table[(table['metric'] == METRICS.get(metric, metric)) & (table['group'].astype(str) == group)
+                     & np.isclose(table['confidence'], confidence)]
+        return rows.iloc[0].to_dict()
+
+    def segment_cube(self):
+        """The run's SegmentCube, or None when it was not built"""
+        if 'segments' not in self.tables:
+            return None
+        return SegmentCube(self.tables['segments'], self.tables['segments_daily'], self.summary['cube'])
+
+
+def latest_artifact_path(reports_dir="../reports"):
+    """Newest results_<timestamp> directory under reports_dir, or None"""
+    paths = sorted(Path(reports_dir).glob(f'{ARTIFACT_PREFIX}*/results.json'))
+    return paths[-1].parent if paths else None
+
+
+def load_latest_artifact(reports_dir="../reports"):
+    """ResultsArtifact of the most recent run, or None when no run has written one"""
+    path = latest_artifact_path(reports_dir)
+    return ResultsArtifact.load(path) if path is not None else None
@@ -0,0 +1,266 @@
+"""
+Segment Cube of sufficient statistics for A/B Testing Analysis
+count / sum / sum of squares materialized per group x platform x payer x
+exclusion rule (and per transaction date), so any slice or roll-up is
+answered from a few hundred rows instead of the raw tables
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from columnar_cache import PARQUET_AVAILABLE
+from data_io import TRANSACTION_TABLES
+from player_features import PlayerFeatures
+from sufficient_stats import CellStats, moments
+
+CUBE_VERSION = 1
+
+# Per-player metrics of the player-level cube: money (ARPU), paying_money
+# (positive payments only, ARPPU over payer=True) and cash spending
+PLAYER_METRICS = ('money', 'paying_money', 'cash')
+
+# Label of platform slot 0 (players without a platform row) and of players
+# no exclusion rule applies to
+UNKNOWN_PLATFORM = 'unknown'
+KEPT = 'kept'
+
+
+def _selection(frame, filters):
+    """Bool mask over cube rows for {dimension: value or list of values}"""
+    mask = np.ones(len(frame), dtype=bool)
+    for dimension, value in filters.items():
+        if value is None:
+            continue
+        if dimension not in frame.columns:
+            raise ValueError(f"Unknown cube dimension: {dimension}")
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        mask &= frame[dimension].isin(values).to_numpy()
+    return mask
+
+
+class SegmentCube:
+    """
+    Materialized sufficient statistics over the experiment segments
+
+    players: one row per group x platform x payer x rule cell with
+      `players` (count) and {metric}_sum / {metric}_sumsq of the per-player
+      totals of each PLAYER_METRICS entry. Means, variances and t-tests of
+      any roll-up over these dimensions are exact.
+    daily: the same cells split by transaction date, with per table
+      {table}_transactions, {table}_sum, {table}_players (players active
+      that day) and {table}_player_sumsq (sum of squared player-day totals).
+      Per-player means across several days are not derivable from it; use
+      the player-level cube for those.
+
+    `rule` is 'kept' for players no exclusion rule applies to, otherwise
+    the '+'-joined names of the rules that flagged the player.
+    """
+
+    def __init__(self, players, daily, meta):
+        self.players = players
+        self.daily = daily
+        self.meta = meta
+
+    @classmethod
+    def build(cls, dimension, exclusion, money, cash, features=None):
+        """
+        Build the cube from a PlayerDimension, its ExclusionMask and the raw
+        (uncleaned) money/cash transaction tables
+
+        `features` (PlayerFeatures over the same dimension) supplies the
+        per-player totals instead of recomputing them.
+        """
+        # Each table is mapped onto the dimension once; everything below is bincounts.
+        # Per-player totals (aggregate_transactions) have no dates and no daily cube.
+        tables = {}
+        for table, df in (('money', money), ('cash', cash)):
+            if 'date' not in df.columns:
+                continue
+            value_column = next(c for c in TRANSACTION_TABLES[table] if c in df.columns)
+            index = dimension.lookup(df['player_id'].to_numpy())
+            found = index >= 0
+            tables[table] = (index[found].astype('int64'), df[value_column].to_numpy(dtype='float64')[found],
+                             df['date'].to_numpy()[found])
+
+        if features is None:
+            features = PlayerFeatures.build(dimension, money, cash)
+        totals = {metric: features[metric] for metric in PLAYER_METRICS}
+        payer = features.paying
+
+        # Rule label per distinct bit combination
+        bit_values, rule_codes = np.unique(exclusion.bits, return_inverse=True)
+        rule_labels = [
+            KEPT if bits == 0 else '+'.join(rule['rule'] for rule in exclusion.rules if bits & rule['bit'])
+            for bits in bit_values
+        ]
+
+        platform_labels = [UNKNOWN_PLATFORM] + [str(p) for p in (dimension.platform_categories
+                                                                if dimension.platform_codes is not None else [])]
+        group_labels = [str(g) for g in dimension.group_categories]
+        platform_slot = (np.zeros(dimension.n_players, dtype='int64') if dimension.platform_codes is None
+                         else dimension.platform_codes.astype('int64') + 1)
+
+        # Dense cell id per player: group x platform slot x payer x rule
+        shape = (len(group_labels), len(platform_labels), 2, len(rule_labels))
+        n_cells = int(np.prod(shape))
+        # Players without a known group (code -1) get the spare id n_cells and stay
+        # out of every cell, as groupby drops them
+        grouped = dimension.group_codes >= 0
+        cell = np.full(dimension.n_players, n_cells, dtype='int64')
+        cell[grouped] = np.ravel_multi_index(
+            (dimension.group_codes[grouped].astype('int64'), platform_slot[grouped],
+             payer[grouped].astype('int64'), rule_codes.ravel()[grouped]), shape)
+
+        def per_cell(weights=None):
+            return np.bincount(cell, weights=weights, minlength=n_cells + 1)[:n_cells]
+
+        player_stats = {'players': per_cell()}
+        for metric, values in totals.items():
+            player_stats[f'{metric}_sum'] = per_cell(values)
+            player_stats[f'{metric}_sumsq'] = per_cell(values * values)
+
+        labels = cls._cell_labels(shape, group_labels, platform_labels, rule_labels)
+        players = pd.concat([labels, pd.DataFrame(player_stats)], axis=1)
+        players = players[players['players'] > 0].reset_index(drop=True)
+
+        if not grouped.all():
+            tables = {table: tuple(array[grouped[index]] for array in (index, values, dates))
+                      for table, (index, values, dates) in tables.items()}
+        daily = cls._build_daily(cell, n_cells, labels, tables)
+
+        meta = {
+            'version': CUBE_VERSION,
+            'built': datetime.now().isoformat(timespec='seconds'),
+            'groups': group_labels,
+            'platforms': platform_labels,
+            'rules': [rule['rule'] for rule in exclusion.rules],
+            'n_players': int(dimension.n_players),
+        }
+        return cls(players, daily, meta)
+
+    @staticmethod
+    def _cell_labels(shape, group_labels, platform_labels, rule_labels):
+        group, platform, payer, rule = np.unravel_index(np.arange(int(np.prod(shape))), shape)
+        return pd.DataFrame({
+            'group': pd.Categorical.from_codes(group, group_labels),
+            'platform': pd.Categorical.from_codes(platform, platform_labels),
+            'payer': payer.astype(bool),
+            'rule': pd.Categorical.from_codes(rule, rule_labels),
+        })
+
+    @staticmethod
+    def _build_daily(cell, n_cells, labels, tables):
+        """Per cell x date statistics of each table, from (player index, value, date) arrays"""
+        if not tables:
+            return labels.iloc[:0].assign(date=pd.Series(dtype='datetime64[ns]'))
+
+        frames = []
+        for table, (index, values, dates) in tables.items():
+            dates = pd.Categorical(dates)
+            n_dates = len(dates.categories)
+
+            # Rows without a date (code -1) have no day to land on; they still count in the player cube
+            dated = dates.codes >= 0
+            index, values, codes = index[dated], values[dated], dates.codes[dated].astype('int64')
+
+            # Player-day totals first (a player may pay several times a day)
+            player_day, position = np.unique(index * n_dates + codes, return_inverse=True)
+            position = position.ravel()
+            day_total = np.bincount(position, weights=values, minlength=len(player_day))
+            day_rows = np.bincount(position, minlength=len(player_day))
+
+            key = cell[player_day // n_dates] * n_dates + player_day % n_dates
+            size = n_cells * n_dates
+            stats = pd.DataFrame({
+                f'{table}_transactions': np.bincount(key, weights=day_rows, minlength=size).astype('int64'),
+                f'{table}_sum': np.bincount(key, weights=day_total, minlength=size),
+                f'{table}_players': np.bincount(key, minlength=size),
+                f'{table}_player_sumsq': np.bincount(key, weights=day_total * day_total, minlength=size),
+            })
+            stats.index = pd.MultiIndex.from_product([np.arange(n_cells), dates.categories],
+                                                     names=['cell', 'date'])
+            frames.append(stats)
+
+        daily = pd.concat(frames, axis=1).fillna(0)
+        daily = daily[(daily.filter(like='_transactions') > 0).any(axis=1)].reset_index()
+        for column in labels.columns:
+            daily.insert(labels.columns.get_loc(column), column, labels[column].to_numpy()[daily['cell']])
+        for column in daily.columns:
+            if column.endswith(('_transactions', '_players')):
+                daily[column] = daily[column].astype('int64')
+        return daily.drop(columns='cell')
+
+    def query(self, metric='money', by=('group',), **filters):
+        """
+        count / mean / std / sum of a per-player metric for any roll-up
+
+        e.g. query('money', by=('platform', 'group'), rule='kept') is ARPU
+        by platform and group after exclusions; query('paying_money',
+        payer=True, rule='kept') is ARPPU by group.
+        """
+        frame = self.players[_selection(self.players, filters)]
+        grouped = frame.groupby(list(by), observed=True)[['players', f'{metric}_sum', f'{metric}_sumsq']].sum()
+        grouped = grouped[grouped['players'] > 0]
+        mean, var = moments(grouped['players'], grouped[f'{metric}_sum'], grouped[f'{metric}_sumsq'])
+        return pd.DataFrame({'count': grouped['players'].astype('int64'), 'mean': mean,
+                             'std': np.sqrt(var), 'sum': grouped[f'{metric}_sum']}, index=grouped.index)
+
+    def cell_stats(self, metric='money', **filters):
+        """CellStats (group x platform) of a metric over the selected segments"""
+        groups, platforms = self.meta['groups'], self.meta['platforms']
+        frame = self.players[_selection(self.players, filters)]
+        group = pd.Categorical(frame['group'], categories=groups).codes
+        platform = pd.Categorical(frame['platform'], categories=platforms).codes
+        shape = (len(groups), len(platforms))
+        arrays = []
+        for column in ('players', f'{metric}_sum', f'{metric}_sumsq'):
+            values = np.zeros(shape)
+            np.add.at(values, (group, platform), frame[column].to_numpy(dtype='float64'))
+            arrays.append(values)
+        return CellStats(*arrays, groups, platforms[1:])
+
+    def daily_query(self, table='money', by=('date', 'group'), **filters):
+        """Transactions, totals and player-day mean/std per date (or any roll-up of the daily cube)"""
+        frame = self.daily[_selection(self.daily, filters)]
+        columns = [f'{table}_transactions', f'{table}_sum', f'{table}_players', f'{table}_player_sumsq']
+        grouped = frame.groupby(list(by), observed=True)[columns].sum()
+        grouped = grouped[grouped[f'{table}_players'] > 0]
+        mean, var = moments(grouped[f'{table}_players'], grouped[f'{table}_sum'],
+                            grouped[f'{table}_player_sumsq'])
+        return pd.DataFrame({'transactions': grouped[f'{table}_transactions'],
+                             'players': grouped[f'{table}_players'], 'sum': grouped[f'{table}_sum'],
+                             'mean_per_player_day': mean, 'std_per_player_day': np.sqrt(var)},
+                            index=grouped.index)
+
+    def save(self, path):
+        """Write players/daily tables (Parquet, pickle without pyarrow) and cube.json into `path`"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name, frame in (('players', self.players), ('daily', self.daily)):
+            if PARQUET_AVAILABLE:
+                frame.to_parquet(path / f'{name}.parquet', index=False)
+            else:
+                frame.to_pickle(path / f'{name}.pkl')
+        with open(path / 'cube.json', 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Read a cube written by save()"""
+        path = Path(path)
+        with open(path / 'cube.json', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != CUBE_VERSION:
+            raise ValueError(f"Segment cube version {meta.get('version')} is not supported")
+
+        frames = {}
+        for name in ('players', 'daily'):
+            parquet_path = path / f'{name}.parquet'
+            frames[name] = pd.read_parquet(parquet_path) if parquet_path.exists() \
+                else pd.read_pickle(path / f'{name}.pkl')
+        return cls(frames['players'], frames['daily'], meta)
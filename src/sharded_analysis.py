@@ -0,0 +1,582 @@
+"""
+Hash-Sharded Map-Reduce Execution of the A/B analysis
+Players are partitioned by a hash of player_id; worker processes load,
+clean and aggregate one shard each into mergeable statistics (cell
+sums, value histograms, quantile sketches) that are folded into a
+running merge as shards finish. With a memory budget the same pipeline
+runs out of core: CSVs are read in bounded byte ranges, shards are sized
+to fit the budget and value histograms stay spilled on disk
+"""
+
+import io
+import math
+import re
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_io import DATASETS, csv_read_options, normalize_columns, parse_date_columns, read_csv_header
+from exclusion import ExclusionMask
+from player_features import PlayerFeatures
+from player_index import PlayerDimension
+from quantile_sketch import histogram_quantile, sketch_of
+from rank_tests import mann_whitney_from_count_chunks, merge_value_histograms, value_histogram
+from sufficient_stats import CellStats
+
+# Fibonacci hashing: spreads consecutive player ids evenly over shards
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+# Byte ranges per table and worker in the partition phase
+RANGES_PER_WORKER = 2
+
+# Jobs submitted ahead per worker; bounds the finished results waiting to be folded
+JOBS_IN_FLIGHT_PER_WORKER = 2
+
+# Peak working set of a worker per byte of CSV it processes (raw block,
+# parser buffers and the parsed frame; shard parts plus their concat copy)
+MEMORY_PER_CSV_BYTE = 3
+
+# Smallest byte range worth a separate read
+MIN_RANGE_BYTES = 1024 * 1024
+
+# KLL sketch size for the outlier threshold and medians of out-of-core runs
+# without an explicit sketch_k (rank error about 0.01%)
+BUDGET_SKETCH_K = 20000
+
+# Driver memory per distinct value while merging one value range of the
+# shards' spilled histograms (values, per-group counts, merge temporaries)
+HISTOGRAM_BYTES_PER_VALUE = 64
+
+MEMORY_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+
+# metric -> (feature column, restricted to payers)
+SHARD_METRICS = {
+    'arpu': ('money', False),
+    'arppu': ('paying_money', True),
+    'cash': ('cash', False),
+}
+
+
+def shard_of(player_ids, n_shards):
+    """Shard number of every player id (stable across runs and processes)"""
+    hashed = np.asarray(player_ids).astype('uint64') * HASH_MULTIPLIER
+    return ((hashed >> np.uint64(32)) % np.uint64(n_shards)).astype('int64')
+
+
+def parse_memory_size(size):
+    """Bytes from a number or a string such as '512MB' or '4 GB'"""
+    if isinstance(size, (int, float)):
+        return int(size)
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?B?)\s*', str(size).upper())
+    if not match:
+        raise ValueError(f"Invalid memory size: {size!r}")
+    return int(float(match.group(1)) * MEMORY_UNITS[match.group(2)])
+
+
+def plan_partitions(total_bytes, memory_budget, max_workers=1):
+    """
+    (n_shards, range_bytes) that keep every worker within its share of memory_budget
+
+    A partition job holds one byte range, an aggregate job one shard (about
+    total_bytes / n_shards of input), so both scale with the budget and not
+    with the size of the input.
+    """
+    worker_bytes = parse_memory_size(memory_budget) / max(1, max_workers)
+    range_bytes = max(MIN_RANGE_BYTES, int(worker_bytes / MEMORY_PER_CSV_BYTE))
+    n_shards = max(1, math.ceil(total_bytes * MEMORY_PER_CSV_BYTE / worker_bytes))
+    return n_shards, range_bytes
+
+
+def byte_ranges(file_path, n_ranges):
+    """Split a file into about n_ranges (start, end) byte ranges"""
+    size = Path(file_path).stat().st_size
+    bounds = np.linspace(0, size, max(1, n_ranges) + 1).astype('int64')
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def read_byte_range(file_path, name, start, end):
+    """
+    Typed rows of a CSV whose lines start inside [start, end)
+
+    Adjacent ranges together read every data line exactly once; the
+    header line belongs to no range.
+    """
+    header = read_csv_header(file_path)
+    with open(file_path, 'rb') as f:
+        if start == 0:
+            f.readline()
+        else:
+            # Finish the line that straddles `start`; it belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+        block = f.read(max(0, end - position)) if position < end else b''
+        if block and not block.endswith(b'\n'):
+            block += f.readline()
+
+    df = pd.read_csv(io.BytesIO(block), header=None, names=header, **csv_read_options(name, header))
+    return parse_date_columns(normalize_columns(df), name)
+
+
+def _shard_dir(spill_dir, name, shard):
+    return Path(spill_dir) / name / f'shard={shard:04d}'
+
+
+def _histogram_paths(spill_dir, metric, shard):
+    directory = Path(spill_dir) / 'histograms'
+    return directory / f'{metric}-{shard:04d}-values.npy', directory / f'{metric}-{shard:04d}-counts.npy'
+
+
+def _partition_range(args):
+    """Map 0: split one byte range of a table into per-shard parts; returns labels seen"""
+    name, file_path, start, end, part, n_shards, spill_dir = args
+    df = read_byte_range(file_path, name, start, end)
+    shards = shard_of(df['player_id'].to_numpy(), n_shards)
+    for shard in np.unique(shards):
+        directory = _shard_dir(spill_dir, name, shard)
+        directory.mkdir(parents=True, exist_ok=True)
+        df[shards == shard].reset_index(drop=True).to_pickle(directory / f'part-{part:05d}.pkl')
+
+    labels = {}
+    for column in ('group', 'platform'):
+        if column in df.columns:
+            labels[column] = set(pd.unique(df[column].astype(str)))
+    return labels
+
+
+def _load_shard_table(spill_dir, name, shard):
+    parts = sorted(_shard_dir(spill_dir, name, shard).glob('part-*.pkl'))
+    if not parts:
+        return None
+    return pd.concat([pd.read_pickle(part) for part in parts], ignore_index=True)
+
+
+def _aggregate_shard(args):
+    """
+    Map 1: build the shard's player dimension and feature table
+
+    The features are kept in the spill directory for the statistics step;
+    returns what the outlier threshold needs (cash spend of candidates as
+    a value histogram, or a KLL sketch when sketch_k is set).
+    """
+    spill_dir, shard, group_categories, platform_categories, sketch_k = args
+    tables = {name: _load_shard_table(spill_dir, name, shard) for name in DATASETS}
+    if tables['abgroup'] is None:
+        return {'shard': shard, 'players': 0, 'cheater_rows': 0, 'cheater_table_rows': 0,
+                'spend': None}
+
+    # A small shard may have no rows in some table
+    for name, columns in (('platforms', ['player_id', 'platform']), ('money', ['player_id', 'date', 'money']),
+                          ('cash', ['player_id', 'date', 'cash'])):
+        if tables[name] is None:
+            tables[name] = pd.DataFrame({column: pd.Series(dtype='datetime64[ns]' if column == 'date'
+                                                           else 'float64') for column in columns})
+
+    players = PlayerDimension.from_tables(tables['abgroup'], tables['platforms'], tables['cheaters'],
+                                          group_categories, platform_categories)
+    features = PlayerFeatures.build(players, tables['money'], tables['cash'])
+    np.savez(Path(spill_dir) / f'features-{shard:04d}.npz', player_ids=players.player_ids,
+             group_codes=players.group_codes, platform_codes=players.platform_codes,
+             cheater=players.cheater, **features.columns)
+
+    candidates = (features['cash_count'] > 0) & ~players.cheater
+    spend = features['cash'][candidates]
+    if sketch_k is None:
+        values, counts = np.unique(spend, return_counts=True)
+        spend_summary = (values, counts)
+    else:
+        spend_summary = sketch_of(spend, k=sketch_k)
+
+    cheaters = tables['cheaters']
+    return {
+        'shard': shard,
+        'players': int(players.n_players),
+        'cheater_rows': 0 if cheaters is None else int((cheaters['cheaters'] == 1).sum()),
+        'cheater_table_rows': 0 if cheaters is None else len(cheaters),
+        'spend': spend_summary,
+    }
+
+
+def _shard_statistics(args):
+    """
+    Map 2: apply the exclusion rules and reduce the shard to mergeable statistics
+
+    Value histograms are returned as they are (exact medians) or, with
+    sketch_k, saved in the spill directory for the range-wise Mann-Whitney
+    pass while per-group KLL sketches go back for the medians.
+    """
+    spill_dir, shard, group_categories, platform_categories, threshold, sketch_k = args
+    path = Path(spill_dir) / f'features-{shard:04d}.npz'
+    if not path.exists():
+        return None
+
+    with np.load(path) as saved:
+        players = PlayerDimension(saved['player_ids'], saved['group_codes'], pd.Index(group_categories),
+                                  saved['platform_codes'], pd.Index(platform_categories), saved['cheater'])
+        features = PlayerFeatures(players, {name: saved[name] for name in saved.files
+                                            if name not in ('player_ids', 'group_codes',
+                                                            'platform_codes', 'cheater')})
+
+    exclusion = ExclusionMask(players)
+    exclusion.add_rule('known_cheaters', players.cheater)
+    candidates = (features['cash_count'] > 0) & ~exclusion.excluded
+    exclusion.add_rule('cash_outliers', candidates & (features['cash'] > threshold))
+
+    excluded = exclusion.excluded
+    kept = features.subset(~excluded)
+    kept_players = kept.players
+    n_groups = len(group_categories)
+
+    cells, histograms, sketches = {}, {}, {}
+    for metric, (column, payers_only) in SHARD_METRICS.items():
+        rows = kept.paying if payers_only else None
+        metric_cells = CellStats.from_players(kept_players, kept[column], rows=rows)
+        cells[metric] = (metric_cells.count, metric_cells.total, metric_cells.sumsq)
+        codes = kept_players.group_codes if rows is None else np.where(rows, kept_players.group_codes, -1)
+        values, counts = value_histogram(kept[column], codes, n_groups)
+        if sketch_k is None:
+            histograms[metric] = (values, counts)
+        else:
+            values_path, counts_path = _histogram_paths(spill_dir, metric, shard)
+            values_path.parent.mkdir(exist_ok=True)
+            np.save(values_path, values)
+            np.save(counts_path, counts)
+            sketches[metric] = [sketch_of(kept[column][codes == group], k=sketch_k) for group in range(n_groups)]
+
+    return {
+        'shard': shard,
+        'cells': cells,
+        'histograms': histograms,
+        'sketches': sketches,
+        'rules': exclusion.rule_counts(),
+        'kept_by_group': np.bincount(kept_players.group_codes[kept_players.group_codes >= 0]
+                                     .astype('int64'), minlength=n_groups),
+        'kept_by_platform': np.bincount(kept_players.platform_codes[kept_players.platform_codes >= 0]
+                                        .astype('int64'), minlength=len(platform_categories)),
+        'removed_rows': {
+            'abgroup': int(excluded.sum()),
+            'platforms': int((excluded & (players.platform_codes >= 0)).sum()),
+            'money': int(features['money_count'][excluded].sum()),
+            'cash': int(features['cash_count'][excluded].sum()),
+        },
+    }
+
+
+class ShardedRun:
+    """
+    Driver of the sharded pipeline
+
+    partition (byte ranges of every CSV -> per-shard parts) -> aggregate
+    (per-shard features, spend summaries) -> threshold -> statistics
+    (per-shard cell sums and histograms) -> finish. Every map step runs in
+    a process pool and each shard's result is folded into a running merge
+    as it arrives. Cell sums, counts and sketches are small; exact value
+    histograms (without sketch_k) grow with the number of distinct values.
+
+    With memory_budget (bytes or e.g. '2GB') the run is out of core:
+    n_shards (if None) and the byte range size follow plan_partitions, so
+    peak memory of every process is bounded by its share of the budget
+    regardless of input size. Partitioning by player hash replaces an
+    external sort: each shard holds all rows of its players. The outlier
+    threshold and medians then come from KLL sketches (BUDGET_SKETCH_K
+    unless sketch_k is given) and the exact Mann-Whitney tests read the
+    spilled shard histograms one budget-sized value range at a time.
+    """
+
+    def __init__(self, data_path, n_shards=None, max_workers=None, spill_dir=None,
+                 threshold_multiplier=3, sketch_k=None, memory_budget=None, logger=None):
+        if n_shards is None and memory_budget is None:
+            raise ValueError("Either n_shards or memory_budget is required")
+        self.data_path = Path(data_path)
+        self.max_workers = max_workers or n_shards or 1
+        self.range_bytes = None
+        self.worker_bytes = None
+        if memory_budget is not None:
+            total_bytes = sum((self.data_path / filename).stat().st_size
+                              for filename, _ in DATASETS.values())
+            planned_shards, self.range_bytes = plan_partitions(total_bytes, memory_budget, self.max_workers)
+            n_shards = n_shards or planned_shards
+            self.worker_bytes = parse_memory_size(memory_budget) / self.max_workers
+            if sketch_k is None:
+                sketch_k = BUDGET_SKETCH_K
+        self.n_shards = n_shards
+        self.spill_dir = spill_dir
+        self.threshold_multiplier = threshold_multiplier
+        self.sketch_k = sketch_k
+        self.memory_budget = memory_budget
+        self.logger = logger
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
+        else:
+            print(message)
+
+    def _map(self, executor, function, jobs, fold):
+        """
+        fold(result) of every job, in job order, as soon as it is next
+
+        Only a few jobs per worker are in flight, so at most that many
+        finished results wait in the driver; the fixed order keeps float
+        sums and sketch merges identical from run to run.
+        """
+        if executor is None:
+            for job in jobs:
+                fold(function(job))
+            return
+        in_flight = deque()
+        for job in jobs:
+            in_flight.append(executor.submit(function, job))
+            if len(in_flight) >= self.max_workers * JOBS_IN_FLIGHT_PER_WORKER:
+                fold(in_flight.popleft().result())
+        while in_flight:
+            fold(in_flight.popleft().result())
+
+    def run(self):
+        """Run every phase; returns the merged statistics (see ShardMerge.finish)"""
+        if self.spill_dir is not None:
+            Path(self.spill_dir).mkdir(parents=True, exist_ok=True)
+        spill_dir = Path(tempfile.mkdtemp(prefix='ab_shards_', dir=self.spill_dir))
+        if self.memory_budget is not None:
+            self._log(f"Out-of-core run: memory budget {parse_memory_size(self.memory_budget) / 1024**2:,.0f} MB, "
+                      f"{self.max_workers} worker(s), byte ranges of {self.range_bytes / 1024**2:,.1f} MB, "
+                      f"sketch k={self.sketch_k}")
+        executor = ProcessPoolExecutor(self.max_workers) if self.max_workers > 1 else None
+        try:
+            jobs, part = [], 0
+            for name, (filename, _) in DATASETS.items():
+                file_path = self.data_path / filename
+                for start, end in byte_ranges(file_path, self._n_ranges(file_path)):
+                    jobs.append((name, file_path, start, end, part, self.n_shards, spill_dir))
+                    part += 1
+            labels = {'group': set(), 'platform': set()}
+
+            def fold_labels(seen):
+                for column, values in seen.items():
+                    labels[column] |= values
+
+            self._map(executor, _partition_range, jobs, fold_labels)
+            group_categories = sorted(labels['group'])
+            platform_categories = sorted(labels['platform'])
+            self._log(f"Partitioned {len(DATASETS)} tables into {self.n_shards} shards "
+                      f"({len(jobs)} byte ranges) in {spill_dir}")
+
+            shards = range(self.n_shards)
+            merge = ShardMerge(group_categories, platform_categories, self.sketch_k)
+            self._map(executor, _aggregate_shard, [
+                (spill_dir, shard, group_categories, platform_categories, self.sketch_k) for shard in shards],
+                merge.add_aggregate)
+            threshold = self._threshold(merge.spend)
+
+            self._map(executor, _shard_statistics, [
+                (spill_dir, shard, group_categories, platform_categories, threshold, self.sketch_k)
+                for shard in shards], merge.add_statistics)
+            return merge.finish(threshold, spill_dir, shards, self._max_range_values())
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    def _n_ranges(self, file_path):
+        if self.range_bytes is None:
+            return self.max_workers * RANGES_PER_WORKER
+        return max(1, math.ceil(Path(file_path).stat().st_size / self.range_bytes))
+
+    def _max_range_values(self):
+        """Distinct values per range of the spilled-histogram pass (None: one range)"""
+        if self.worker_bytes is None:
+            return None
+        # One value may be in every shard's histogram, so a range needs at least n_shards slots
+        return max(self.n_shards, int(self.worker_bytes // HISTOGRAM_BYTES_PER_VALUE))
+
+    def _threshold(self, spend):
+        """Global Q3 + m * IQR from the merged spend histogram or sketch"""
+        if self.sketch_k is None:
+            values, counts = spend
+            q1, q3 = histogram_quantile(values, counts[0], [0.25, 0.75])
+        else:
+            q1, q3 = spend.quantile([0.25, 0.75])
+        threshold = q3 + self.threshold_multiplier * (q3 - q1)
+        self._log(f"Cash spending outlier threshold: {threshold:,.0f}")
+        return float(threshold)
+
+
+class ShardMerge:
+    """
+    Running merge of per-shard results, updated as each shard finishes
+
+    Without sketch_k the value histograms are merged exactly in memory;
+    with sketch_k only per-group sketches are merged here and the
+    histograms stay spilled for the range-wise Mann-Whitney pass.
+    """
+
+    def __init__(self, group_categories, platform_categories, sketch_k=None):
+        self.group_categories = group_categories
+        self.platform_categories = platform_categories
+        self.sketch_k = sketch_k
+        self.players = self.cheater_rows = self.cheater_table_rows = 0
+        self.spend = None
+        self.cells = {}
+        self.histograms = {}
+        self.sketches = {}
+        self.rules = {}
+        self.kept_by_group = 0
+        self.kept_by_platform = 0
+        self.removed_rows = {}
+
+    def add_aggregate(self, aggregate):
+        """Fold one shard's player counts and cash spend summary"""
+        self.players += aggregate['players']
+        self.cheater_rows += aggregate['cheater_rows']
+        self.cheater_table_rows += aggregate['cheater_table_rows']
+        spend = aggregate['spend']
+        if spend is None:
+            return
+        if self.sketch_k is not None:
+            self.spend = spend if self.spend is None else self.spend.merge(spend)
+        else:
+            values, counts = spend
+            spend = (values, counts[None, :])
+            self.spend = spend if self.spend is None else merge_value_histograms([self.spend, spend])
+
+    def add_statistics(self, statistics):
+        """Fold one shard's cell sums, histograms or sketches and exclusion counts"""
+        if statistics is None:
+            return
+        for metric in SHARD_METRICS:
+            sums = statistics['cells'][metric]
+            previous = self.cells.get(metric)
+            self.cells[metric] = sums if previous is None else tuple(a + b for a, b in zip(previous, sums))
+            if metric in statistics['histograms']:
+                histogram = statistics['histograms'][metric]
+                previous = self.histograms.get(metric)
+                self.histograms[metric] = histogram if previous is None else \
+                    merge_value_histograms([previous, histogram])
+            if metric in statistics['sketches']:
+                shard_sketches = statistics['sketches'][metric]
+                previous = self.sketches.get(metric)
+                self.sketches[metric] = shard_sketches if previous is None else \
+                    [a.merge(b) for a, b in zip(previous, shard_sketches)]
+
+        for rule in statistics['rules']:
+            total = self.rules.setdefault(rule['rule'], {'rule': rule['rule'], 'flagged': 0, 'added': 0})
+            total['flagged'] += rule['flagged']
+            total['added'] += rule['added']
+        self.kept_by_group = self.kept_by_group + statistics['kept_by_group']
+        self.kept_by_platform = self.kept_by_platform + statistics['kept_by_platform']
+        for table, removed in statistics['removed_rows'].items():
+            self.removed_rows[table] = self.removed_rows.get(table, 0) + removed
+
+    def finish(self, threshold, spill_dir, shards, max_range_values=None):
+        """
+        Merged statistics of the run
+
+        Returns a dict with CellStats, per-group medians and the control vs
+        test Mann-Whitney (u_stat, p_value) per metric, per-rule exclusion
+        counts, kept players per group/platform and the removed row counts
+        per table. With sketch_k the tests read the spilled histograms in
+        value ranges of at most max_range_values distinct values.
+        """
+        groups = self.group_categories
+        merged = {'threshold': threshold, 'cells': {}, 'medians': {}, 'mann_whitney': {},
+                  'group_categories': groups, 'platform_categories': self.platform_categories,
+                  'players': self.players, 'cheater_rows': self.cheater_rows,
+                  'cheater_table_rows': self.cheater_table_rows}
+
+        control, test = groups.index('control'), groups.index('test')
+        for metric in SHARD_METRICS:
+            merged['cells'][metric] = CellStats(*self.cells[metric], groups, self.platform_categories)
+            if self.sketch_k is None:
+                values, counts = self.histograms[metric]
+                merged['medians'][metric] = group_medians((values, counts), groups)
+                chunks = [(counts[control], counts[test])]
+            else:
+                merged['medians'][metric] = pd.Series(
+                    [sketch.quantile(0.5) if sketch.n else np.nan for sketch in self.sketches[metric]],
+                    index=groups)
+                cuts = value_range_cuts(spill_dir, metric, shards, max_range_values)
+                chunks = ((counts[control], counts[test]) for _, counts
+                          in spilled_value_ranges(spill_dir, metric, shards, cuts, max_range_values))
+            merged['mann_whitney'][metric] = mann_whitney_from_count_chunks(chunks)
+
+        merged['rules'] = list(self.rules.values())
+        merged['kept_by_group'] = pd.Series(self.kept_by_group, index=pd.Index(groups, name='group'))
+        merged['kept_by_platform'] = pd.Series(self.kept_by_platform,
+                                               index=pd.Index(self.platform_categories, name='platform'))
+        merged['removed_rows'] = self.removed_rows
+        return merged
+
+
+def value_range_cuts(spill_dir, metric, shards, max_values):
+    """
+    Cut points splitting the shards' spilled histograms of a metric into
+    value ranges that hold at most max_values distinct values summed over
+    the shards (no cuts when max_values is None)
+
+    Ranges follow the spilled values themselves, not player ranks, so a
+    heavy tail of distinct values is split like any other. Every step-th
+    value of a shard (strided read of the memory map) stands for the step
+    values up to it; the ranges leave room for the at most step - 1
+    unsampled values per shard after a range's last marker.
+    """
+    paths = [path for path in (_histogram_paths(spill_dir, metric, shard)[0] for shard in shards)
+             if path.exists()]
+    if max_values is None or not paths:
+        return np.empty(0)
+    step = max(1, max_values // (2 * (len(paths) + 1)))
+    limit = max_values - len(paths) * (step - 1)
+    markers, repeats = np.unique(np.concatenate([np.array(np.load(path, mmap_mode='r')[step - 1::step])
+                                                 for path in paths]), return_counts=True)
+
+    # A cut value starts the next range (searchsorted side='left' in spilled_value_ranges)
+    cuts, taken = [], 0
+    for marker, weight in zip(markers, repeats * step):
+        if taken + weight > limit:
+            cuts.append(marker)
+            taken = 0
+        taken += weight
+    return np.array(cuts)
+
+
+def spilled_value_ranges(spill_dir, metric, shards, cuts, max_values=None):
+    """
+    Merged (values, counts) of the shards' spilled histograms of a metric,
+    one value range (between consecutive cuts) at a time
+
+    Histograms are memory-mapped, so only the slice of each shard that
+    falls into the current range is read. With max_values a range holding
+    more distinct values than that (summed over shards) raises before it
+    is read.
+    """
+    bounds = [-np.inf, *cuts, np.inf]
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        slices = []
+        for shard in shards:
+            values_path, counts_path = _histogram_paths(spill_dir, metric, shard)
+            if not values_path.exists():
+                continue
+            values = np.load(values_path, mmap_mode='r')
+            start, end = np.searchsorted(values, [low, high])
+            if end > start:
+                slices.append((values, counts_path, start, end))
+
+        size = sum(end - start for _, _, start, end in slices)
+        if max_values is not None and size > max_values:
+            raise RuntimeError(f"Value range [{low}, {high}) of {metric} holds {size:,} values, "
+                               f"more than the {max_values:,} that fit the memory budget")
+        if slices:
+            yield merge_value_histograms([
+                (np.array(values[start:end]), np.array(np.load(counts_path, mmap_mode='r')[:, start:end]))
+                for values, counts_path, start, end in slices])
+
+
+def group_medians(histogram, group_categories):
+    """Per-group median from a merged value histogram"""
+    values, counts = histogram
+    return pd.Series([histogram_quantile(values, counts[i], 0.5) if counts[i].sum() else np.nan
+                      for i in range(len(group_categories))], index=group_categories)
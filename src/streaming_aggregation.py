@@ -0,0 +1,84 @@
+"""
+Streaming Per-Player Aggregation of transaction tables
+Folds Money/Cash transactions into per-player accumulators chunk by
+chunk, so memory scales with players instead of transactions
+"""
+
+import numpy as np
+import pandas as pd
+
+# Bump when the result layout changes so cached totals are rebuilt
+RESULT_VERSION = "1"
+
+
+class PlayerAccumulator:
+    """
+    Per-player sum, count, sum of squares and first/last date
+
+    Chunks are reduced with groupby as they arrive; the partial results are
+    merged into the running state once they grow past `compact_rows`, which
+    bounds memory at roughly (players + compact_rows) rows.
+    """
+
+    def __init__(self, value_column, date_column='date', compact_rows=4_000_000):
+        self.value_column = value_column
+        self.date_column = date_column
+        self.compact_rows = compact_rows
+        self.state = None
+        self.pending = []
+        self.pending_rows = 0
+        self.rows_seen = 0
+
+    def update(self, chunk):
+        """Fold one chunk of raw transactions into the accumulators"""
+        value = self.value_column
+        # Widen compact amounts so per-player sums cannot overflow or drift
+        values = chunk[value].to_numpy()
+        values = values.astype('float64' if values.dtype.kind == 'f' else 'int64')
+        frame = pd.DataFrame({
+            'player_id': chunk['player_id'].to_numpy(),
+            value: values,
+            f'{value}_count': np.ones(len(chunk), dtype='int64'),
+            f'{value}_sumsq': np.square(values, dtype='float64'),
+        })
+        if self.date_column in chunk.columns:
+            frame['first_date'] = chunk[self.date_column].to_numpy()
+            frame['last_date'] = frame['first_date']
+
+        partial = self._reduce(frame)
+        self.pending.append(partial)
+        self.pending_rows += len(partial)
+        self.rows_seen += len(chunk)
+
+        if self.pending_rows >= self.compact_rows:
+            self._compact()
+        return self
+
+    def _reduce(self, frame):
+        agg = {column: 'sum' for column in frame.columns if column != 'player_id'}
+        if 'first_date' in frame.columns:
+            agg['first_date'] = 'min'
+            agg['last_date'] = 'max'
+        return frame.groupby('player_id', sort=False).agg(agg).reset_index()
+
+    def _compact(self):
+        parts = ([self.state] if self.state is not None else []) + self.pending
+        if parts:
+            self.state = self._reduce(pd.concat(parts, ignore_index=True))
+        self.pending = []
+        self.pending_rows = 0
+
+    def result(self):
+        """
+        Return one row per player
+
+        Columns: player_id, <value> (sum), <value>_count, <value>_sumsq and,
+        when the table has dates, first_date/last_date.
+        """
+        self._compact()
+        if self.state is None:
+            return pd.DataFrame(columns=['player_id', self.value_column])
+
+        result = self.state.sort_values('player_id', ignore_index=True)
+        result['player_id'] = result['player_id'].astype('int32')
+        return result
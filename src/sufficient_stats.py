@@ -0,0 +1,184 @@
+"""
+Sufficient-Statistics Metric Engine for A/B Testing Analysis
+Per-cell count / sum / sum of squares; means, variances, t-tests and
+lifts are all derived from them without the raw per-player arrays
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def moments(count, total, sumsq):
+    """Mean and sample variance (ddof=1) from count/sum/sum of squares"""
+    count = np.asarray(count, dtype='float64')
+    total = np.asarray(total, dtype='float64')
+    sumsq = np.asarray(sumsq, dtype='float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        # Clamp tiny negative values from floating-point cancellation
+        var = np.maximum(sumsq - count * mean ** 2, 0.0) / (count - 1)
+    return mean, var
+
+
+def ttest_from_stats(n1, mean1, var1, n2, mean2, var2, equal_var=True):
+    """
+    Two-sample t-test from summary statistics (vectorized)
+
+    Matches scipy.stats.ttest_ind on the underlying samples: Student's test
+    with pooled variance by default, Welch's test with equal_var=False.
+    """
+    n1, n2 = np.asarray(n1, dtype='float64'), np.asarray(n2, dtype='float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if equal_var:
+            df = n1 + n2 - 2
+            pooled = ((n1 - 1) * var1 + (n2 - 1) * var2) / df
+            se = np.sqrt(pooled * (1 / n1 + 1 / n2))
+        else:
+            a, b = var1 / n1, var2 / n2
+            se = np.sqrt(a + b)
+            df = (a + b) ** 2 / (a ** 2 / (n1 - 1) + b ** 2 / (n2 - 1))
+        t_stat = (np.asarray(mean1) - np.asarray(mean2)) / se
+    p_value = 2 * stats.t.sf(np.abs(t_stat), df)
+    return t_stat, p_value
+
+
+def confidence_intervals(count, total, sumsq, confidence_levels=(0.95,)):
+    """
+    t-based confidence intervals of the mean for many cells and levels at once
+
+    Returns a dict of arrays shaped (len(confidence_levels), n_cells):
+    mean, std_error, ci_lower, ci_upper, margin; same numbers as
+    stats.t.interval(level, n - 1, loc=mean, scale=stats.sem(values)).
+    """
+    count = np.asarray(count, dtype='float64')
+    mean, var = moments(count, total, sumsq)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std_error = np.sqrt(var / count)
+    levels = np.asarray(confidence_levels, dtype='float64')[:, None]
+    critical = stats.t.ppf((1 + levels) / 2, count[None, :] - 1)
+    margin = critical * std_error[None, :]
+    mean = np.broadcast_to(mean, margin.shape)
+    return {
+        'mean': mean,
+        'std_error': np.broadcast_to(std_error, margin.shape),
+        'ci_lower': mean - margin,
+        'ci_upper': mean + margin,
+        'margin': margin,
+    }
+
+
+def tidy_confidence_intervals(metric, groups, count, total, sumsq, confidence_levels=(0.95,)):
+    """Long-format CI frame: metric, group, confidence, mean, std_error, ci_lower, ci_upper, margin, n"""
+    intervals = confidence_intervals(count, total, sumsq, confidence_levels)
+    n_levels, n_groups = len(confidence_levels), len(groups)
+    frame = pd.DataFrame({
+        'metric': metric,
+        'group': np.tile(np.asarray(groups, dtype=object), n_levels),
+        'confidence': np.repeat(np.asarray(confidence_levels, dtype='float64'), n_groups),
+    })
+    for column, values in intervals.items():
+        frame[column] = np.ravel(values)
+    frame['n'] = np.tile(np.asarray(count, dtype='int64'), n_levels)
+    return frame
+
+
+class CellStats:
+    """
+    count / sum / sum of squares per group x platform cell
+
+    Built with one bincount pass over the player dimension's interned
+    group/platform codes. Every roll-up (by group, by group and platform)
+    and every statistic (mean, std, t-test, lift) is derived from these
+    few numbers. Platform slot 0 holds players without a known platform.
+    """
+
+    def __init__(self, count, total, sumsq, group_names, platform_names=()):
+        self.count = count
+        self.total = total
+        self.sumsq = sumsq
+        self.group_names = list(group_names)
+        self.platform_names = list(platform_names)
+
+    @classmethod
+    def from_players(cls, players, values, rows=None):
+        """
+        Cell statistics of a per-player value array aligned with `players`
+
+        `rows` optionally restricts the players (bool mask), e.g. payers only.
+        Players without a known group (code -1) are left out, as groupby
+        drops them.
+        """
+        values = np.asarray(values, dtype='float64')
+        n_groups = len(players.group_categories)
+        platform_names = [] if players.platform_codes is None else list(players.platform_categories)
+        n_slots = len(platform_names) + 1
+
+        platform_slot = 0 if players.platform_codes is None else players.platform_codes.astype('int64') + 1
+        cell = players.group_codes.astype('int64') * n_slots + platform_slot
+        cell = np.broadcast_to(cell, values.shape)
+        keep = players.group_codes >= 0
+        if rows is not None:
+            keep = keep & rows
+        if not keep.all():
+            cell, values = cell[keep], values[keep]
+
+        size = n_groups * n_slots
+        shape = (n_groups, n_slots)
+        count = np.bincount(cell, minlength=size).reshape(shape).astype('float64')
+        total = np.bincount(cell, weights=values, minlength=size).reshape(shape)
+        sumsq = np.bincount(cell, weights=values * values, minlength=size).reshape(shape)
+        return cls(count, total, sumsq, players.group_categories, platform_names)
+
+    def _rollup(self, by):
+        """(index, count, total, sumsq) for 'group', 'group+platform' or 'platform+group'"""
+        if tuple(by) == ('group',):
+            index = pd.Index(self.group_names, name='group')
+            return index, self.count.sum(axis=1), self.total.sum(axis=1), self.sumsq.sum(axis=1)
+
+        # Known platforms only (slot 0 = unknown platform is dropped, like groupby)
+        arrays = [a[:, 1:] for a in (self.count, self.total, self.sumsq)]
+        if tuple(by) == ('group', 'platform'):
+            index = pd.MultiIndex.from_product([self.group_names, self.platform_names],
+                                               names=['group', 'platform'])
+            return (index,) + tuple(a.ravel() for a in arrays)
+        if tuple(by) == ('platform', 'group'):
+            index = pd.MultiIndex.from_product([self.platform_names, self.group_names],
+                                               names=['platform', 'group'])
+            return (index,) + tuple(a.T.ravel() for a in arrays)
+        raise ValueError(f"Unsupported roll-up: {by}")
+
+    def group_moments(self, group):
+        """(n, mean, var) of one group across all platforms"""
+        i = self.group_names.index(group)
+        n, total, sumsq = self.count[i].sum(), self.total[i].sum(), self.sumsq[i].sum()
+        mean, var = moments(n, total, sumsq)
+        return n, float(mean), float(var)
+
+    def summary(self, by=('group',), columns=('count', 'mean', 'std')):
+        """Per-cell summary like groupby(...).agg(['count', 'mean', 'std']); empty cells dropped"""
+        index, count, total, sumsq = self._rollup(by)
+        mean, var = moments(count, total, sumsq)
+        data = {'count': count.astype('int64'), 'mean': mean, 'std': np.sqrt(var),
+                'sum': total, 'var': var}
+        summary = pd.DataFrame({column: data[column] for column in columns}, index=index)
+        return summary[count > 0]
+
+    def confidence_intervals(self, metric, confidence_levels=(0.95,)):
+        """Tidy per-group CI frame for this metric at every confidence level"""
+        return tidy_confidence_intervals(
+            metric, self.group_names, self.count.sum(axis=1), self.total.sum(axis=1),
+            self.sumsq.sum(axis=1), confidence_levels)
+
+    def ttest(self, group_a='control', group_b='test', equal_var=True):
+        """t-test between two groups (same result as stats.ttest_ind on the raw arrays)"""
+        n_a, mean_a, var_a = self.group_moments(group_a)
+        n_b, mean_b, var_b = self.group_moments(group_b)
+        t_stat, p_value = ttest_from_stats(n_a, mean_a, var_a, n_b, mean_b, var_b, equal_var)
+        return float(t_stat), float(p_value)
+
+    def lift(self, control='control', test='test'):
+        """Relative change of the test mean over the control mean, in percent"""
+        mean_c = self.group_moments(control)[1]
+        mean_t = self.group_moments(test)[1]
+        return (mean_t - mean_c) / mean_c * 100
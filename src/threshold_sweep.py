@@ -0,0 +1,86 @@
+"""
+Outlier Threshold Sensitivity Sweep
+Evaluates many IQR multipliers for cheater detection in one pass: spend
+is sorted once and every multiplier reads cumulative sufficient
+statistics of the players it would exclude
+"""
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import quartiles
+from sufficient_stats import moments, ttest_from_stats
+
+
+def _cumulative(order, indicator, values=None):
+    """Prefix sums (with a leading 0) of indicator*values and indicator*values**2 in sort order"""
+    weights = indicator[order].astype('float64')
+    if values is None:
+        return np.concatenate([[0.0], np.cumsum(weights)])
+    sorted_values = values[order]
+    return (np.concatenate([[0.0], np.cumsum(weights * sorted_values)]),
+            np.concatenate([[0.0], np.cumsum(weights * sorted_values ** 2)]))
+
+
+def sweep_iqr_thresholds(spend, candidates, group_codes, group_names, money, paying,
+                         multipliers, paying_money=None, control='control', test='test'):
+    """
+    Metrics for every outlier rule `spend > Q3 + m * IQR`, m in multipliers
+
+    All arrays are aligned per player (e.g. over a PlayerDimension) and
+    already exclude known cheaters. `candidates` marks the players the
+    quartiles and the rule apply to (players with any cash spending);
+    `paying` marks ARPPU players, whose revenue is `paying_money` (defaults
+    to `money`). Returns one row per multiplier with the
+    excluded player count and ARPU/ARPPU/cash means, lift (%) and
+    Student t-test p-values, matching a full clean + analyze run.
+    """
+    spend = np.asarray(spend, dtype='float64')
+    money = np.asarray(money, dtype='float64')
+    paying_money = money if paying_money is None else np.asarray(paying_money, dtype='float64')
+    multipliers = np.asarray(multipliers, dtype='float64')
+
+    q1, q3 = quartiles(spend[candidates])
+    thresholds = q3 + multipliers * (q3 - q1)
+
+    # Sort once, biggest spenders first; non-candidates can never be excluded
+    key = np.where(candidates, spend, -np.inf)
+    order = np.argsort(-key, kind='stable')
+    sorted_key = key[order]
+    excluded = np.searchsorted(-sorted_key, -thresholds, side='left')
+
+    names = list(group_names)
+    metrics = {
+        'arpu': (np.ones(len(spend), dtype=bool), money),
+        'arppu': (np.asarray(paying, dtype=bool), paying_money),
+        'cash': (np.ones(len(spend), dtype=bool), spend),
+    }
+
+    result = pd.DataFrame({
+        'multiplier': multipliers,
+        'threshold': thresholds,
+        'players_excluded': excluded,
+    })
+
+    for metric, (included, values) in metrics.items():
+        group_stats = {}
+        for label in (control, test):
+            in_group = (group_codes == names.index(label)) & included
+            count = _cumulative(order, in_group)
+            total, sumsq = _cumulative(order, in_group, values)
+            # Kept players = all players of the cell minus the excluded prefix
+            mean, var = moments(count[-1] - count[excluded],
+                                total[-1] - total[excluded],
+                                sumsq[-1] - sumsq[excluded])
+            group_stats[label] = (count[-1] - count[excluded], mean, var)
+
+        n_c, mean_c, var_c = group_stats[control]
+        n_t, mean_t, var_t = group_stats[test]
+        _, p_value = ttest_from_stats(n_c, mean_c, var_c, n_t, mean_t, var_t)
+
+        result[f'{metric}_control'] = mean_c
+        result[f'{metric}_test'] = mean_t
+        result[f'{metric}_lift'] = (mean_t - mean_c) / mean_c * 100
+        result[f'{metric}_p_value'] = p_value
+
+    return result